@@ -85,4 +85,8 @@ setup(
         "matplotlib==3.6.3",
         "pyserde~=0.9",
     ],
+    extras_require={
+        # compact binary encoding of the queries sent to the server
+        "compression": ["msgpack~=1.0", "zstandard~=0.19"],
+    },
 )
@@ -2,7 +2,8 @@ from dataclasses import dataclass
 import ssl
 from threading import Thread
 from time import sleep
-from typing import Any, TYPE_CHECKING, Optional
+from typing import Any, Deque, List, TYPE_CHECKING, Optional
+from collections import deque
 from hashlib import sha256
 import grpc
 from .keys import SigningKey
@@ -10,6 +11,7 @@ from .pb.bastionlab_pb2 import Empty
 from .pb.bastionlab_pb2 import ClientInfo
 from .version import __version__ as app_version
 from .pb.bastionlab_pb2_grpc import SessionServiceStub
+from .streaming import ChunkSizer, StreamStats, MAX_MESSAGE_SIZE
 import platform
 import socket
 import getpass
@@ -72,6 +74,8 @@ class Client:
     )
 
     _channel: grpc.Channel  #: The underlying gRPC channel used to communicate with the server.
+    _max_message_size: int  #: Maximum size of a gRPC message on the channel.
+    _stream_stats: Deque[StreamStats]  #: Statistics of the latest streams.
     __session_expiry_time: float = 0.0  #: Time in seconds
     _token: Optional[bytes] = None
     signing_key: Optional[SigningKey]
@@ -80,16 +84,57 @@ class Client:
         self,
         channel: grpc.Channel,
         signing_key: SigningKey,
+        max_message_size: int = MAX_MESSAGE_SIZE,
     ):
         """
         Initializes the client with a gRPC channel to the BastionLab server.
 
         Args:
             channel (grpc.Channel): A gRPC channel to the BastionLab server.
+            max_message_size (int): Maximum size of a gRPC message on the channel.
         """
         self._channel = channel
         self.__session_stub = SessionServiceStub(channel)
         self.signing_key = signing_key
+        self._max_message_size = max_message_size
+        self._stream_stats = deque(maxlen=32)
+
+    @property
+    def stream_stats(self) -> List[StreamStats]:
+        """
+        Returns the statistics (size, number of chunks, throughput...) of the latest streams
+        sent to or received from the server, the most recent last.
+        """
+        return list(self._stream_stats)
+
+    def _chunk_sizer(self, name: str, chunk_size: Optional[int] = None) -> ChunkSizer:
+        """
+        Returns a `ChunkSizer` for a new stream sent to the server, whose statistics are
+        recorded in `stream_stats`.
+
+        Args:
+            name (str): Name of the stream.
+            chunk_size (Optional[int]): If set, fixes the size of the chunks instead of adapting it.
+        """
+        sizer = ChunkSizer(
+            StreamStats(name),
+            max_message_size=self._max_message_size,
+            chunk_size=chunk_size,
+        )
+        self._stream_stats.append(sizer.stats)
+        return sizer
+
+    def _received_stats(self, name: str) -> StreamStats:
+        """
+        Returns the `StreamStats` of a new stream received from the server,
+        recorded in `stream_stats`.
+
+        Args:
+            name (str): Name of the stream.
+        """
+        stats = StreamStats(name)
+        self._stream_stats.append(stats)
+        return stats
 
     def refresh_session_if_needed(self):
         current_time = time.time()
@@ -97,6 +142,9 @@ class Client:
         if current_time > self.__session_expiry_time:
             self._token = None
             self.__create_session()
+            # the results held by the previous session are dropped when it expires
+            if self._bastionlab_polars is not None:
+                self._bastionlab_polars._renew_references()
 
     def __create_session(self):
         logging.debug("Refreshing session.")
@@ -185,6 +233,8 @@ class Connection:
         token (bytes, optional): The authentication token to use for the connection.
             If not provided, the connection will not be authenticated.
         server_name (str, optional): The name of the remote server. Defaults to "bastionlab-server".
+        max_message_size (int, optional): The maximum size of a gRPC message sent or received on the connection.
+            Streamed uploads and downloads are cut in chunks smaller than this. Defaults to 4 MiB.
     """
 
     host: str
@@ -194,6 +244,7 @@ class Connection:
     token: Optional[bytes] = None
     _client: Optional[Client] = None  # The gRPC client object used to send messages.
     server_name: Optional[str] = "bastionlab-server"
+    max_message_size: int = MAX_MESSAGE_SIZE
 
     @staticmethod
     def _verify_user(
@@ -270,7 +321,11 @@ class Connection:
         server_creds = grpc.ssl_channel_credentials(
             root_certificates=bytes(server_cert, encoding="utf8")
         )
-        connection_options = (("grpc.ssl_target_name_override", self.server_name),)
+        connection_options = (
+            ("grpc.ssl_target_name_override", self.server_name),
+            ("grpc.max_send_message_length", self.max_message_size),
+            ("grpc.max_receive_message_length", self.max_message_size),
+        )
 
         # Verify user by creating session
         self.token = Connection._verify_user(
@@ -296,6 +351,7 @@ class Connection:
         self._client = Client(
             self.channel,
             self.identity,
+            max_message_size=self.max_message_size,
         )
 
         auth_plugin.client = self.client
@@ -310,8 +366,12 @@ class Connection:
            exc_value: The value of the exception that caused the `with` statement to exit.
            exc_traceback: The traceback of the exception that caused the `with` statement to exit.
         """
-        self._client = None
-        self.channel.close()
+        try:
+            if self._client._bastionlab_polars is not None:
+                self._client._bastionlab_polars.release_unused()
+        finally:
+            self._client = None
+            self.channel.close()
 
 
 __all__ = [
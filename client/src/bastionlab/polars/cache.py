@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+import hashlib
+import json
+import polars as pl
+from ..pb.bastionlab_polars_pb2 import ReferenceResponse
+
+#: Default maximum size of the DataFrames kept by a `QueryCache` (256 MiB).
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+#: Default maximum number of queries remembered by a `QueryCache`.
+DEFAULT_CACHE_ENTRIES = 1024
+
+
+def plan_digest(composite_plan: str) -> str:
+    """Returns a hash of a composite plan that does not depend on the formatting of its JSON
+    (key order and whitespace)."""
+    canonical = json.dumps(
+        json.loads(composite_plan), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf8")).hexdigest()
+
+
+def _entry_points(value: Any) -> Set[str]:
+    """Returns the identifiers of the DataFrames a (deserialized) composite plan reads from."""
+    res = set()
+    if isinstance(value, dict):
+        if value.get("type") == "EntryPointPlanSegment":
+            res.add(value["identifier"])
+        for v in value.values():
+            res |= _entry_points(v)
+    elif isinstance(value, list):
+        for v in value:
+            res |= _entry_points(v)
+    return res
+
+
+@dataclass
+class CacheStats:
+    """Statistics of a `QueryCache`.
+
+    Args:
+        hits: Number of queries and fetches served from the cache.
+        misses: Number of queries and fetches that were sent to the server.
+        entries: Number of cached queries.
+        bytes: Estimated size of the cached DataFrames, in bytes.
+        max_bytes: Maximum size of the cached DataFrames, in bytes.
+        evictions: Number of entries evicted to stay within the size limits.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    bytes: int = 0
+    max_bytes: int = 0
+    evictions: int = 0
+
+
+@dataclass
+class _Entry:
+    reference: ReferenceResponse
+    entry_points: Set[str]
+    df: Optional[pl.DataFrame] = None
+    nbytes: int = 0
+
+
+@dataclass
+class QueryCache:
+    """Client-side cache of the results of the queries run on the server.
+
+    Queries are keyed by a hash of their composite plan and map to the reference of the
+    resulting DataFrame on the server and, once fetched, to the DataFrame itself.
+    Fetched DataFrames are evicted in least recently used order when their total
+    (estimated) size exceeds `max_bytes`. An entry is invalidated when one of the
+    DataFrames its plan reads from, or its result, is deleted.
+
+    Only fetches accepted without pending approval or warning are cached, so that the
+    data owner's policy is applied again to any query it flagged or rejected.
+
+    Args:
+        max_bytes: Maximum size of the cached DataFrames, in bytes.
+        max_entries: Maximum number of cached queries.
+        cache_results: Whether fetched DataFrames are cached, or only the references to the results.
+    """
+
+    max_bytes: int = DEFAULT_CACHE_BYTES
+    max_entries: int = DEFAULT_CACHE_ENTRIES
+    cache_results: bool = True
+    _entries: "OrderedDict[str, _Entry]" = field(
+        init=False, default_factory=OrderedDict
+    )
+    _by_identifier: Dict[str, str] = field(init=False, default_factory=dict)
+    _bytes: int = field(init=False, default=0)
+    _hits: int = field(init=False, default=0)
+    _misses: int = field(init=False, default=0)
+    _evictions: int = field(init=False, default=0)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            entries=len(self._entries),
+            bytes=self._bytes,
+            max_bytes=self.max_bytes,
+            evictions=self._evictions,
+        )
+
+    def get_reference(
+        self, composite_plan: str, digest: Optional[str] = None
+    ) -> Optional[ReferenceResponse]:
+        """Returns the reference of the result of `composite_plan` if the query has already been run.
+        `digest` is the hash of the plan, computed with `plan_digest` when not given."""
+        key = digest or plan_digest(composite_plan)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return entry.reference
+
+    def put_reference(
+        self,
+        composite_plan: str,
+        reference: ReferenceResponse,
+        digest: Optional[str] = None,
+    ) -> None:
+        """Records that running `composite_plan` produced the DataFrame referenced by `reference`."""
+        key = digest or plan_digest(composite_plan)
+        self._remove(key)
+        self._entries[key] = _Entry(
+            reference=reference,
+            entry_points=_entry_points(json.loads(composite_plan)),
+        )
+        self._by_identifier[reference.identifier] = key
+        self._evict()
+
+    def get_df(self, identifier: str) -> Optional[pl.DataFrame]:
+        """Returns the fetched DataFrame of the result `identifier`, if it is cached."""
+        key = self._by_identifier.get(identifier)
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None or entry.df is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        # DataFrames can be modified in place: hand out a (cheap) copy
+        return entry.df.clone()
+
+    def put_df(self, identifier: str, df: pl.DataFrame) -> None:
+        """Caches the fetched DataFrame of the result `identifier` (only results of queries are cached)."""
+        key = self._by_identifier.get(identifier)
+        if not self.cache_results or key is None:
+            return
+        nbytes = df.estimated_size()
+        if nbytes > self.max_bytes:
+            return
+        entry = self._entries[key]
+        self._bytes += nbytes - entry.nbytes
+        entry.df, entry.nbytes = df.clone(), nbytes
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def invalidate(self, identifier: str) -> None:
+        """Removes the entries that read from or produced the DataFrame `identifier`."""
+        for key, entry in list(self._entries.items()):
+            if (
+                identifier in entry.entry_points
+                or entry.reference.identifier == identifier
+            ):
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Removes all the entries (the hit and miss counters are kept)."""
+        self._entries.clear()
+        self._by_identifier.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.nbytes
+        if self._by_identifier.get(entry.reference.identifier) == key:
+            del self._by_identifier[entry.reference.identifier]
+
+    def _evict(self) -> None:
+        while self._entries and (
+            self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            self._remove(next(iter(self._entries)))
+            self._evictions += 1
+
+
+__all__ = [
+    "QueryCache",
+    "CacheStats",
+    "plan_digest",
+    "DEFAULT_CACHE_BYTES",
+    "DEFAULT_CACHE_ENTRIES",
+]
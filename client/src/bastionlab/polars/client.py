@@ -1,22 +1,86 @@
-from typing import List, TYPE_CHECKING, Optional, Iterator
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    List,
+    TYPE_CHECKING,
+    Optional,
+    Iterator,
+    Union,
+    Set,
+    TypeVar,
+)
 import grpc
 import io
+import re
 from grpc import StatusCode
 import polars as pl
 from colorama import Fore
-from ..pb.bastionlab_polars_pb2 import ReferenceRequest, Empty, Query
+from ..pb.bastionlab_polars_pb2 import (
+    ReferenceRequest,
+    ReferenceRequestList,
+    Empty,
+    Query,
+    Queries,
+    FetchChunk,
+    UdfChunk,
+    PlanEncoding,
+    StorageTier,
+)
 from ..pb.bastionlab_polars_pb2_grpc import PolarsServiceStub
 from ..pb.bastionlab_pb2 import Reference
-from ..errors import GRPCException
-from .utils import deserialize_dataframe, serialize_dataframe
-from .policy import Policy, DEFAULT_POLICY
+from ..errors import GRPCException, RequestRejected
+from .utils import (
+    deserialize_dataframe,
+    deserialize_dataframe_iter,
+    write_dataframe_to,
+    serialize_dataframe,
+)
+from .policy import Policy, DEFAULT_POLICY, TrueRule, Log
+from .cache import QueryCache, CacheStats, DEFAULT_CACHE_BYTES
+from .udf import UdfRegistry
+from .encoding import available_encodings, encode_query
+from .references import ReferenceTracker
+from ..streaming import record_received
 
 
 if TYPE_CHECKING:
-    from .remote_polars import FetchableLazyFrame, RemoteArray
+    from .remote_polars import FetchableLazyFrame, RemoteLazyFrame, RemoteArray
     from ..converter import BastionLabConverter
     from ..client import Client
 
+# Side tables are the data scientist's own data: they add no constraint to the policies
+# of the DataFrames they are joined with.
+SIDE_TABLE_POLICY = Policy(safe_zone=TrueRule(), unsafe_handling=Log(), savable=False)
+
+# error returned by the server when a plan references a udf it does not have
+_MISSING_UDF = re.compile(r"Could not find udf: digest=([0-9a-f]+)")
+
+T = TypeVar("T")
+
+
+@dataclass
+class StoreStats:
+    """Statistics of the DataFrame store of the server.
+
+    Args:
+        memory_dataframes: Number of DataFrames held in memory.
+        memory_bytes: Estimated size of the DataFrames held in memory, in bytes.
+        max_memory_bytes: Memory budget, above which the least recently used DataFrames are spilled
+            to disk (0 when DataFrames are never spilled).
+        disk_dataframes: Number of DataFrames spilled to disk.
+        disk_bytes: Size of the spilled DataFrames on disk, in bytes.
+        spills: Number of DataFrames spilled to disk so far.
+        reloads: Number of spilled DataFrames reloaded in memory so far.
+    """
+
+    memory_dataframes: int = 0
+    memory_bytes: int = 0
+    max_memory_bytes: int = 0
+    disk_dataframes: int = 0
+    disk_bytes: int = 0
+    spills: int = 0
+    reloads: int = 0
+
 
 class BastionLabPolars:
     """Main BastionLabPolars API class.
@@ -32,6 +96,105 @@ class BastionLabPolars:
     def __init__(self, client: "Client"):
         self.stub = PolarsServiceStub(client._channel)
         self.client = client
+        self._cache: Optional[QueryCache] = None
+        self._udfs = UdfRegistry(self._send_udf)
+        self._plan_encodings: Optional[Set[int]] = None
+        self._references = ReferenceTracker(self._release_dfs)
+
+    def enable_cache(
+        self, max_bytes: int = DEFAULT_CACHE_BYTES, cache_results: bool = True
+    ) -> None:
+        """
+        Enables the client-side cache of query results.
+
+        Once enabled, running a query whose composite plan has already been run returns the
+        existing result on the server instead of running it again and, if `cache_results` is set,
+        fetching it returns the DataFrame that was already fetched. Fetches that were rejected,
+        or that needed the data owner's approval or raised a warning, are never cached.
+
+        Args:
+            max_bytes : int
+                Maximum size of the cached DataFrames, in bytes. The least recently used are evicted first.
+            cache_results : bool
+                Whether fetched DataFrames are cached, or only the references to the results of the queries.
+        """
+        self._cache = QueryCache(max_bytes=max_bytes, cache_results=cache_results)
+
+    def disable_cache(self) -> None:
+        """
+        Disables the client-side cache of query results and drops its entries.
+        """
+        self._cache = None
+
+    def clear_cache(self) -> None:
+        """
+        Drops the entries of the client-side cache of query results, if it is enabled.
+        """
+        if self._cache is not None:
+            self._cache.clear()
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        """
+        Statistics (hits, misses and size) of the client-side cache of query results, or None if it is disabled.
+        """
+        return self._cache.stats if self._cache is not None else None
+
+    def server_cache_stats(self) -> CacheStats:
+        """
+        Fetches the statistics of the server-side cache of query results, shared by all the users of the server.
+        Identical queries (same plan and same user) reuse the cached result instead of running again.
+        `max_bytes` is 0 when the cache is disabled on the server.
+
+        Returns:
+            CacheStats
+        """
+        self.client.refresh_session_if_needed()
+
+        res = GRPCException.map_error(lambda: self.stub.GetCacheStats(Empty()))
+        return CacheStats(
+            hits=res.hits,
+            misses=res.misses,
+            entries=res.entries,
+            bytes=res.bytes,
+            max_bytes=res.max_bytes,
+            evictions=res.evictions,
+        )
+
+    def store_stats(self) -> StoreStats:
+        """
+        Fetches the statistics of the DataFrame store of the server, shared by all the users of the server.
+        DataFrames that do not fit in the memory budget are spilled to disk, and reloaded in memory when accessed.
+
+        Returns:
+            StoreStats
+        """
+        self.client.refresh_session_if_needed()
+
+        res = GRPCException.map_error(lambda: self.stub.GetStoreStats(Empty()))
+        return StoreStats(
+            memory_dataframes=res.memory_dataframes,
+            memory_bytes=res.memory_bytes,
+            max_memory_bytes=res.max_memory_bytes,
+            disk_dataframes=res.disk_dataframes,
+            disk_bytes=res.disk_bytes,
+            spills=res.spills,
+            reloads=res.reloads,
+        )
+
+    def release_unused(self) -> int:
+        """
+        Releases on the server the results of queries (and the arrays) that are not referenced anymore.
+
+        The results of queries are released automatically, in batches, once the objects referring to them
+        (`FetchableLazyFrame`s, the `RemoteLazyFrame`s derived from them and `RemoteArray`s) have been garbage
+        collected. This method releases the pending ones right away. Results that were saved or pinned
+        are never released, and the results held by a session are dropped by the server when it expires.
+
+        Returns:
+            int: the number of released results.
+        """
+        return self._references.flush(force=True)
 
     def send_df(
         self,
@@ -66,59 +229,181 @@ class BastionLabPolars:
 
         res = GRPCException.map_error(
             lambda: self.stub.SendDataFrame(
-                serialize_dataframe(df, policy, sanitized_columns)
+                serialize_dataframe(
+                    df,
+                    policy,
+                    sanitized_columns,
+                    self.client._chunk_sizer("SendDataFrame"),
+                )
             )
         )
         return FetchableLazyFrame._from_reference(self, res)
 
-    def _fetch_df(self, ref: str) -> Optional[pl.DataFrame]:
+    def _send_side_table(self, df: pl.DataFrame) -> "FetchableLazyFrame":
         """
-        Fetches the specified `pl.DataFrame` from the BastionLab server
-        with the provided reference identifier.
+        Uploads a local DataFrame to be used in queries, as an ephemeral DataFrame.
+        Ephemeral DataFrames are not listed by `list_dfs` and are dropped by the server
+        when the session ends.
 
         Args:
-            ref : str
-                A unique identifier for the Remote DataFrame.
+            df : polars.internals.dataframe.frame.DataFrame
+                The local DataFrame.
 
         Returns:
-            Optional[pl.DataFrame]
+            bastionlab.polars.remote_polars.FetchableLazyFrame
         """
+        from .remote_polars import FetchableLazyFrame
 
-        def make_chunks_iter() -> Iterator[bytes]:
-            blocked = False
+        self.client.refresh_session_if_needed()
 
-            for b in self.stub.FetchDataFrame(ReferenceRequest(identifier=ref)):
-                if blocked:
-                    blocked = False
-                    print(
-                        f"{Fore.GREEN}The query has been accepted by the data owner.{Fore.WHITE}"
-                    )
+        res = GRPCException.map_error(
+            lambda: self.stub.SendDataFrame(
+                serialize_dataframe(
+                    df,
+                    SIDE_TABLE_POLICY,
+                    [],
+                    self.client._chunk_sizer("SendDataFrame"),
+                    ephemeral=True,
+                )
+            )
+        )
+        return FetchableLazyFrame._from_reference(self, res, acquired=True)
+
+    def _notify(
+        self,
+        b: FetchChunk,
+        blocked: bool,
+        notices: Optional[List[str]] = None,
+        prefix: str = "",
+    ) -> bool:
+        """
+        Notifies the user of the pending approval or warning contained in a `FetchChunk`,
+        and of the acceptance of a pending query.
+
+        Args:
+            b : FetchChunk
+                A chunk received from the server.
+            blocked : bool
+                Whether the query was pending the data owner's approval before this chunk.
+            notices : Optional[List[str]]
+                If set, the reasons of the pending approvals and warnings are appended to this list.
+            prefix : str
+                Prefix of the printed messages.
+
+        Returns:
+            bool: whether the query is pending the data owner's approval after this chunk.
+        """
+        if blocked:
+            blocked = False
+            print(
+                f"{Fore.GREEN}{prefix}The query has been accepted by the data owner.{Fore.WHITE}"
+            )
 
-                if b.pending != "":
-                    blocked = True
-                    print(
-                        f"""{Fore.YELLOW}Warning: non privacy-preserving queries necessitate data owner's approval.
+        if b.pending != "":
+            blocked = True
+            if notices is not None:
+                notices.append(b.pending)
+            print(
+                f"""{Fore.YELLOW}{prefix}Warning: non privacy-preserving queries necessitate data owner's approval.
 Reason: {b.pending}
 
 A notification has been sent to the data owner. The request will be pending until the data owner accepts or denies it or until timeout seconds elapse.{Fore.WHITE}"""
-                    )
+            )
 
-                if b.warning != "":
-                    print(
-                        f"""{Fore.YELLOW}Warning: non privacy-preserving query.
+        if b.warning != "":
+            if notices is not None:
+                notices.append(b.warning)
+            print(
+                f"""{Fore.YELLOW}{prefix}Warning: non privacy-preserving query.
 Reason: {b.warning}
 
 This incident will be reported to the data owner.{Fore.WHITE}"""
-                    )
+            )
+
+        return blocked
+
+    def _fetch_chunks(
+        self, call: Iterator[FetchChunk], notices: Optional[List[str]] = None
+    ) -> Iterator[bytes]:
+        """
+        Yields the data contained in the `FetchChunk`s of a FetchDataFrame call
+        and notifies the user of pending approvals and warnings.
+
+        Args:
+            call : Iterator[FetchChunk]
+                The FetchDataFrame streaming call.
+            notices : Optional[List[str]]
+                If set, the reasons of the pending approvals and warnings are appended to this list.
+
+        Returns:
+            Iterator[bytes]
+        """
+        blocked = False
+        stats = self.client._received_stats("FetchDataFrame")
+
+        for b in record_received(stats, call, lambda b: len(b.data)):
+            blocked = self._notify(b, blocked, notices)
+            yield b.data
+
+    def _send_udf(self, data: bytes) -> str:
+        """
+        Uploads a serialized TorchScript user-defined function to the server's module cache.
+
+        Args:
+            data : bytes
+                The module, as serialized by `save_to_buffer`.
+
+        Returns:
+            str: the digest referencing the module in composite plans.
+        """
+        self.client.refresh_session_if_needed()
+
+        sizer = self.client._chunk_sizer("SendUdf")
+
+        def chunks() -> Iterator[UdfChunk]:
+            offset = 0
+            while offset < len(data):
+                chunk = data[offset : offset + sizer.size]
+                offset += len(chunk)
+                yield UdfChunk(data=chunk)
+
+        res = GRPCException.map_error(
+            lambda: self.stub.SendUdf(sizer.timed(chunks(), lambda c: len(c.data)))
+        )
+        return res.digest
+
+    def _fetch_df(self, ref: str) -> Optional[pl.DataFrame]:
+        """
+        Fetches the specified `pl.DataFrame` from the BastionLab server
+        with the provided reference identifier.
 
-                yield b.data
+        Args:
+            ref : str
+                A unique identifier for the Remote DataFrame.
+
+        Returns:
+            Optional[pl.DataFrame]
+        """
+        if self._cache is not None:
+            df = self._cache.get_df(ref)
+            if df is not None:
+                return df
 
         self.client.refresh_session_if_needed()
 
+        notices = []
         try:
             df = GRPCException.map_error(
-                lambda: deserialize_dataframe(make_chunks_iter())
+                lambda: deserialize_dataframe(
+                    self._fetch_chunks(
+                        self.stub.FetchDataFrame(ReferenceRequest(identifier=ref)),
+                        notices,
+                    )
+                )
             )
+            # flagged queries go through the data owner's policy again next time
+            if self._cache is not None and len(notices) == 0:
+                self._cache.put_df(ref, df)
             return df
         except GRPCException as e:
             if e.code == StatusCode.PERMISSION_DENIED:
@@ -129,17 +414,156 @@ This incident will be reported to the data owner.{Fore.WHITE}"""
             else:
                 raise e
 
-    def _run_query(
-        self,
-        composite_plan: str,
-    ) -> "FetchableLazyFrame":
+    def _fetch_df_iter(
+        self, ref: str, batch_rows: Optional[int] = None
+    ) -> Iterator[pl.DataFrame]:
+        """
+        Fetches the specified `pl.DataFrame` from the BastionLab server
+        with the provided reference identifier, as a sequence of DataFrames
+        decoded as the data is received.
+
+        The underlying gRPC call is cancelled when the iterator is closed or dropped.
+
+        Args:
+            ref : str
+                A unique identifier for the Remote DataFrame.
+            batch_rows : Optional[int]
+                Number of rows of the yielded DataFrames (the last one may be smaller).
+                If None, the DataFrames follow the record batches sent by the server.
+
+        Returns:
+            Iterator[pl.DataFrame]
+
+        Raises:
+            RequestRejected: if the data owner rejected the query.
+        """
+        self.client.refresh_session_if_needed()
+
+        call = self.stub.FetchDataFrame(ReferenceRequest(identifier=ref))
+        batches = deserialize_dataframe_iter(self._fetch_chunks(call), batch_rows)
+        try:
+            while True:
+                try:
+                    df = GRPCException.map_error(lambda: next(batches, None))
+                except GRPCException as e:
+                    if e.code == StatusCode.PERMISSION_DENIED:
+                        print(
+                            f"{Fore.RED}The query has been rejected by the data owner.{Fore.WHITE}"
+                        )
+                        raise RequestRejected()
+                    else:
+                        raise e
+                if df is None:
+                    return
+                yield df
+        finally:
+            # no-op if the call has already completed
+            call.cancel()
+
+    def _fetch_df_to(
+        self, ref: str, path: str, format: str = "ipc"
+    ) -> Optional[Union[pl.DataFrame, pl.LazyFrame]]:
+        """
+        Fetches the specified `pl.DataFrame` from the BastionLab server
+        with the provided reference identifier and writes it to a file
+        as the data is received.
+
+        Args:
+            ref : str
+                A unique identifier for the Remote DataFrame.
+            path : str
+                Path of the file to write.
+            format : str
+                Format of the file: "ipc" or "parquet".
+
+        Returns:
+            Optional[Union[pl.DataFrame, pl.LazyFrame]]
+        """
+        self.client.refresh_session_if_needed()
+
+        try:
+            return GRPCException.map_error(
+                lambda: write_dataframe_to(
+                    self._fetch_chunks(
+                        self.stub.FetchDataFrame(ReferenceRequest(identifier=ref))
+                    ),
+                    path,
+                    format,
+                )
+            )
+        except GRPCException as e:
+            if e.code == StatusCode.PERMISSION_DENIED:
+                print(
+                    f"{Fore.RED}The query has been rejected by the data owner.{Fore.WHITE}"
+                )
+                return None
+            raise e
+
+    def _plan_encodings_supported(self) -> Set[int]:
+        """
+        Returns the encodings of composite plans supported by both the client and the server.
+        The server is only asked once.
+        """
+        if self._plan_encodings is None:
+            self.client.refresh_session_if_needed()
+            try:
+                info = GRPCException.map_error(lambda: self.stub.GetServerInfo(Empty()))
+                server_encodings = {PlanEncoding.JSON, *info.plan_encodings}
+            except GRPCException as e:
+                # servers predating binary plans only accept JSON
+                if e.code != StatusCode.UNIMPLEMENTED:
+                    raise e
+                server_encodings = {PlanEncoding.JSON}
+            self._plan_encodings = server_encodings & available_encodings()
+        return self._plan_encodings
+
+    def _make_query(self, rdf: "RemoteLazyFrame") -> Query:
+        """
+        Builds the `Query` message running the composite plan of `rdf`, in the most compact
+        encoding supported by the server (see `bastionlab.polars.encoding`).
+        """
+        encodings = self._plan_encodings_supported()
+        packed_plan = rdf.packed_plan if PlanEncoding.MSGPACK in encodings else None
+        return encode_query(rdf.composite_plan, packed_plan, encodings)
+
+    def _send_plans(self, request: Callable[[], T]) -> T:
         """
-        Executes a Composite Plan on the BastionLab server.
+        Sends a request running composite plans. If the server does not have a udf they
+        reference (for instance after a restart), it is uploaded again and the request retried.
+
+        Args:
+            request : Callable[[], T]
+                Sends the request and returns its result.
+
+        Returns:
+            T
+        """
+        reuploaded = set()
+        while True:
+            try:
+                return GRPCException.map_error(request)
+            except GRPCException as e:
+                missing = (
+                    _MISSING_UDF.search(e.err.details() or "")
+                    if e.code == StatusCode.NOT_FOUND
+                    else None
+                )
+                digest = missing.group(1) if missing is not None else None
+                # each udf is uploaded again at most once
+                if digest is None or digest in reuploaded:
+                    raise e
+                if not self._udfs.reupload(digest):
+                    raise e
+                reuploaded.add(digest)
+
+    def _run_query(self, rdf: "RemoteLazyFrame") -> "FetchableLazyFrame":
+        """
+        Executes the Composite Plan of a `RemoteLazyFrame` on the BastionLab server.
         A composite plan is BastionLab's internal instruction set.
 
         Args:
-            composite_plan : str
-                Serialized instructions to be executed on BastionLab server.
+            rdf : bastionlab.polars.remote_polars.RemoteLazyFrame
+                The RemoteLazyFrame whose pending instructions are executed on BastionLab server.
 
         Returns:
             bastionlab.polars.remote_polars.FetchableLazyFrame
@@ -147,12 +571,132 @@ This incident will be reported to the data owner.{Fore.WHITE}"""
 
         from .remote_polars import FetchableLazyFrame
 
+        composite_plan, digest = rdf.composite_plan, rdf.plan_digest
+        if self._cache is not None:
+            res = self._cache.get_reference(composite_plan, digest)
+            if res is not None:
+                return FetchableLazyFrame._from_reference(self, res)
+
+        query = self._make_query(rdf)
         self.client.refresh_session_if_needed()
+        self._references.flush()
 
-        res = GRPCException.map_error(
-            lambda: self.stub.RunQuery(Query(composite_plan=composite_plan))
-        )
-        return FetchableLazyFrame._from_reference(self, res)
+        res = self._send_plans(lambda: self.stub.RunQuery(query))
+        if self._cache is not None:
+            self._cache.put_reference(composite_plan, res, digest)
+        return FetchableLazyFrame._from_reference(self, res, acquired=True)
+
+    def collect_all(self, rdfs: List["RemoteLazyFrame"]) -> List["FetchableLazyFrame"]:
+        """
+        Runs the pending queries of several `RemoteLazyFrame`s in a single request.
+        The server runs the queries concurrently.
+
+        Args:
+            rdfs : List[bastionlab.polars.remote_polars.RemoteLazyFrame]
+                The RemoteLazyFrames to collect.
+
+        Returns:
+            List[bastionlab.polars.remote_polars.FetchableLazyFrame]: the collected RemoteLazyFrames, in the same order.
+        """
+        from .remote_polars import FetchableLazyFrame
+
+        plans = [rdf.composite_plan for rdf in rdfs]
+        digests = [rdf.plan_digest for rdf in rdfs]
+        refs = [
+            self._cache.get_reference(plan, digest) if self._cache is not None else None
+            for plan, digest in zip(plans, digests)
+        ]
+        missing = [i for i, ref in enumerate(refs) if ref is None]
+
+        if len(missing) > 0:
+            queries = Queries(list=[self._make_query(rdfs[i]) for i in missing])
+            self.client.refresh_session_if_needed()
+            self._references.flush()
+
+            res = self._send_plans(lambda: self.stub.RunQueries(queries).list)
+            for i, ref in zip(missing, res):
+                refs[i] = ref
+                if self._cache is not None:
+                    self._cache.put_reference(plans[i], ref, digests[i])
+
+        acquired = set(missing)
+        return [
+            FetchableLazyFrame._from_reference(self, ref, acquired=i in acquired)
+            for i, ref in enumerate(refs)
+        ]
+
+    def fetch_all(self, rdfs: List["RemoteLazyFrame"]) -> List[Optional[pl.DataFrame]]:
+        """
+        Fetches several `RemoteLazyFrame`s in a single request, running their pending queries first
+        (see `collect_all`). The results are sent by the server in a single stream.
+
+        The data owner's policy applies to each result individually: a rejected fetch
+        only affects its own result.
+
+        Args:
+            rdfs : List[bastionlab.polars.remote_polars.RemoteLazyFrame]
+                The RemoteLazyFrames to fetch.
+
+        Returns:
+            List[Optional[pl.DataFrame]]: the fetched DataFrames, in the same order.
+                None for the DataFrames whose fetch has been rejected by the data owner.
+        """
+        from .remote_polars import FetchableLazyFrame
+
+        to_collect = [
+            i for i, rdf in enumerate(rdfs) if not isinstance(rdf, FetchableLazyFrame)
+        ]
+        fetchables = list(rdfs)
+        for i, rdf in zip(to_collect, self.collect_all([rdfs[i] for i in to_collect])):
+            fetchables[i] = rdf
+        identifiers = [rdf.identifier for rdf in fetchables]
+
+        dfs = [
+            self._cache.get_df(identifier) if self._cache is not None else None
+            for identifier in identifiers
+        ]
+        missing = [i for i, df in enumerate(dfs) if df is None]
+        if len(missing) == 0:
+            return dfs
+
+        self.client.refresh_session_if_needed()
+
+        data = {i: [] for i in range(len(missing))}
+        notices = {i: [] for i in range(len(missing))}
+        rejected = {}
+
+        def receive():
+            blocked = {}
+            stats = self.client._received_stats("FetchDataFrames")
+            call = self.stub.FetchDataFrames(
+                ReferenceRequestList(
+                    list=[ReferenceRequest(identifier=identifiers[i]) for i in missing]
+                )
+            )
+            for b in record_received(stats, call, lambda b: len(b.data)):
+                blocked[b.index] = self._notify(
+                    b,
+                    blocked.get(b.index, False),
+                    notices[b.index],
+                    prefix=f"[{missing[b.index]}] ",
+                )
+                if b.rejected != "":
+                    rejected[b.index] = b.rejected
+                data[b.index].append(b.data)
+
+        GRPCException.map_error(receive)
+
+        for index, i in enumerate(missing):
+            if index in rejected:
+                print(
+                    f"{Fore.RED}[{i}] The query has been rejected by the data owner.{Fore.WHITE}"
+                )
+                continue
+            dfs[i] = deserialize_dataframe(iter(data[index]))
+            # flagged queries go through the data owner's policy again next time
+            if self._cache is not None and len(notices[index]) == 0:
+                self._cache.put_df(identifiers[i], dfs[i])
+        return dfs
 
     def list_dfs(self) -> List["FetchableLazyFrame"]:
         """
@@ -191,6 +735,24 @@ This incident will be reported to the data owner.{Fore.WHITE}"""
         )
         return FetchableLazyFrame._from_reference(self, res)
 
+    def _get_tier(self, identifier: str) -> str:
+        """
+        Returns where the data of a DataFrame is stored on the server: "memory" or "disk".
+
+        Args
+        ----
+        identifier : str
+            A unique identifier for the Remote DataFrame.
+        """
+        self.client.refresh_session_if_needed()
+
+        res = GRPCException.map_error(
+            lambda: self.stub.GetDataFrameHeader(
+                ReferenceRequest(identifier=identifier)
+            )
+        )
+        return StorageTier.Name(res.tier).lower()
+
     def _persist_df(self, identifier: str):
         """
         Saves a Dataframe on the server from a BastionLab DataFrame identifier.
@@ -209,6 +771,29 @@ This incident will be reported to the data owner.{Fore.WHITE}"""
         res = GRPCException.map_error(
             lambda: self.stub.PersistDataFrame(ReferenceRequest(identifier=identifier))
         )
+        # saved DataFrames are not session-scoped anymore
+        self._references.forget(identifier)
+
+    def _pin_df(self, identifier: str):
+        """
+        Keeps a DataFrame on the server until it is deleted, even once it is not referenced
+        anymore or the session ends.
+
+        Args
+        ----
+        identifier : str
+            A unique identifier for the Remote DataFrame.
+
+        Returns
+        -------
+        Nothing
+        """
+        self.client.refresh_session_if_needed()
+
+        GRPCException.map_error(
+            lambda: self.stub.PinDataFrame(ReferenceRequest(identifier=identifier))
+        )
+        self._references.forget(identifier)
 
     def _delete_df(self, identifier: str):
         """
@@ -228,6 +813,59 @@ This incident will be reported to the data owner.{Fore.WHITE}"""
         res = GRPCException.map_error(
             lambda: self.stub.DeleteDataFrame(ReferenceRequest(identifier=identifier))
         )
+        self._references.forget(identifier)
+        if self._cache is not None:
+            self._cache.invalidate(identifier)
+
+    def _release_dfs(self, identifiers: List[str]):
+        """
+        Releases references to DataFrames and arrays held by the session (see `ReferenceTracker`).
+
+        Args
+        ----
+        identifiers : List[str]
+            The identifiers to release, repeated once per reference.
+        """
+        self.client.refresh_session_if_needed()
+
+        try:
+            GRPCException.map_error(
+                lambda: self.stub.ReleaseDataFrames(
+                    ReferenceRequestList(
+                        list=[ReferenceRequest(identifier=i) for i in identifiers]
+                    )
+                )
+            )
+        except GRPCException as e:
+            # older servers keep every result until it is deleted
+            if e.code != StatusCode.UNIMPLEMENTED:
+                raise e
+            self._references.disable()
+            return
+        if self._cache is not None:
+            for identifier in set(identifiers):
+                self._cache.invalidate(identifier)
+
+    def _renew_references(self):
+        """
+        Makes the current session hold the references held by the client, so that they outlive
+        the previous session. Called when the session is refreshed.
+        """
+        held = self._references.held()
+        if len(held) == 0:
+            return
+        try:
+            GRPCException.map_error(
+                lambda: self.stub.HoldDataFrames(
+                    ReferenceRequestList(
+                        list=[ReferenceRequest(identifier=i) for i in held]
+                    )
+                )
+            )
+        except GRPCException as e:
+            if e.code != StatusCode.UNIMPLEMENTED:
+                raise e
+            self._references.disable()
 
     def RemoteArray(
         self, identifier: Optional[str] = None, reference: Optional[Reference] = None
@@ -0,0 +1,84 @@
+from typing import Iterable, Optional, Set
+import json
+from ..pb.bastionlab_polars_pb2 import PlanEncoding, Query
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#: Size (in bytes) of the MessagePack-encoded plans above which they are compressed with zstd.
+ZSTD_THRESHOLD = 64 * 1024
+
+#: zstd compression level used for composite plans.
+ZSTD_LEVEL = 3
+
+
+def pack_segment(serialized: str) -> bytes:
+    """Encodes the JSON serialization of a composite plan segment with MessagePack."""
+    return msgpack.packb(json.loads(serialized), use_bin_type=True)
+
+
+def pack_plan(packed_segments: Iterable[bytes]) -> bytes:
+    """Assembles MessagePack-encoded segments into a MessagePack-encoded composite plan.
+
+    MessagePack values can be concatenated: the segments are not encoded again.
+    """
+    segments = list(packed_segments)
+    packer = msgpack.Packer(use_bin_type=True)
+    return b"".join(
+        [
+            packer.pack_map_header(1),
+            packer.pack("segments"),
+            packer.pack_array_header(len(segments)),
+            *segments,
+        ]
+    )
+
+
+def available_encodings() -> Set[int]:
+    """Returns the plan encodings supported by the client (depending on the installed optional dependencies)."""
+    res = {PlanEncoding.JSON}
+    if msgpack is not None:
+        res.add(PlanEncoding.MSGPACK)
+        if zstandard is not None:
+            res.add(PlanEncoding.MSGPACK_ZSTD)
+    return res
+
+
+def encode_query(
+    composite_plan: str,
+    packed_plan: Optional[bytes],
+    encodings: Set[int],
+) -> Query:
+    """Builds the `Query` message of a plan using the most compact of `encodings`.
+
+    Args:
+        composite_plan: The JSON serialization of the plan, used when MessagePack is not available.
+        packed_plan: The MessagePack encoding of the plan.
+        encodings: Encodings supported by both the client and the server.
+    """
+    if packed_plan is None or PlanEncoding.MSGPACK not in encodings:
+        return Query(composite_plan=composite_plan)
+    if PlanEncoding.MSGPACK_ZSTD in encodings and len(packed_plan) > ZSTD_THRESHOLD:
+        return Query(
+            encoded_plan=zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(
+                packed_plan
+            ),
+            encoding=PlanEncoding.MSGPACK_ZSTD,
+        )
+    return Query(encoded_plan=packed_plan, encoding=PlanEncoding.MSGPACK)
+
+
+__all__ = [
+    "available_encodings",
+    "encode_query",
+    "pack_plan",
+    "pack_segment",
+    "ZSTD_THRESHOLD",
+]
@@ -0,0 +1,153 @@
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+import threading
+import weakref
+
+#: Default number of unreferenced identifiers above which they are released on the server.
+DEFAULT_RELEASE_BATCH = 64
+
+
+class RemoteReference:
+    """Keeps a DataFrame or an array stored on the server alive.
+
+    There is a single instance per identifier, shared by all the objects referring to it:
+    `FetchableLazyFrame`s, the `EntryPointPlanSegment`s of the plans reading from it and
+    `RemoteArray`s. Once none of them is reachable, the identifier is queued for release.
+    """
+
+    __slots__ = ("identifier", "_finalizer", "__weakref__")
+
+    def __init__(self, identifier: str, on_collected: Callable[[str], None]):
+        self.identifier = identifier
+        self._finalizer = weakref.finalize(self, on_collected, identifier)
+        # nothing to release once the interpreter exits
+        self._finalizer.atexit = False
+
+    @property
+    def pinned(self) -> bool:
+        """Whether the identifier is exempt from release."""
+        return not self._finalizer.alive
+
+    def pin(self) -> None:
+        """Exempts the identifier from release: the DataFrame stays on the server until it is deleted."""
+        self._finalizer.detach()
+
+
+class ReferenceTracker:
+    """Tracks the DataFrames and arrays the server created for a client, and releases
+    those the client does not reference anymore, in batches.
+
+    The server may hand out the same identifier several times (e.g. from its cache of
+    query results): it keeps one reference per hand out, and all of them are released.
+    Finalizers only queue identifiers, the requests are sent by `flush`, which is called
+    outside of garbage collection.
+
+    Args:
+        release: Sends the identifiers to release to the server (repeated once per reference).
+        batch_size: Number of queued identifiers above which `flush` releases them.
+    """
+
+    def __init__(
+        self,
+        release: Callable[[List[str]], None],
+        batch_size: int = DEFAULT_RELEASE_BATCH,
+    ):
+        self.batch_size = batch_size
+        self.enabled = True
+        self._release = release
+        self._refs: "weakref.WeakValueDictionary[str, RemoteReference]" = (
+            weakref.WeakValueDictionary()
+        )
+        # references held on the server, per identifier (including queued identifiers)
+        self._counts: Dict[str, int] = {}
+        # deque.append is atomic: finalizers can run at any point, in any thread
+        self._queue: Deque[str] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Number of identifiers queued for release."""
+        return len(self._queue)
+
+    def acquire(self, identifier: str) -> Optional[RemoteReference]:
+        """Records a reference to `identifier` handed out by the server and returns its handle."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            ref = self._get_or_create(identifier)
+            # pinned DataFrames are not session-scoped anymore on the server
+            if not ref.pinned:
+                self._counts[identifier] = self._counts.get(identifier, 0) + 1
+            return ref
+
+    def attach(self, identifier: str) -> Optional[RemoteReference]:
+        """Returns the handle of `identifier` if it is tracked (queued identifiers are tracked again).
+
+        Used for identifiers the server did not hand out just now, such as the results of
+        `get_df` or the client-side cache.
+        """
+        with self._lock:
+            if identifier not in self._counts:
+                return self._refs.get(identifier)
+            return self._get_or_create(identifier)
+
+    def forget(self, identifier: str) -> None:
+        """Stops tracking `identifier` (once pinned or deleted on the server)."""
+        with self._lock:
+            self._counts.pop(identifier, None)
+            ref = self._refs.get(identifier)
+        if ref is not None:
+            ref.pin()
+
+    def held(self) -> List[str]:
+        """Returns the references held by the client (repeated once per reference)."""
+        with self._lock:
+            return [
+                identifier
+                for identifier, count in self._counts.items()
+                if identifier in self._refs
+                for _ in range(count)
+            ]
+
+    def flush(self, force: bool = False) -> int:
+        """Releases the queued identifiers that are still unreferenced, if there are at least
+        `batch_size` of them or `force` is set. Returns the number of released identifiers."""
+        if not self.enabled or (not force and len(self._queue) < self.batch_size):
+            return 0
+        queued = set()
+        while True:
+            try:
+                queued.add(self._queue.popleft())
+            except IndexError:
+                break
+        released = []
+        with self._lock:
+            for identifier in queued:
+                # referenced again since it was queued
+                if identifier in self._refs:
+                    continue
+                released.extend([identifier] * self._counts.pop(identifier, 0))
+        if len(released) > 0:
+            self._release(released)
+        return len(set(released))
+
+    def disable(self) -> None:
+        """Stops tracking and releasing identifiers."""
+        self.enabled = False
+        with self._lock:
+            self._counts.clear()
+        self._queue.clear()
+
+    def _get_or_create(self, identifier: str) -> RemoteReference:
+        ref = self._refs.get(identifier)
+        if ref is None:
+            ref = RemoteReference(identifier, self._queue.append)
+            self._refs[identifier] = ref
+        return ref
+
+
+__all__ = [
+    "RemoteReference",
+    "ReferenceTracker",
+    "DEFAULT_RELEASE_BATCH",
+]
@@ -1,11 +1,22 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Callable, Generic, List, Optional, TypeVar, Sequence, Union, Dict
+from typing import (
+    Callable,
+    Generic,
+    List,
+    Optional,
+    TypeVar,
+    Sequence,
+    Union,
+    Dict,
+    Iterator,
+    Any,
+    Tuple,
+)
 import seaborn as sns
 import polars as pl
 from polars.internals.sql.context import SQLContext
-from torch.jit import ScriptFunction
-import base64
+import hashlib
 import json
 import torch
 from ..pb.bastionlab_conversion_pb2 import (
@@ -14,14 +25,15 @@ from ..pb.bastionlab_conversion_pb2 import (
 )
 from ..pb.bastionlab_polars_pb2 import ReferenceResponse, SplitRequest, ReferenceRequest
 from .client import BastionLabPolars
+from .encoding import pack_plan, pack_segment
+from .references import RemoteReference
 from .utils import ApplyBins, Palettes, ApplyAbs
 import matplotlib.pyplot as plt
 import matplotlib as mat
 from typing import TYPE_CHECKING
 from ..errors import RequestRejected
 import numpy as np
-from serde import serde, InternalTagging, field
-from serde.json import to_json
+from serde import serde, InternalTagging, field, to_dict
 
 
 LDF = TypeVar("LDF", bound="pl.LazyFrame")
@@ -85,8 +97,42 @@ def delegate_properties(
 class CompositePlanSegment:
     """
     Composite plan segment class which handles segment plans that have not been implemented
+
+    Segments are immutable once built: their serialization and digest are computed
+    on first use and cached, as segments are shared by all the RemoteLazyFrames derived
+    from the same query.
     """
 
+    @property
+    def serialized(self) -> str:
+        """JSON serialization of the segment (tagged with its type), as sent in composite plans."""
+        res = self.__dict__.get("_serialized")
+        if res is None:
+            res = json.dumps(
+                to_dict(PlanSegments(segments=[self]))["segments"][0],
+                separators=(",", ":"),
+            )
+            self.__dict__["_serialized"] = res
+        return res
+
+    @property
+    def packed(self) -> bytes:
+        """MessagePack encoding of the segment (requires the optional `msgpack` dependency)."""
+        res = self.__dict__.get("_packed")
+        if res is None:
+            res = pack_segment(self.serialized)
+            self.__dict__["_packed"] = res
+        return res
+
+    @property
+    def segment_digest(self) -> str:
+        """SHA-256 hash of the serialization of the segment."""
+        res = self.__dict__.get("_segment_digest")
+        if res is None:
+            res = hashlib.sha256(self.serialized.encode("utf8")).hexdigest()
+            self.__dict__["_segment_digest"] = res
+        return res
+
 
 @dataclass
 @serde
@@ -123,10 +169,8 @@ class UdfPlanSegment(CompositePlanSegment):
     """
 
     columns: List[str]
-    udf: ScriptFunction = field(
-        serializer=lambda val: base64.b64encode(val.save_to_buffer()).decode("ascii"),
-        deserializer=lambda _: None,
-    )
+    #: Digest of the TorchScript module, uploaded beforehand to the server's module cache.
+    digest: str
 
 
 @dataclass
@@ -161,6 +205,72 @@ class PlanSegments:
     ]
 
 
+def _count_scans(value: Any) -> int:
+    """Returns the number of DataFrameScan nodes of a (deserialized) Polars plan:
+    each of them is replaced by an input data frame on the server."""
+    if isinstance(value, dict):
+        return ("DataFrameScan" in value) + sum(_count_scans(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(_count_scans(v) for v in value)
+    return 0
+
+
+def _explain_segments(segments: List[CompositePlanSegment]) -> str:
+    """Describes the DAG of data frames computed by a composite plan, in execution order.
+
+    Like the server, data frames are identified by the hash of their segment and of their
+    inputs: repeated subplans are shown as shared, as they are only run once per query.
+    """
+    stack: List[Tuple[str, int]] = []
+    ids: Dict[str, int] = {}
+    lines = []
+    shared = 0
+    for seg in segments:
+        if isinstance(seg, PolarsPlanSegment):
+            arity = _count_scans(json.loads(seg.serialized)["plan"])
+        elif isinstance(seg, StackPlanSegment):
+            arity = 2
+        elif isinstance(seg, EntryPointPlanSegment):
+            arity = 0
+        else:
+            arity = 1
+        inputs = stack[len(stack) - arity :] if arity > 0 else []
+        del stack[len(stack) - len(inputs) :]
+
+        h = hashlib.sha256(seg.segment_digest.encode("ascii"))
+        for input_hash, _ in inputs:
+            h.update(input_hash.encode("ascii"))
+        key = h.hexdigest()
+        if key in ids:
+            shared += 1
+            lines.append(f"%{ids[key]} (shared: already computed)")
+            stack.append((key, ids[key]))
+            continue
+
+        ids[key] = len(ids)
+        stack.append((key, ids[key]))
+        args = ", ".join(f"%{id}" for _, id in inputs)
+        if isinstance(seg, EntryPointPlanSegment):
+            lines.append(f"%{ids[key]} = EntryPoint {seg.identifier}")
+        elif isinstance(seg, PolarsPlanSegment):
+            lines.append(f"%{ids[key]} = Polars({args})")
+            lines.extend(
+                "    " + line
+                for line in seg.plan.describe_plan().splitlines()
+                if line.strip()
+            )
+        elif isinstance(seg, UdfPlanSegment):
+            lines.append(f"%{ids[key]} = Udf {seg.columns} {seg.digest[:12]}({args})")
+        elif isinstance(seg, StackPlanSegment):
+            lines.append(f"%{ids[key]} = VStack({args})")
+        elif isinstance(seg, RowCountSegment):
+            lines.append(f"%{ids[key]} = RowCount {seg.row}({args})")
+    lines.append(
+        f"{len(segments)} segments: {len(segments) - shared} run, {shared} shared"
+    )
+    return "\n".join(lines)
+
+
 @dataclass
 class UdfTransformerPlanSegment(CompositePlanSegment):
     """
@@ -289,24 +399,63 @@ class RemoteLazyFrame:
         """
         return RemoteLazyFrame(self._inner.clone(), self._meta)
 
+    def _plan_segment(self: LDF) -> PolarsPlanSegment:
+        """Returns the segment of the pending Polars plan, built once per plan."""
+        seg = self.__dict__.get("_segment")
+        if seg is None or seg.plan is not self._inner:
+            seg = PolarsPlanSegment(self._inner)
+            self.__dict__["_segment"] = seg
+        return seg
+
+    @property
+    def _segments(self: LDF) -> List[CompositePlanSegment]:
+        return [*self._meta._prev_segments, self._plan_segment()]
+
     @property
     def composite_plan(self: LDF) -> str:
         """Gets composite_plan
         Returns:
             Composite_plan as str
         """
-        return to_json(
-            PlanSegments(
-                segments=[*self._meta._prev_segments, PolarsPlanSegment(self._inner)]
-            )
+        # segments cache their serialization: only new segments are serialized
+        return (
+            '{"segments":[' + ",".join(seg.serialized for seg in self._segments) + "]}"
         )
 
+    @property
+    def packed_plan(self: LDF) -> bytes:
+        """Gets the composite plan encoded with MessagePack
+        Returns:
+            Packed composite plan as bytes
+        """
+        return pack_plan(seg.packed for seg in self._segments)
+
+    @property
+    def plan_digest(self: LDF) -> str:
+        """Gets a hash of the composite plan, computed from the (cached) hashes of its segments
+        Returns:
+            Digest as str
+        """
+        h = hashlib.sha256()
+        for seg in self._segments:
+            h.update(seg.segment_digest.encode("ascii"))
+        return h.hexdigest()
+
+    def explain(self: LDF) -> str:
+        """Describes the composite plan run by `collect`, as a DAG of data frames.
+        Subplans used several times (for instance by both sides of a self-join) are marked as shared:
+        the server only runs them once per query.
+        Returns:
+            str: The description of the plan
+        """
+        return _explain_segments(self._segments)
+
     def collect(self: LDF) -> LDF:
         """runs any pending queries/actions on RemoteLazyFrame that have not yet been performed.
         Returns:
             FetchableLazyFrame: FetchableLazyFrame of datarame after any queries have been performed
         """
-        return self._meta._polars_client._run_query(self.composite_plan)
+        return self._meta._polars_client._run_query(self)
 
     @staticmethod
     def sql(query: str, *rdfs: LDF) -> LDF:
@@ -362,10 +511,26 @@ class RemoteLazyFrame:
         Args:
             columns (List[str]): List of columns that user-defined function should be applied to
             udf (Callable): user-defined function to be applied to columns, must be a compatible input for torch.jit.script() function.
+                If it defines a `to_expr(col: pl.Expr) -> pl.Expr` method returning an equivalent Polars expression (like ApplyBins,
+                ApplyAbs, ApplyClip and ApplyAffine), the expression is used instead so that the query stays a single Polars plan.
         Returns:
             RemoteLazyFrame: An updated RemoteLazyFrame after udf applied
         """
-        ts_udf = torch.jit.script(udf)
+        # running a TorchScript udf materializes the upstream plan on the server:
+        # udfs with an equivalent expression are lowered into the Polars plan instead
+        to_expr = getattr(udf, "to_expr", None)
+        if to_expr is not None:
+            schema = self._inner.schema
+            for col in columns:
+                if col not in schema:
+                    raise ValueError("Column ", col, " not found in dataframe")
+            # udfs keep the type of the columns they are applied to
+            return self.with_columns(
+                [to_expr(pl.col(col)).cast(schema[col]).alias(col) for col in columns]
+            )
+
+        # the udf is scripted and uploaded once, and then referenced by its digest
+        digest = self._meta._polars_client._udfs.register(udf)
         df = pl.DataFrame(
             [pl.Series(k, dtype=v) for k, v in self._inner.schema.items()]
         )
@@ -375,8 +540,8 @@ class RemoteLazyFrame:
                 self._meta._polars_client,
                 [
                     *self._meta._prev_segments,
-                    PolarsPlanSegment(self._inner),
-                    UdfPlanSegment(columns=columns, udf=ts_udf),
+                    self._plan_segment(),
+                    UdfPlanSegment(columns=columns, digest=digest),
                 ],
             ),
         )
@@ -397,9 +562,9 @@ class RemoteLazyFrame:
                 self._meta._polars_client,
                 [
                     *df2._meta._prev_segments,
-                    PolarsPlanSegment(df2._inner),
+                    df2._plan_segment(),
                     *self._meta._prev_segments,
-                    PolarsPlanSegment(self._inner),
+                    self._plan_segment(),
                     StackPlanSegment(),
                 ],
             ),
@@ -412,23 +577,22 @@ class RemoteLazyFrame:
         Returns:
             RemoteLazyFrame: The RemoteLazyFrame with new row count/index column
         """
+        # the schema includes the new (first, UInt32) column, like on the server,
+        # so that the following operations can use it before the next collect()
         df = pl.DataFrame(
             [pl.Series(k, dtype=v) for k, v in self._inner.schema.items()]
-        )
-        ret = RemoteLazyFrame(
+        ).with_row_count(name)
+        return RemoteLazyFrame(
             df.lazy(),
             Metadata(
                 self._meta._polars_client,
                 [
                     *self._meta._prev_segments,
-                    PolarsPlanSegment(self._inner),
+                    self._plan_segment(),
                     RowCountSegment(name),
                 ],
             ),
         )
-        # Either we need to collect before returning OR we need to make it clear to users they need to call collect() with this function
-        # because if not this leads to panics etc. when we follow this with other operations that use the new column before next using collect()
-        return ret.collect()
 
     def join(
         self: LDF,
@@ -476,6 +640,49 @@ class RemoteLazyFrame:
             ),
         )
 
+    def join_local(
+        self: LDF,
+        other: pl.DataFrame,
+        left_on: Union[str, pl.Expr, Sequence[Union[str, pl.Expr]], None] = None,
+        right_on: Union[str, pl.Expr, Sequence[Union[str, pl.Expr]], None] = None,
+        on: Union[str, pl.Expr, Sequence[Union[str, pl.Expr]], None] = None,
+        how: pl.internals.type_aliases.JoinStrategy = "inner",
+        suffix: str = "_right",
+    ) -> LDF:
+        """Joins columns of a local DataFrame.
+        The local DataFrame is uploaded as an ephemeral DataFrame, dropped by the server at the end of the session,
+        and referenced by the query: it is not inlined in the query as literals.
+        Args:
+            other (pl.DataFrame): The local DataFrame you want to join your current dataframe with.
+            left_on (Union[str, pl.Expr, Sequence[Union[str, pl.Expr]], None] = None): Name(s) of the left join column(s).
+            right_on (Union[str, pl.Expr, Sequence[Union[str, pl.Expr]], None] = None): Name(s) of the right join column(s).
+            on (Union[str, pl.Expr, Sequence[Union[str, pl.Expr]], None] = None): Name(s) of the join columns in both DataFrames.
+            how (pl.internals.type_aliases.JoinStrategy = "inner"): Join strategy {'inner', 'left', 'outer', 'semi', 'anti', 'cross'}
+            suffix (str = "_right"): Suffix to append to columns with a duplicate name.
+        Returns:
+            RemoteLazyFrame: An updated RemoteLazyFrame after join performed
+        """
+        side = self._meta._polars_client._send_side_table(other)
+        return self.join(side, left_on, right_on, on, how, suffix)
+
+    def is_in_local(self: LDF, column: str, values: Sequence) -> LDF:
+        """Keeps the rows whose value in `column` is one of `values`.
+        The values are uploaded as an ephemeral DataFrame and the rows are selected with a semi join (see `join_local`),
+        which is faster than an `is_in` expression with many literals.
+        Args:
+            column (str): The name of the column to filter on.
+            values (Sequence): The values to keep.
+        Raises:
+            ValueError: Incorrect column name given as column argument.
+        Returns:
+            RemoteLazyFrame: An updated RemoteLazyFrame after filter performed
+        """
+        schema = self._inner.schema
+        if column not in schema:
+            raise ValueError("Column ", column, " not found in dataframe")
+        side = pl.DataFrame([pl.Series(column, values).cast(schema[column])]).unique()
+        return self.join_local(side, on=column, how="semi")
+
     def join_asof(
         self: LDF,
         other: LDF,
@@ -619,93 +826,6 @@ class RemoteLazyFrame:
             )
         ax.set_title(title)
 
-    def barplot(
-        self: LDF,
-        x: str = None,
-        y: str = None,
-        estimator: str = "mean",
-        hue: str = None,
-        **kwargs,
-    ):
-        """Draws a barchart
-        barplot filters data down to necessary columns only and then calls Seaborn's barplot function.
-        Args:
-            x (str) = None: The name of column to be used for x axes.
-            y (str) = None: The name of column to be used for y axes.
-            estimator (str) = "mean": string represenation of estimator to be used in aggregated query. Options are: "mean", "median", "count", "max", "min", "std" and "sum"
-            hue (str) = None: The name of column to be used for colour encoding.
-            **kwargs: Other keyword arguments that will be passed to Seaborn's barplot function.
-        Raises:
-            ValueError: Incorrect column name given, no x or y values provided, estimator function not recognised
-            RequestRejected: Could not continue in function as data owner rejected a required access request
-            various exceptions: Note that exceptions may be raised from Seaborn when the barplot function is called,
-            for example, where kwargs keywords are not expected. See Seaborn documentation for further details.
-        """
-        # if there is a hue argument add them to cols and no duplicates
-        if x == None and y == None:
-            raise ValueError("Please provide a x or y column name")
-
-        allowed_fns = ["mean", "count", "max", "min", "std", "sum", "median"]
-
-        if estimator not in allowed_fns:
-            raise ValueError("Column ", col, " not found in dataframe")
-        if x != None and y != None:
-            selects = [x, y] if x != y else [x]
-        else:
-            selects = [x] if x != None else [y]
-        groups = [x]
-        if hue != None:
-            kwargs["hue"] = hue
-            if hue != x:
-                groups.append(hue)
-            if hue != x and hue != y:
-                selects.append(hue)
-
-        for col in selects:
-            if not col in self.columns:
-                raise ValueError("Column ", col, " not found in dataframe")
-
-        agg = y if y != None else x
-        agg_dict = {
-            "mean": pl.col(agg).mean(),
-            "count": pl.col(agg).count(),
-            "max": pl.col(agg).max(),
-            "min": pl.col(agg).min(),
-            "std": pl.col(agg).std(),
-            "sum": pl.col(agg).sum(),
-            "median": pl.col(agg).median(),
-        }
-        if x == None or y == None:
-            c = x if x != None else y
-            tmp = (
-                self.filter(pl.col(c) != None)
-                .select(agg_dict[estimator])
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            df = tmp.to_pandas()
-        else:
-            agg_fn = pl.col(y).mean()
-            tmp = (
-                self.filter(pl.col(x) != None)
-                .select(pl.col(y) for y in selects)
-                .groupby(pl.col(y) for y in groups)
-                .agg(agg_dict[estimator])
-                .sort(pl.col(x))
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            df = tmp.to_pandas()
-        # run query
-        if x == None:
-            sns.barplot(data=df, y=y, **kwargs)
-        elif y == None:
-            sns.barplot(data=df, x=x, **kwargs)
-        else:
-            sns.barplot(data=df, x=x, y=y, **kwargs)
-
     def histplot(
         self: LDF, x: str = "count", y: str = "count", bins: int = 10, **kwargs
     ):
@@ -734,6 +854,14 @@ class RemoteLazyFrame:
             print("Please provide an 'x' or 'y' value")
             return
 
+        tmp = self._histplot_query(col_x, col_y, bins).collect().fetch()
+        RequestRejected.check_valid_df(tmp)
+        RemoteLazyFrame._draw_histplot(tmp, col_x, col_y, **kwargs)
+
+    def _histplot_query(
+        self: LDF, col_x: str, col_y: str, bins: int, by: List[str] = []
+    ) -> LDF:
+        """Returns the query computing the histogram drawn by `histplot`, per group of the `by` columns."""
         model = ApplyBins(bins)
 
         # if we have only X or Y
@@ -743,20 +871,40 @@ class RemoteLazyFrame:
 
             if not col_x in self.columns and not col_y in self.columns:
                 raise ValueError("Please supply a valid column for x or y axes")
+            col = col_x if col_x != "count" else col_y
+            keys = [pl.col(k) for k in by if k != col]
 
-            tmp = (
+            return (
                 self.filter(q_x != None)
-                .select(q_x)
-                .apply_udf([col_x if col_x != "count" else col_y], model)
-                .groupby(q_x)
+                .select([q_x, *keys])
+                .apply_udf([col], model)
+                .groupby([q_x, *keys])
                 .agg(q_y)
                 .sort(q_x)
-                .collect()
-                .fetch()
             )
-            RequestRejected.check_valid_df(tmp)
-            df = tmp.to_pandas()
 
+        # If we have X and Y
+        for col in [col_x, col_y]:
+            if not col in self.columns:
+                raise ValueError("Column name not found in dataframe")
+        keys = [pl.col(k) for k in by if k not in [col_x, col_y]]
+        return (
+            self.filter(pl.col(col_x) != None)
+            .filter(pl.col(col_y) != None)
+            .select([pl.col(col_y), pl.col(col_x), *keys])
+            .apply_udf([col_x], model)
+            .groupby([pl.col(col_x), pl.col(col_y), *keys])
+            .agg(pl.count())
+            .sort(pl.col(col_x))
+        )
+
+    @staticmethod
+    def _draw_histplot(tmp: pl.DataFrame, col_x: str, col_y: str, **kwargs) -> None:
+        """Draws the histogram computed by `_histplot_query`."""
+        df = tmp.to_pandas()
+
+        # if we have only X or Y
+        if col_x == "count" or col_y == "count":
             # horizontal barplot where x axis is count
             if "color" not in kwargs:
                 kwargs["color"] = "lightblue"
@@ -778,22 +926,6 @@ class RemoteLazyFrame:
 
         # If we have X and Y
         else:
-            for col in [col_x, col_y]:
-                if not col in self.columns:
-                    raise ValueError("Column name not found in dataframe")
-            tmp = (
-                self.filter(pl.col(col_x) != None)
-                .filter(pl.col(col_y) != None)
-                .select([pl.col(col_y), pl.col(col_x)])
-                .apply_udf([col_x], model)
-                .groupby([pl.col(col_x), pl.col(col_y)])
-                .agg(pl.count())
-                .sort(pl.col(col_x))
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            df = tmp.to_pandas()
             my_cmap = sns.color_palette("Blues", as_cmap=True)
             pivot = df.pivot(index=col_y, columns=col_x, values="count")
             if "cmap" not in kwargs:
@@ -911,6 +1043,22 @@ class RemoteLazyFrame:
             various exceptions: Note that exceptions may be raised from Seaborn when the barplot function is called,
             for example, where kwargs keywords are not expected. See Seaborn documentation for further details.
         """
+
+        if hue != None:
+            kwargs["hue"] = hue
+        tmp = self._barplot_query(x, y, estimator, hue).collect().fetch()
+        RequestRejected.check_valid_df(tmp)
+        RemoteLazyFrame._draw_barplot(tmp, x, y, **kwargs)
+
+    def _barplot_query(
+        self: LDF,
+        x: str = None,
+        y: str = None,
+        estimator: str = "mean",
+        hue: str = None,
+        by: List[str] = [],
+    ) -> LDF:
+        """Returns the aggregated query drawn by `barplot`, per group of the `by` columns."""
         # if there is a hue argument add them to cols and no duplicates
         if x == None and y == None:
             raise ValueError("Please provide a x or y column name")
@@ -918,20 +1066,19 @@ class RemoteLazyFrame:
         allowed_fns = ["mean", "count", "max", "min", "std", "sum", "median"]
 
         if estimator not in allowed_fns:
-            raise ValueError("Column ", col, " not found in dataframe")
+            raise ValueError("Estimator ", estimator, " not recognised")
         if x != None and y != None:
             selects = [x, y] if x != y else [x]
         else:
             selects = [x] if x != None else [y]
         groups = [x]
         if hue != None:
-            kwargs["hue"] = hue
             if hue != x:
                 groups.append(hue)
             if hue != x and hue != y:
                 selects.append(hue)
 
-        for col in selects:
+        for col in selects + by:
             if not col in self.columns:
                 raise ValueError("Column ", col, " not found in dataframe")
 
@@ -947,28 +1094,31 @@ class RemoteLazyFrame:
         }
         if x == None or y == None:
             c = x if x != None else y
-            tmp = (
-                self.filter(pl.col(c) != None)
-                .select(agg_dict[estimator])
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            df = tmp.to_pandas()
-        else:
-            agg_fn = pl.col(y).mean()
-            tmp = (
-                self.filter(pl.col(x) != None)
-                .select(pl.col(y) for y in selects)
-                .groupby(pl.col(y) for y in groups)
+            keys = [k for k in by if k != c]
+            query = self.filter(pl.col(c) != None)
+            if len(keys) == 0:
+                return query.select(agg_dict[estimator])
+            return (
+                query.select([pl.col(k) for k in [c, *keys]])
+                .groupby([pl.col(k) for k in keys])
                 .agg(agg_dict[estimator])
-                .sort(pl.col(x))
-                .collect()
-                .fetch()
+                .sort([pl.col(k) for k in keys])
             )
-            RequestRejected.check_valid_df(tmp)
-            df = tmp.to_pandas()
-        # run query
+
+        groups += [k for k in by if k not in groups]
+        selects += [k for k in by if k not in selects]
+        return (
+            self.filter(pl.col(x) != None)
+            .select([pl.col(c) for c in selects])
+            .groupby([pl.col(c) for c in groups])
+            .agg(agg_dict[estimator])
+            .sort(pl.col(x))
+        )
+
+    @staticmethod
+    def _draw_barplot(tmp: pl.DataFrame, x: str = None, y: str = None, **kwargs):
+        """Draws the bar chart computed by `_barplot_query`."""
+        df = tmp.to_pandas()
         if x == None:
             sns.barplot(data=df, y=y, **kwargs)
         elif y == None:
@@ -982,53 +1132,45 @@ class RemoteLazyFrame:
         y: str = None,
         ax=None,
     ):
-        # todo check error handling if data owner rejects
-        boxes = []
+        # the statistics of all the boxes are computed by a single aggregated query
         if x == None or y == None:
-            if y == None:
-                col_x = pl.col(x)
-            else:
-                col_x = pl.col(y)
-            ax.set_ylabel(x if x is not None else y)
-            q1 = self.select(col_x.quantile(0.25)).collect().fetch().to_numpy()[0]
-            q3 = self.select(col_x.quantile(0.75)).collect().fetch().to_numpy()[0]
+            col, by = (x if x is not None else y), None
+            ax.set_ylabel(col)
+        else:
+            col, by = y, x
+            ax.set_ylabel(y)
+            ax.set_xlabel(x)
+
+        col_y = pl.col(col)
+        stats = [
+            col_y.min().alias("whislo"),
+            col_y.quantile(0.25).alias("q1"),
+            col_y.median().alias("med"),
+            col_y.quantile(0.75).alias("q3"),
+            col_y.max().alias("whishi"),
+        ]
+        if by is None:
+            query = self.select(stats)
+        else:
+            query = self.groupby(pl.col(by)).agg(stats).sort(pl.col(by))
+        df = query.collect().fetch()
+        RequestRejected.check_valid_df(df)
+
+        labels = [x] if by is None else df.get_column(by).to_list()
+        rows = df.select(["whislo", "q1", "med", "q3", "whishi"]).rows()
+        boxes = []
+        for label, (whislo, q1, med, q3, whishi) in zip(labels, rows):
             boxes.append(
                 {
-                    "label": x,
-                    "whislo": self.select(col_x.min()).collect().fetch().to_numpy()[0],
+                    "label": label,
+                    "whislo": whislo,
                     "q1": q1,
-                    "med": self.select(col_x.median()).collect().fetch().to_numpy()[0],
+                    "med": med,
                     "q3": q3,
                     "iqr": q3 - q1,
-                    "whishi": self.select(col_x.max()).collect().fetch().to_numpy()[0],
+                    "whishi": whishi,
                 }
             )
-
-        else:
-            col_x = pl.col(x)
-            col_y = pl.col(y)
-            ax.set_ylabel(y)
-            ax.set_xlabel(x)
-            mins = self.groupby(col_x).agg(col_y.min()).sort(col_x)
-            maxes = self.groupby(col_x).agg(col_y.max()).sort(col_x)
-            meds = self.groupby(col_x).agg(col_y.median()).sort(col_x)
-            q1s = self.groupby(col_x).agg(col_y.quantile(0.25)).sort(col_x)
-            q3s = self.groupby(col_x).agg(col_y.quantile(0.75)).sort(col_x)
-            iqrs = self.groupby(col_x).agg(col_y.quantile(0.25)).sort(col_x)
-            labels = mins.collect().fetch().to_numpy()[:, 0]
-
-            for x in range(len(labels)):
-                boxes.append(
-                    {
-                        "label": labels[x],
-                        "whislo": mins.collect().fetch().to_numpy()[x, 1],
-                        "q1": q1s.collect().fetch().to_numpy()[x, 1],
-                        "med": meds.collect().fetch().to_numpy()[x, 1],
-                        "q3": q3s.collect().fetch().to_numpy()[x, 1],
-                        "iqr": iqrs.collect().fetch().to_numpy()[x, 1],
-                        "whishi": maxes.collect().fetch().to_numpy()[x, 1],
-                    }
-                )
         return boxes
 
     def boxplot(
@@ -1063,6 +1205,7 @@ class RemoteLazyFrame:
             **kwargs: keyword arguments that will be passed to Matplolib's bxp function
         Raises:
             ValueError: Incorrect column name given
+            RequestRejected: Could not continue in function as data owner rejected a required access request
             various exceptions: Note that exceptions may be raised from Seaborn when the lineplot function is called,
             for example, where kwargs keywords are not expected. See Seaborn documentation for further details.
         """
@@ -1286,6 +1429,8 @@ class FetchableLazyFrame(RemoteLazyFrame):
     """
 
     _identifier: str
+    #: Keeps the DataFrame alive on the server while this frame (or a plan reading from it) is referenced.
+    _reference: Optional[RemoteReference] = None
 
     def to_array(self: "FetchableLazyFrame") -> "RemoteArray":
         """
@@ -1311,7 +1456,12 @@ class FetchableLazyFrame(RemoteLazyFrame):
         return self._identifier
 
     @staticmethod
-    def _from_reference(client: BastionLabPolars, ref: ReferenceResponse) -> LDF:
+    def _from_reference(
+        client: BastionLabPolars, ref: ReferenceResponse, acquired: bool = False
+    ) -> LDF:
+        """Builds the FetchableLazyFrame of a DataFrame stored on the server.
+        `acquired` is set when the server has just handed out the reference (to the result of
+        a query or a side table): the DataFrame is released once it is not referenced anymore."""
         header = json.loads(ref.header)["inner"]
 
         def get_dtype(v: Union[str, Dict]):
@@ -1328,10 +1478,21 @@ class FetchableLazyFrame(RemoteLazyFrame):
 
         df = pl.DataFrame([get_series(k, v) for k, v in header.items()])
 
+        references = client._references
+        reference = (
+            references.acquire(ref.identifier)
+            if acquired
+            else references.attach(ref.identifier)
+        )
+        entry_point = EntryPointPlanSegment(ref.identifier)
+        # plans derived from this frame share the segment, and keep the DataFrame alive
+        entry_point.__dict__["_reference"] = reference
+
         return FetchableLazyFrame(
             _identifier=ref.identifier,
             _inner=df.lazy(),
-            _meta=Metadata(client, [EntryPointPlanSegment(ref.identifier)]),
+            _meta=Metadata(client, [entry_point]),
+            _reference=reference,
         )
 
     def __str__(self) -> str:
@@ -1340,6 +1501,17 @@ class FetchableLazyFrame(RemoteLazyFrame):
     def __repr__(self) -> str:
         return str(self)
 
+    @property
+    def tier(self) -> str:
+        """
+        Where the data of the DataFrame is currently stored on the server: "memory", or "disk" once
+        it has been spilled to disk (it is reloaded in memory on its next access).
+
+        Return:
+            returns the storage tier
+        """
+        return self._meta._polars_client._get_tier(self._identifier)
+
     def fetch(self) -> pl.DataFrame:
         """Fetches your FetchableLazyFrame and returns it as a Polars DataFrame
         Returns:
@@ -1347,9 +1519,44 @@ class FetchableLazyFrame(RemoteLazyFrame):
         """
         return self._meta._polars_client._fetch_df(self._identifier)
 
+    def fetch_iter(self, batch_rows: Optional[int] = None) -> Iterator[pl.DataFrame]:
+        """Fetches your FetchableLazyFrame as a sequence of Polars DataFrames, decoded as the data is received,
+        so that large results can be processed without holding them entirely in memory.
+        Dropping (or closing) the iterator before the end cancels the transfer.
+        Args:
+            batch_rows (Optional[int]): Number of rows of the yielded DataFrames (the last one may be smaller).
+                If None, the DataFrames follow the record batches sent by the server.
+        Returns:
+            Iterator[Polars.DataFrame]: an iterator over the rows of your FetchableLazyFrame, as Polars DataFrames
+        Raises:
+            RequestRejected: if the data owner rejected the query.
+        """
+        return self._meta._polars_client._fetch_df_iter(self._identifier, batch_rows)
+
+    def fetch_to(
+        self, path: str, format: str = "ipc"
+    ) -> Optional[Union[pl.DataFrame, pl.LazyFrame]]:
+        """Fetches your FetchableLazyFrame into a file, writing the data as it is received,
+        so that results larger than memory can be fetched.
+        Args:
+            path (str): Path of the file to write.
+            format (str): Format of the file, "ipc" (Arrow IPC file) or "parquet".
+        Returns:
+            Optional[Union[Polars.DataFrame, Polars.LazyFrame]]: for the "ipc" format, a Polars DataFrame memory-mapped
+                from the file; for the "parquet" format, a Polars LazyFrame scanning the file. None if the data owner
+                rejected the query.
+        """
+        return self._meta._polars_client._fetch_df_to(self._identifier, path, format)
+
     def save(self):
         return self._meta._polars_client._persist_df(self._identifier)
 
+    def pin(self):
+        """Keeps the DataFrame on the server until it is deleted: it is not released once this
+        FetchableLazyFrame is garbage collected, nor dropped when the session ends.
+        """
+        return self._meta._polars_client._pin_df(self._identifier)
+
     def delete(self):
         return self._meta._polars_client._delete_df(self._identifier)
 
@@ -1461,191 +1668,98 @@ class Facet:
         self.__bastion_map("barplot", x=x, y=y, **kwargs)
 
     def __bastion_map(self, fn: str, x: str = None, y: str = None, **kwargs):
-        # create list of all columns needed for query
-        hue = kwargs["hue"] if "hue" in kwargs else None
-        selects = []
-        for to_add in [x, y, self.col, self.row, hue]:
-            if to_add != None:
-                selects.append(to_add)
-
-        for col in selects:
-            if col not in self.inner_rdf.columns:
-                raise ValueError("Column ", col, " not found in dataframe")
-
-        # get unique row and col values
-        cols = []
-        rows = []
-        if self.col != None:
-            tmp = (
-                self.inner_rdf.groupby(pl.col(self.col))
-                .agg(pl.count())
-                .sort(pl.col(self.col))
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            cols = tmp.to_pandas()[self.col].tolist()
-        if self.row != None:
-            tmp = (
-                self.inner_rdf.groupby(pl.col(self.row))
-                .agg(pl.count())
-                .sort(pl.col(self.row))
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            rows = tmp.to_pandas()[self.row].tolist()
-
+        # the cells are aggregated on the server by a single query grouped by row/column values
+        by = [k for k in [self.row, self.col] if k != None]
         if fn == "histplot":
-            bins = kwargs["bins"] if "bins" in kwargs else 10
-            del kwargs["bins"]
-        if fn == "barplot":
-            del kwargs["hue"]
-            estimator = kwargs["estimator"] if "estimator" in kwargs else None
-            del kwargs["estimator"]
-
-        # mapping
-        r_len = len(rows) if len(rows) != 0 else 1
-        c_len = len(cols) if len(cols) != 0 else 1
-        if self.kwargs == None:
-            fig, axes = plt.subplots(r_len, c_len, figsize=((5 * c_len), (5 * r_len)))
+            bins = kwargs.pop("bins", 10)
+            col_x = x if x != None else "count"
+            col_y = y if y != None else "count"
+            if col_x == "count" and col_y == "count":
+                print("Please provide an 'x' or 'y' value")
+                return
+            for col in by:
+                if col not in self.inner_rdf.columns:
+                    raise ValueError("Column ", col, " not found in dataframe")
+            query = self.inner_rdf._histplot_query(col_x, col_y, bins, by)
+            draw = lambda df, ax: RemoteLazyFrame._draw_histplot(
+                df, col_x, col_y, ax=ax, **kwargs
+            )
         else:
-            if "figsize" not in self.kwargs:
-                self.kwargs["figsize"] = ((5 * c_len), (5 * r_len))
-            fig, axes = plt.subplots(r_len, c_len, **self.kwargs)
-        cols_len = len(cols)
-        rows_len = len(rows)
-        if (cols_len != 0) and (rows_len != 0):
-            for col_count in range(cols_len):
-                for row_count in range(rows_len):
-                    df = self.inner_rdf.clone().filter(
-                        (pl.col(self.col) == cols[col_count])
-                        & (pl.col(self.row) == rows[row_count])
-                    )
-                    t1 = (
-                        self.row
-                        + ": "
-                        + str(rows[row_count])
-                        + " | "
-                        + self.col
-                        + ": "
-                        + str(cols[col_count])
-                    )
-                    if fn == "histplot":
-                        df.select([pl.col(x) for x in selects]).histplot(
-                            x, y, bins, ax=axes[row_count, col_count], **kwargs
-                        )
-                    else:
-                        df.select([pl.col(x) for x in selects]).barplot(
-                            x,
-                            y,
-                            hue=hue,
-                            estimator=estimator,
-                            ax=axes[row_count, col_count],
-                            **kwargs,
-                        )
-                    axes[row_count, col_count].set_title(t1)
+            hue = kwargs.pop("hue", None)
+            estimator = kwargs.pop("estimator", "mean")
+            query = self.inner_rdf._barplot_query(x, y, estimator, hue, by)
+            if hue != None:
+                kwargs["hue"] = hue
+            draw = lambda df, ax: RemoteLazyFrame._draw_barplot(
+                df, x, y, ax=ax, **kwargs
+            )
 
-        else:
-            col_check = True if cols_len != 0 else False
-            max_len = cols_len if col_check else rows_len
-            my_list = cols if col_check else rows
-            t = self.col if col_check else self.row
-            for count in range(max_len):
-                df = self.inner_rdf.clone().filter((pl.col(t) == my_list[count]))
-                t1 = t + ": " + str(my_list[count])
-                if fn == "histplot":
-                    df.select([pl.col(x) for x in selects]).histplot(
-                        x, y, bins, ax=axes[count], **kwargs
-                    )
-                else:
-                    df.select([pl.col(x) for x in selects]).barplot(
-                        x, y, hue=hue, estimator=estimator, ax=axes[count], **kwargs
-                    )
-                axes[count].set_title(t1)
+        tmp = query.collect().fetch()
+        RequestRejected.check_valid_df(tmp)
+        self.__draw_grid(tmp, draw)
 
     def __map(self: LDF, func, **kwargs) -> None:
         # create list of all columns needed for query
-        selects = [self.col, self.row]
-        if "x" in kwargs and not kwargs["x"] in selects:
-            selects.append(kwargs["x"])
-        if "y" in kwargs and not kwargs["y"] in selects:
-            selects.append(kwargs["y"])
+        selects = [k for k in [self.col, self.row] if k != None]
+        for key in ["x", "y", "hue", "style"]:
+            if key in kwargs and not kwargs[key] in selects:
+                selects.append(kwargs[key])
 
         for col in selects:
             if col not in self.inner_rdf.columns:
                 raise ValueError("Column ", col, " not found in dataframe")
 
-        # get unique row and col values
-        cols = []
-        rows = []
-        if self.col != None:
-            tmp = (
-                self.inner_rdf.groupby(pl.col(self.col))
-                .agg(pl.count())
-                .sort(pl.col(self.col))
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            cols = tmp.to_pandas()[self.col].tolist()
-
-        if self.row != None:
-            tmp = (
-                self.inner_rdf.groupby(pl.col(self.row))
-                .agg(pl.count())
-                .sort(pl.col(self.row))
-                .collect()
-                .fetch()
-            )
-            RequestRejected.check_valid_df(tmp)
-            rows = tmp.to_pandas()[self.row].tolist()
+        # the rows of all the cells are fetched at once
+        tmp = self.inner_rdf.select([pl.col(x) for x in selects]).collect().fetch()
+        RequestRejected.check_valid_df(tmp)
+        self.__draw_grid(tmp, lambda df, ax: func(data=df.to_pandas(), ax=ax, **kwargs))
+
+    def __draw_grid(
+        self, df: pl.DataFrame, draw: Callable[[pl.DataFrame, mat.axes.Axes], None]
+    ) -> None:
+        # splits the fetched DataFrame into the cells of the grid and draws each of them
+        keys = [k for k in [self.row, self.col] if k != None]
+        rows = (
+            df.get_column(self.row).unique().sort().to_list()
+            if self.row != None
+            else [None]
+        )
+        cols = (
+            df.get_column(self.col).unique().sort().to_list()
+            if self.col != None
+            else [None]
+        )
 
-        # mapping
-        r_len = len(rows) if len(rows) > 0 else 1
-        c_len = len(cols) if len(cols) > 0 else 1
+        r_len = len(rows)
+        c_len = len(cols)
         if self.kwargs == None:
             fig, axes = plt.subplots(r_len, c_len, figsize=((5 * c_len), (5 * r_len)))
         else:
             if "figsize" not in self.kwargs:
                 self.kwargs["figsize"] = ((5 * c_len), (5 * r_len))
             fig, axes = plt.subplots(r_len, c_len, **self.kwargs)
-        cols_len = len(cols)
-        rows_len = len(rows)
-        if (cols_len != 0) & (rows_len != 0):
-            for col_count in range(cols_len):
-                for row_count in range(rows_len):
-                    df = self.inner_rdf.clone().filter(
-                        (pl.col(self.col) == cols[col_count])
-                        & (pl.col(self.row) == rows[row_count])
-                    )
-                    t1 = (
-                        self.row
-                        + ": "
-                        + str(rows[row_count])
-                        + " | "
-                        + self.col
-                        + ": "
-                        + str(cols[col_count])
-                    )
-                    tmp = df.select([pl.col(x) for x in selects]).collect().fetch()
-                    RequestRejected.check_valid_df(tmp)
-                    sea_df = tmp.to_pandas()
-                    func(data=sea_df, ax=axes[row_count, col_count], **kwargs)
-                    axes[row_count, col_count].set_title(t1)
+        axes = np.array(axes).reshape(r_len, c_len)
+
+        if len(keys) == 0:
+            cells = {(): df}
         else:
-            col_check = True if cols_len != 0 else False
-            max_len = cols_len if col_check else rows_len
-            my_list = cols if col_check else rows
-            t = self.col if col_check else self.row
-            for count in range(max_len):
-                df = self.inner_rdf.clone().filter((pl.col(t) == my_list[count]))
-                t1 = t + ": " + str(my_list[count])
-                tmp = df.select([pl.col(x) for x in selects]).collect().fetch()
-                RequestRejected.check_valid_df(tmp)
-                sea_df = tmp.to_pandas()
-                func(data=sea_df, ax=axes[row_count, col_count], **kwargs)
-                axes[count].set_title(t1)
+            cells = df.partition_by(keys, as_dict=True)
+        for row_count, row in enumerate(rows):
+            for col_count, col in enumerate(cols):
+                values = tuple(
+                    v for k, v in [(self.row, row), (self.col, col)] if k != None
+                )
+                key = values[0] if len(values) == 1 else values
+                ax = axes[row_count, col_count]
+                if key in cells:
+                    draw(cells[key], ax)
+                ax.set_title(
+                    " | ".join(
+                        f"{k}: {v}"
+                        for k, v in [(self.row, row), (self.col, col)]
+                        if k != None
+                    )
+                )
 
 
 # TODO: implement apply method
@@ -1719,6 +1833,8 @@ class RemoteArray(RemoteLazyFrame):
     def __init__(self, client: "Client", identifier: str) -> None:
         self._client = client
         self.identifier = identifier
+        # arrays are released once they are not referenced anymore
+        self._reference = client.polars._references.acquire(identifier)
 
     def to_tensor(self) -> "RemoteTensor":
         """
@@ -0,0 +1,121 @@
+from typing import Any, Callable, Dict, Optional
+import hashlib
+import inspect
+import torch
+
+
+def udf_digest(data: bytes) -> str:
+    """Returns the digest identifying a serialized TorchScript udf (as computed by the server)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hash_value(h: "hashlib._Hash", value: Any) -> bool:
+    """Feeds `value` to `h`. Returns False if the value cannot be hashed reliably."""
+    if isinstance(value, torch.Tensor):
+        h.update(f"tensor:{value.dtype}:{tuple(value.shape)}:".encode("utf8"))
+        h.update(value.detach().cpu().contiguous().numpy().tobytes())
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        h.update(f"{type(value).__name__}:{value!r};".encode("utf8"))
+    elif isinstance(value, (list, tuple)):
+        h.update(f"{type(value).__name__}:{len(value)}:".encode("utf8"))
+        return all(_hash_value(h, v) for v in value)
+    elif isinstance(value, torch.nn.Module):
+        return _hash_module(h, value)
+    else:
+        return False
+    return True
+
+
+def _hash_module(h: "hashlib._Hash", module: torch.nn.Module) -> bool:
+    try:
+        source = inspect.getsource(type(module))
+    except (OSError, TypeError):
+        return False
+    h.update(f"{type(module).__module__}.{type(module).__qualname__}:".encode("utf8"))
+    h.update(source.encode("utf8"))
+    for name, value in sorted(vars(module).items()):
+        if name in ("_parameters", "_buffers", "_modules"):
+            values = sorted(value.items())
+        elif name.startswith("_") or name == "training":
+            # hooks and other internal state of torch.nn.Module
+            continue
+        else:
+            values = [(name, value)]
+        for k, v in values:
+            h.update(f"{k}=".encode("utf8"))
+            if not _hash_value(h, v):
+                return False
+    return True
+
+
+def _hash_function(h: "hashlib._Hash", fn: Callable) -> bool:
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        return False
+    h.update(f"{fn.__module__}.{fn.__qualname__}:".encode("utf8"))
+    h.update(source.encode("utf8"))
+    closure = [c.cell_contents for c in fn.__closure__ or []]
+    return _hash_value(h, list(fn.__defaults__ or [])) and _hash_value(h, closure)
+
+
+def udf_key(udf: Callable) -> Optional[str]:
+    """Returns a key identifying `udf` by its source and parameters, or None if it cannot be
+    identified reliably (for instance when its source is not available) and must be scripted
+    every time it is used."""
+    if isinstance(udf, (torch.jit.ScriptModule, torch.jit.ScriptFunction)):
+        return None
+    h = hashlib.sha256()
+    if isinstance(udf, torch.nn.Module):
+        ok = _hash_module(h, udf)
+    elif inspect.isfunction(udf):
+        ok = _hash_function(h, udf)
+    else:
+        ok = False
+    return h.hexdigest() if ok else None
+
+
+class UdfRegistry:
+    """Scripts, serializes and uploads each user-defined function once.
+
+    Scripted udfs are memoized by their source and parameters (see `udf_key`) and uploaded to
+    the server's module cache, where they are referenced by the digest of their serialization.
+
+    Args:
+        upload: Sends a serialized udf to the server and returns its digest.
+    """
+
+    def __init__(self, upload: Callable[[bytes], str]) -> None:
+        self._upload = upload
+        self._digests: Dict[str, str] = {}
+        # serializations of the uploaded udfs, to upload them again if the server lost them
+        self._uploaded: Dict[str, bytes] = {}
+
+    def register(self, udf: Callable) -> str:
+        """Returns the digest of `udf`, scripting and uploading it first if needed."""
+        key = udf_key(udf)
+        digest = self._digests.get(key) if key is not None else None
+        if digest is not None and digest in self._uploaded:
+            return digest
+
+        # scripting an already scripted udf returns it unchanged
+        data = torch.jit.script(udf).save_to_buffer()
+        digest = udf_digest(data)
+        if digest not in self._uploaded:
+            digest = self._upload(data)
+            self._uploaded[digest] = data
+        if key is not None:
+            self._digests[key] = digest
+        return digest
+
+    def reupload(self, digest: str) -> bool:
+        """Uploads the udf of the given digest again, e.g. after the server restarted or unloaded it.
+        Returns False if no udf of this digest has been uploaded by the registry."""
+        data = self._uploaded.get(digest)
+        if data is None:
+            return False
+        self._upload(data)
+        return True
+
+
+__all__ = ["UdfRegistry", "udf_key", "udf_digest"]
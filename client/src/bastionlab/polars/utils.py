@@ -1,24 +1,60 @@
-from typing import Iterator, Tuple, List
+from typing import Iterator, Tuple, List, Optional, Union
 import torch
 import polars as pl
 import io
 import json
+import os
+import uuid
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
 from ..pb.bastionlab_polars_pb2 import SendChunk, FetchChunk
 from .policy import Policy
+from ..streaming import ChunkSizer, StreamStats
 from serde.json import to_json
 
-CHUNK_SIZE = 32 * 1024
+# Target size of the record batches written to the upload stream. Batches are
+# encoded one at a time so that only one of them is held in memory at once.
+RECORD_BATCH_SIZE = 4 * 1024 * 1024
 
-# TODO PERF: Do a PR on polars/pypolars to add the streaming IPC (apache flight) format to the python interface
-# right now, there is only the file format which requires random access
-# which means, we have to do a full copy to a buffer and we cannot parse it as we go
+
+class _BufferSink:
+    """Minimal writable file-like object collecting the buffers written by
+    `pyarrow.ipc.RecordBatchStreamWriter`, so that they can be drained after
+    each record batch without being concatenated into a single buffer.
+    """
+
+    def __init__(self) -> None:
+        self.buffers = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        view = memoryview(data)
+        self.buffers.append(view)
+        return view.nbytes
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> List[memoryview]:
+        buffers, self.buffers = self.buffers, []
+        return buffers
 
 
 def serialize_dataframe(
-    df: pl.DataFrame, policy: Policy, sanitized_columns: List[str]
+    df: pl.DataFrame,
+    policy: Policy,
+    sanitized_columns: List[str],
+    sizer: Optional[ChunkSizer] = None,
+    ephemeral: bool = False,
 ) -> Iterator[SendChunk]:
     """Converts Polars `DataFrame` to BastionLab `SendChunk` protobuf message.
-    This currently uses the Apache IPC format.
+    This uses the Apache Arrow IPC streaming format: the DataFrame is encoded one record batch
+    at a time and each batch is sliced into chunks as soon as it is written, so the whole
+    DataFrame is never copied into a single intermediate buffer.
     Args:
         df : polars.internals.dataframe.frame.DataFrame
             Polars DataFrame
@@ -28,50 +64,234 @@ def serialize_dataframe(
         sanitized_columns : List[str]
             This field contains the sensitive columns in the DataFrame that will be removed when a Data Scientist
             wishes to fetch a query performed on the DataFrame.
+        sizer : Optional[ChunkSizer]
+            Chooses the size of the chunks. Defaults to an adaptive sizer.
+        ephemeral : bool
+            Whether the DataFrame only lives as long as the current session.
     Returns:
         Iterator[SendChunk]
     """
-    buf = io.BytesIO()
+    if sizer is None:
+        sizer = ChunkSizer(StreamStats("SendDataFrame"))
 
-    df.write_ipc(buf)
+    table = df.to_arrow()
+    row_size = max(1, df.estimated_size() // max(1, df.height))
+    batch_rows = max(1, RECORD_BATCH_SIZE // row_size)
 
-    buf.seek(0)
-    max = len(buf.getvalue())
+    sink = _BufferSink()
+    writer = pa.ipc.new_stream(sink, table.schema)
     first = True
-    while buf.tell() < max:
-        data = buf.read(CHUNK_SIZE)
-
-        if first:
-            chunk = SendChunk(
-                data=data,
-                policy=to_json(policy),
-                sanitized_columns=sanitized_columns,
-            )
-            first = False
-        else:
-            chunk = SendChunk(data=data)
 
-        yield chunk
+    def sliced() -> Iterator[SendChunk]:
+        nonlocal first
+        for buffer in sink.drain():
+            offset = 0
+            while offset < buffer.nbytes:
+                # protobuf needs an owned bytes object: only copy one chunk at a time
+                data = bytes(buffer[offset : offset + sizer.size])
+                offset += len(data)
+                if first:
+                    first = False
+                    yield SendChunk(
+                        data=data,
+                        policy=to_json(policy),
+                        sanitized_columns=sanitized_columns,
+                        ephemeral=ephemeral,
+                    )
+                else:
+                    yield SendChunk(data=data)
+
+    for batch in table.to_batches(max_chunksize=batch_rows):
+        writer.write_batch(batch)
+        yield from sizer.timed(sliced(), lambda chunk: len(chunk.data))
+
+    writer.close()
+    yield from sizer.timed(sliced(), lambda chunk: len(chunk.data))
+
+
+# Magic bytes at the start of an Arrow IPC file. Older servers send dataframes in the
+# file format, newer ones use the streaming format, which does not start with it.
+ARROW_FILE_MAGIC = b"ARROW1"
+
+
+class _ChunksReader(io.RawIOBase):
+    """Read-only file-like object over an iterator of `bytes` chunks.
+    It lets pyarrow decode an IPC stream as the chunks are received.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self.chunks = chunks
+        self.current = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def peek(self, n: int) -> bytes:
+        while self.current.nbytes < n:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.current = memoryview(bytes(self.current) + chunk)
+        return bytes(self.current[:n])
+
+    def readinto(self, b) -> int:
+        while self.current.nbytes == 0:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.current = memoryview(chunk)
+        n = min(len(b), self.current.nbytes)
+        b[:n] = self.current[:n]
+        self.current = self.current[n:]
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        # pyarrow expects reads to be complete unless the end of the stream is reached
+        if size is None or size < 0:
+            return self.readall()
+        buf = bytearray(size)
+        view = memoryview(buf)
+        pos = 0
+        while pos < size:
+            n = self.readinto(view[pos:])
+            if n == 0:
+                break
+            pos += n
+        del view
+        if pos < size:
+            del buf[pos:]
+        return bytes(buf)
+
+
+def _table_to_dataframe(table: pa.Table) -> pl.DataFrame:
+    # categorical columns of a multi-batch table cannot be loaded by polars without
+    # a global string cache: merge the batches first
+    return pl.from_arrow(table.combine_chunks())
 
 
 def deserialize_dataframe(chunks: Iterator[bytes]) -> pl.DataFrame:
     """Converts chunks of `bytes` sent from BastionLab server to DataFrame.
-    This currently uses the Apache IPC format.
+    This uses the Apache Arrow IPC streaming format (the file format is still accepted).
     Args:
         chunks : Iterator[bytes]
             Iterator of bytes sent from the server.
     Returns:
         polars.internals.dataframe.frame.DataFrame
     """
-    buf = io.BytesIO()
+    reader = _ChunksReader(iter(chunks))
+
+    if reader.peek(len(ARROW_FILE_MAGIC)) == ARROW_FILE_MAGIC:
+        return pl.read_ipc(io.BytesIO(reader.read()))
+
+    return _table_to_dataframe(pa.ipc.open_stream(reader).read_all())
+
+
+def deserialize_dataframe_iter(
+    chunks: Iterator[bytes], batch_rows: Optional[int] = None
+) -> Iterator[pl.DataFrame]:
+    """Converts chunks of `bytes` sent from BastionLab server to a sequence of DataFrames.
+    Record batches are decoded as soon as they are received.
+    Args:
+        chunks : Iterator[bytes]
+            Iterator of bytes sent from the server.
+        batch_rows : Optional[int]
+            Number of rows of the yielded DataFrames (the last one may be smaller).
+            If None, one DataFrame is yielded per record batch sent by the server.
+    Returns:
+        Iterator[polars.internals.dataframe.frame.DataFrame]
+    """
+    reader = _ChunksReader(iter(chunks))
+
+    if reader.peek(len(ARROW_FILE_MAGIC)) == ARROW_FILE_MAGIC:
+        df = pl.read_ipc(io.BytesIO(reader.read()))
+        step = batch_rows if batch_rows is not None else max(1, df.height)
+        for offset in range(0, df.height, step):
+            yield df.slice(offset, step)
+        return
 
-    for el in chunks:
-        buf.write(el)
+    stream = pa.ipc.open_stream(reader)
+    if batch_rows is None:
+        for batch in stream:
+            yield _table_to_dataframe(pa.Table.from_batches([batch]))
+        return
 
-    buf.seek(0)
-    df = pl.read_ipc(buf)
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    for batch in stream:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows < batch_rows:
+            continue
 
-    return df
+        table = pa.Table.from_batches(pending, schema=stream.schema)
+        offset = 0
+        while pending_rows - offset >= batch_rows:
+            yield _table_to_dataframe(table.slice(offset, batch_rows))
+            offset += batch_rows
+        pending = table.slice(offset).to_batches()
+        pending_rows -= offset
+
+    if pending_rows > 0:
+        yield _table_to_dataframe(pa.Table.from_batches(pending, schema=stream.schema))
+
+
+def write_dataframe_to(
+    chunks: Iterator[bytes], path: str, format: str = "ipc"
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """Writes chunks of `bytes` sent from BastionLab server to a file, one record batch at a time,
+    so that DataFrames larger than memory can be fetched.
+    Args:
+        chunks : Iterator[bytes]
+            Iterator of bytes sent from the server.
+        path : str
+            Path of the file to write.
+        format : str
+            Format of the file: "ipc" (Arrow IPC file) or "parquet".
+    Returns:
+        Union[polars.DataFrame, polars.LazyFrame]: the written file, as a memory-mapped DataFrame
+        for the "ipc" format, or as a LazyFrame scanning it for the "parquet" format. As with any
+        Parquet file holding several row groups, categorical columns can only be collected under
+        a `polars.StringCache`.
+    """
+    if format not in ("ipc", "parquet"):
+        raise ValueError(f'Unsupported format "{format}", expected "ipc" or "parquet"')
+
+    reader = _ChunksReader(iter(chunks))
+
+    # written next to `path` and moved in place once complete: a failed fetch leaves the file
+    # that may already exist at `path` untouched
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+    try:
+        if reader.peek(len(ARROW_FILE_MAGIC)) == ARROW_FILE_MAGIC:
+            # older servers send an IPC file, which is written as is
+            if format == "ipc":
+                with open(tmp, "wb") as f:
+                    shutil.copyfileobj(reader, f)
+            else:
+                pl.read_ipc(io.BytesIO(reader.read())).write_parquet(tmp)
+        else:
+            stream = pa.ipc.open_stream(reader)
+            if format == "ipc":
+                with pa.ipc.new_file(tmp, stream.schema) as writer:
+                    for batch in stream:
+                        writer.write_batch(batch)
+            else:
+                with pq.ParquetWriter(tmp, stream.schema) as writer:
+                    for batch in stream:
+                        writer.write_table(
+                            pa.Table.from_batches([batch], schema=stream.schema)
+                        )
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    if format == "ipc":
+        # categorical columns split across record batches can only be loaded with a string cache
+        with pl.StringCache():
+            return pl.read_ipc(path, memory_map=True)
+    return pl.scan_parquet(path)
 
 
 class ApplyBins(torch.nn.Module):
@@ -88,6 +308,12 @@ class ApplyBins(torch.nn.Module):
         bins = self.bin_size * torch.ones_like(x)
         return round(x // bins) * bins
 
+    def to_expr(self, col: pl.Expr) -> pl.Expr:
+        """Returns the equivalent Polars expression, applied to `col`."""
+        # Expr.floor() is not serializable: use a floor division
+        bin_size = self.bin_size.item()
+        return col // bin_size * bin_size
+
 
 class Palettes:
     dict = {
@@ -119,3 +345,44 @@ class ApplyAbs(torch.nn.Module):
 
     def forward(self, x):
         return torch.abs(x)
+
+    def to_expr(self, col: pl.Expr) -> pl.Expr:
+        """Returns the equivalent Polars expression, applied to `col`."""
+        # Expr.abs() is not serializable
+        return pl.when(col < 0).then(-col).otherwise(col)
+
+
+class ApplyClip(torch.nn.Module):
+    """BastionLab internal class used to serialize user-defined functions (UDF) in TorchScript.
+    It uses `torch.nn.Module` and clips the input value to the range [`min`, `max`].
+    """
+
+    def __init__(self, min: float, max: float) -> None:
+        super().__init__()
+        self.min = min
+        self.max = max
+
+    def forward(self, x):
+        return torch.clamp(x, self.min, self.max)
+
+    def to_expr(self, col: pl.Expr) -> pl.Expr:
+        """Returns the equivalent Polars expression, applied to `col`."""
+        return col.clip(self.min, self.max)
+
+
+class ApplyAffine(torch.nn.Module):
+    """BastionLab internal class used to serialize user-defined functions (UDF) in TorchScript.
+    It uses `torch.nn.Module` and applies the affine transform `x * scale + offset` to the input value.
+    """
+
+    def __init__(self, scale: float = 1.0, offset: float = 0.0) -> None:
+        super().__init__()
+        self.scale = scale
+        self.offset = offset
+
+    def forward(self, x):
+        return x * self.scale + self.offset
+
+    def to_expr(self, col: pl.Expr) -> pl.Expr:
+        """Returns the equivalent Polars expression, applied to `col`."""
+        return col * self.scale + self.offset
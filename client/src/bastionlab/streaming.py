@@ -0,0 +1,156 @@
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, TypeVar
+import time
+
+T = TypeVar("T")
+
+#: Maximum size of a gRPC message accepted by default by gRPC channels (4 MiB).
+MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+
+#: Room left in a message for the protobuf framing and the other fields of a chunk.
+MESSAGE_OVERHEAD = 16 * 1024
+
+#: Chunk size used at the start of a stream.
+INITIAL_CHUNK_SIZE = 256 * 1024
+
+#: Smallest chunk size the sizer adapts to.
+MIN_CHUNK_SIZE = 32 * 1024
+
+# Number of chunks over which the throughput is measured before adapting the size.
+WINDOW_CHUNKS = 4
+
+# Relative throughput change under which two measurements are considered equal.
+TOLERANCE = 0.05
+
+
+@dataclass
+class StreamStats:
+    """Statistics of a stream of chunks sent to or received from the server.
+
+    Args:
+        name: Name of the stream (the name of the gRPC method).
+        chunks: Number of chunks.
+        bytes: Number of bytes.
+        elapsed: Time spent sending or waiting for the chunks, in seconds.
+        min_chunk_size: Size of the smallest chunk, in bytes.
+        max_chunk_size: Size of the largest chunk, in bytes.
+    """
+
+    name: str
+    chunks: int = 0
+    bytes: int = 0
+    elapsed: float = 0.0
+    min_chunk_size: int = 0
+    max_chunk_size: int = 0
+
+    def record(self, nbytes: int, elapsed: float) -> None:
+        if self.chunks == 0 or nbytes < self.min_chunk_size:
+            self.min_chunk_size = nbytes
+        self.max_chunk_size = max(self.max_chunk_size, nbytes)
+        self.chunks += 1
+        self.bytes += nbytes
+        self.elapsed += elapsed
+
+    @property
+    def throughput(self) -> float:
+        """Throughput in bytes per second."""
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.bytes} bytes in {self.chunks} chunks "
+            f"({self.min_chunk_size}-{self.max_chunk_size} bytes) in {self.elapsed * 1000:.0f}ms "
+            f"({self.throughput / 1e6:.1f} MB/s)"
+        )
+
+
+@dataclass
+class ChunkSizer:
+    """Chooses the size of the chunks of a stream.
+
+    Streams start with a reasonable chunk size and then look for the size that maximizes
+    throughput by measuring how long sending each chunk takes (that is, how long gRPC
+    applies backpressure). The size is doubled (or halved) after each window of chunks as
+    long as the throughput improves, and the direction is reversed when it degrades.
+    Chunks never exceed the maximum message size of the channel.
+
+    Args:
+        stats: Statistics of the stream.
+        max_message_size: Maximum size of a gRPC message on the channel.
+        chunk_size: If set, the size of the chunks is fixed to this value.
+    """
+
+    stats: StreamStats
+    max_message_size: int = MAX_MESSAGE_SIZE
+    chunk_size: Optional[int] = None
+    _size: int = field(init=False)
+    _growing: bool = field(init=False, default=True)
+    _window: StreamStats = field(init=False)
+    _last_throughput: Optional[float] = field(init=False, default=None)
+
+    def __post_init__(self) -> None:
+        self._max = max(self.max_message_size - MESSAGE_OVERHEAD, MIN_CHUNK_SIZE)
+        self._size = (
+            self.chunk_size
+            if self.chunk_size is not None
+            else min(INITIAL_CHUNK_SIZE, self._max)
+        )
+        self._window = StreamStats(self.stats.name)
+
+    @property
+    def size(self) -> int:
+        """Size of the next chunk."""
+        return self._size
+
+    def record(self, nbytes: int, elapsed: float) -> None:
+        """Records that a chunk of `nbytes` bytes took `elapsed` seconds to be sent and adapts the size."""
+        self.stats.record(nbytes, elapsed)
+        if self.chunk_size is not None:
+            return
+
+        self._window.record(nbytes, elapsed)
+        if self._window.chunks < WINDOW_CHUNKS:
+            return
+
+        throughput = self._window.throughput
+        self._window = StreamStats(self.stats.name)
+        if self._last_throughput is not None:
+            if throughput < self._last_throughput * (1 - TOLERANCE):
+                self._growing = not self._growing
+            elif throughput < self._last_throughput * (1 + TOLERANCE):
+                # no significant change: keep the current size
+                self._last_throughput = throughput
+                return
+        self._last_throughput = throughput
+
+        if self._growing:
+            self._size = min(self._size * 2, self._max)
+        else:
+            self._size = max(self._size // 2, MIN_CHUNK_SIZE)
+
+    def timed(self, chunks: Iterator[T], size_fn: Callable[[T], int]) -> Iterator[T]:
+        """Yields `chunks` and records how long each of them took to be consumed (sent)."""
+        for chunk in chunks:
+            start = time.perf_counter()
+            yield chunk
+            self.record(size_fn(chunk), time.perf_counter() - start)
+
+
+def record_received(
+    stats: StreamStats, chunks: Iterator[T], size_fn: Callable[[T], int]
+) -> Iterator[T]:
+    """Yields `chunks` received from the server and records them in `stats`."""
+    start = time.perf_counter()
+    for chunk in chunks:
+        now = time.perf_counter()
+        stats.record(size_fn(chunk), now - start)
+        yield chunk
+        start = time.perf_counter()
+
+
+__all__ = [
+    "StreamStats",
+    "ChunkSizer",
+    "record_received",
+    "MAX_MESSAGE_SIZE",
+]
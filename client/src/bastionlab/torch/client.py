@@ -1,15 +1,18 @@
-from typing import List, TYPE_CHECKING, Union
+from typing import Iterator, List, Optional, TYPE_CHECKING, Union
 from torch.nn import Module
 from torch.utils.data import Dataset
 import grpc
 import torch
-from ..pb.bastionlab_torch_pb2 import Empty, Metric, TestConfig, TrainConfig  # type: ignore [import]
+from ..pb.bastionlab_torch_pb2 import Chunk, Empty, Metric, TestConfig, TrainConfig  # type: ignore [import]
 from ..pb.bastionlab_pb2 import Reference
 from ..pb.bastionlab_torch_pb2_grpc import TorchServiceStub  # type: ignore [import]
 from ..errors import GRPCException
 from .optimizer_config import *
+from ..streaming import record_received
 
 from .utils import (
+    DATASET_BATCH_META,
+    IterableTensorDataset,
     TensorDataset,
     dataset_from_chunks,
     deserialize_weights_to_model,
@@ -43,7 +46,7 @@ class BastionLabTorch:
         model: Module,
         name: str,
         description: str = "",
-        chunk_size: int = 4_194_285,
+        chunk_size: Optional[int] = None,
         progress: bool = False,
     ) -> Reference:
         """Uploads a Pytorch module to the BastionLab Torch server.
@@ -56,6 +59,7 @@ class BastionLabTorch:
             name: A name for the module being uploaded.
             description: A string description of the module being uploaded.
             chunk_size: Size of a chunk in the BastionLab Torch gRPC protocol in bytes.
+                        By default, the size is adapted to the throughput of the connection.
 
         Returns:
             BastionLab Torch gRPC protocol's reference object.
@@ -69,7 +73,7 @@ class BastionLabTorch:
                     model,
                     name=name,
                     description=description,
-                    chunk_size=chunk_size,
+                    chunk_size=self.client._chunk_sizer("SendModel", chunk_size),
                     progress=progress,
                 )
             )
@@ -81,23 +85,37 @@ class BastionLabTorch:
         name: str,
         description: str = "",
         privacy_limit: Optional[float] = None,
-        chunk_size: int = 4_194_285,
+        chunk_size: Optional[int] = None,
         batch_size: int = 1024,
         train_dataset: Optional[Reference] = None,
         progress: bool = False,
+        num_workers: int = 0,
+        serialization_workers: int = 2,
+        prefetch: int = 4,
     ) -> Reference:
         """Uploads a Pytorch Dataset to the BastionLab Torch server.
 
+        Tensor-backed datasets (such as `bastionlab.torch.utils.TensorDataset` or
+        `torch.utils.data.TensorDataset`) are sliced into batches directly, other datasets
+        are loaded with a `DataLoader`.
+
         Args:
             model: The Pytorch Dataset to upload.
             name: A name for the dataset being uploaded.
             description: A string description of the dataset being uploaded.
             chunk_size: Size of a chunk in the BastionLab Torch gRPC protocol in bytes.
+                        By default, the size is adapted to the throughput of the connection.
             batch_size: Size of a unit of serialization in number of samples,
                         increasing this value may increase serialization throughput
                         at the price of a higher memory consumption.
             train_dataset: metadata, True means this dataset is suited for training,
                    False that it should be used for testing/validating only
+            num_workers: Number of worker processes used to load the samples of datasets
+                         that are not tensor-backed (0 means loading them in the main process).
+            serialization_workers: Number of threads serializing batches in parallel while
+                                   previous batches are being sent (0 disables pipelining).
+            prefetch: Maximum number of batches serialized ahead of the ones being sent,
+                      this bounds the memory used by the pipeline.
 
         Returns:
             BastionLab Torch gRPC protocol's reference object.
@@ -111,11 +129,14 @@ class BastionLabTorch:
                     dataset,
                     name=name,
                     description=description,
-                    chunk_size=chunk_size,
+                    chunk_size=self.client._chunk_sizer("SendDataset", chunk_size),
                     batch_size=batch_size,
                     privacy_limit=privacy_limit,
                     train_dataset=train_dataset,
                     progress=progress,
+                    num_workers=num_workers,
+                    serialization_workers=serialization_workers,
+                    prefetch=prefetch,
                 )
             )
         )
@@ -132,27 +153,59 @@ class BastionLabTorch:
         self.client.refresh_session_if_needed()
 
         chunks = GRPCException.map_error(lambda: self.stub.FetchModule(ref))
-        deserialize_weights_to_model(model, chunks)
+        stats = self.client._received_stats("FetchModule")
+        deserialize_weights_to_model(
+            model, record_received(stats, chunks, lambda chunk: len(chunk.data))
+        )
 
-    def fetch_dataset(self, ref: Union["RemoteDataset", Reference]) -> TensorDataset:
+    def fetch_dataset(
+        self,
+        ref: Union["RemoteDataset", Reference],
+        stream: bool = False,
+        out_dir: Optional[str] = None,
+    ) -> Union[TensorDataset, IterableTensorDataset]:
         """Fetches the distant dataset with a BastionLab Torch gRPC protocol reference.
 
+        The server first sends the shapes and dtypes of the columns, which are allocated
+        upfront, and then the batches of the dataset, which are copied into the columns
+        as they arrive.
+
         Args:
             ref: BastionLab Torch gRPC protocol reference object corresponding to the distant dataset.
+            stream: If True, returns an iterable dataset that downloads the batches while they are
+                being iterated over (for instance by a local `DataLoader`) instead of the whole dataset.
+            out_dir: If set, the columns are written to files of this directory as they are received
+                and the returned dataset is memory-mapped from them, so that datasets larger than
+                memory can be fetched. The directory can be opened again with
+                `bastionlab.torch.utils.load_dataset_dir`.
 
         Returns:
             A dataset instance built from received data.
         """
-        from .remote_torch import RemoteDataset
+        ref = Reference(
+            identifier=ref.identifier,
+            name="",
+            description="",
+            meta=DATASET_BATCH_META,
+        )
 
-        self.client.refresh_session_if_needed()
-        if isinstance(ref, RemoteDataset):
-            ref = Reference(
-                identifier=ref.identifier, name="", description="", meta=bytes()
+        def fetch() -> Iterator[Chunk]:
+            self.client.refresh_session_if_needed()
+            stats = self.client._received_stats("FetchDataset")
+            chunks = record_received(
+                stats, self.stub.FetchDataset(ref), lambda chunk: len(chunk.data)
             )
-        return dataset_from_chunks(
-            GRPCException.map_error(lambda: self.stub.FetchDataset(ref))
-        )
+            while True:
+                chunk = GRPCException.map_error(lambda: next(chunks, None))
+                if chunk is None:
+                    return
+                yield chunk
+
+        if stream:
+            if out_dir is not None:
+                raise ValueError("out_dir cannot be used with stream=True")
+            return IterableTensorDataset(fetch)
+        return dataset_from_chunks(fetch(), out_dir)
 
     def get_available_models(self) -> List[Reference]:
         """Returns the list of BastionLab Torch gRPC protocol references of all available models on the server."""
@@ -247,6 +300,25 @@ class BastionLabTorch:
 
         return GRPCException.map_error(lambda: self.stub.GetMetric(run))
 
+    def stream_metrics(self, run: Reference) -> Iterator[Metric]:
+        """Returns an iterator over the metrics of a run, each of them being yielded as soon as
+        the server has computed it (that is, when a batch completes). The iterator ends with the run.
+
+        Args:
+            run: BastionLab Torch gRPC protocol reference object corresponding to a distant run.
+
+        Raises:
+            GRPCException: with code `UNIMPLEMENTED` if the server does not support metric streaming.
+        """
+        self.client.refresh_session_if_needed()
+
+        metrics = self.stub.StreamMetrics(run)
+        while True:
+            metric = GRPCException.map_error(lambda: next(metrics, None))
+            if metric is None:
+                return
+            yield metric
+
     def RemoteDataset(self, *args, **kwargs) -> "RemoteDataset":
         """Returns a RemoteDataset object encapsulating a training and testing dataloaders
         on the remote server that uses this client to communicate with the server.
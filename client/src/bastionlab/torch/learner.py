@@ -11,6 +11,7 @@ from ..errors import GRPCException
 from .psg import expand_weights
 from .client import BastionLabTorch
 from .optimizer_config import *
+from .metrics import MetricsHistory
 from ..torch.remote_torch import RemoteDataset
 
 if TYPE_CHECKING:
@@ -93,7 +94,7 @@ class RemoteLearner:
             else (metric_eps_per_batch if metric_eps_per_batch is not None else -1.0)
         )
         self.progress = progress
-        self.log: List[Metric] = []
+        self.log = MetricsHistory()
 
     def _train_config(
         self,
@@ -161,10 +162,41 @@ class RemoteLearner:
         )
         return t
 
+    def _stream_metric(
+        self, run: Reference, name: str, history: MetricsHistory, train: bool = True
+    ) -> None:
+        t = None
+        prev_epoch = None
+        try:
+            for metric in self.client.stream_metrics(run):
+                history.append(metric)
+                if not self.progress:
+                    continue
+
+                if t is None or metric.epoch != prev_epoch:
+                    if t is not None:
+                        t.close()
+                    t = RemoteLearner._new_tqdm_bar(
+                        metric.epoch + 1, metric.nb_epochs, metric.nb_batches, train
+                    )
+                t.update(metric.batch + 1 - t.n)
+                t.set_postfix(
+                    **{
+                        name: "{:.4f} (+/- {:.4f})".format(
+                            metric.value, metric.uncertainty
+                        )
+                    }
+                )
+                prev_epoch = metric.epoch
+        finally:
+            if t is not None:
+                t.close()
+
     def _poll_metric(
         self,
         run: Reference,
         name: str,
+        history: MetricsHistory,
         train: bool = True,
         timeout: int = 100,
         poll_delay: float = 0.2,
@@ -195,8 +227,7 @@ class RemoteLearner:
             t.set_postfix(
                 **{name: "{:.4f} (+/- {:.4f})".format(metric.value, metric.uncertainty)}
             )
-        else:
-            self.log.append(metric)
+        history.append(metric)
 
         while True:
             sleep(poll_delay)
@@ -228,8 +259,7 @@ class RemoteLearner:
                         )
                     }
                 )
-            else:
-                self.log.append(metric)
+            history.append(metric)
 
             if (
                 metric.epoch + 1 == metric.nb_epochs
@@ -237,6 +267,25 @@ class RemoteLearner:
             ):
                 break
 
+    def _collect_metrics(
+        self,
+        run: Reference,
+        name: str,
+        train: bool,
+        timeout: int,
+        poll_delay: float,
+    ) -> MetricsHistory:
+        history = MetricsHistory()
+        try:
+            self._stream_metric(run, name, history, train)
+        except GRPCException as e:
+            if e.code != StatusCode.UNIMPLEMENTED or len(history) > 0:
+                raise e
+            # older servers do not stream metrics
+            self._poll_metric(run, name, history, train, timeout, poll_delay)
+        self.log.extend(history)
+        return history
+
     def fit(
         self,
         nb_epochs: int,
@@ -250,9 +299,11 @@ class RemoteLearner:
         per_n_epochs_checkpoint: int = 0,
         per_n_steps_checkpoint: int = 0,
         resume: bool = False,
-    ) -> None:
+    ) -> MetricsHistory:
         """Fits the uploaded model to the training dataset with given hyperparameters.
 
+        The loss of every batch is pushed by the server as soon as the batch completes.
+
         Args:
             nb_epocs: Specifies the number of epochs to train the model.
             eps: Specifies the global privacy budget for the DP-SGD algorithm.
@@ -261,8 +312,13 @@ class RemoteLearner:
             metric_eps: Global privacy budget for loss disclosure for the whole training that overrides
                         the default per-batch budget.
             timeout: Timeout in seconds between two updates of the loss on the server side. When elapsed without updates,
-                        polling ends and the progress bar is terminated.
-            poll_delay: Delay in seconds between two polling requests for the loss.
+                        polling ends and the progress bar is terminated. Only used with servers that do not
+                        stream metrics.
+            poll_delay: Delay in seconds between two polling requests for the loss. Only used with servers that do not
+                        stream metrics.
+
+        Returns:
+            The loss of every batch of the training, also appended to `log`.
         """
         run = self.client.train(
             self._train_config(
@@ -277,7 +333,7 @@ class RemoteLearner:
                 resume,
             )
         )
-        self._poll_metric(
+        return self._collect_metrics(
             run,
             name=self.loss,
             train=True,
@@ -293,20 +349,27 @@ class RemoteLearner:
         metric_eps: Optional[float] = None,
         timeout: int = 100,
         poll_delay: float = 0.2,
-    ) -> None:
+    ) -> MetricsHistory:
         """Tests the remote model with the test dataloader provided in the RemoteDataLoader.
 
+        The metric of every batch is pushed by the server as soon as the batch completes.
+
         Args:
             test_dataset: overrides the test dataset passed to the remote `RemoteDataset` constructor.
             metric: test metric name, if not providedm the training loss is used. Metrics available are loss functions and `accuracy`.
             metric_eps: Global privacy budget for metric disclosure for the whole testing procedure that overrides
                         the default per-batch budget.
             timeout: Timeout in seconds between two updates of the metric on the server side. When elapsed without updates,
-                        polling ends and the progress bar is terminated.
-            poll_delay: Delay in seconds between two polling requests for the metric.
+                        polling ends and the progress bar is terminated. Only used with servers that do not
+                        stream metrics.
+            poll_delay: Delay in seconds between two polling requests for the metric. Only used with servers that do not
+                        stream metrics.
+
+        Returns:
+            The metric of every batch of the test, also appended to `log`.
         """
         run = self.client.test(self._test_config(batch_size, metric, metric_eps))
-        self._poll_metric(
+        return self._collect_metrics(
             run,
             name=metric if metric is not None else self.loss,
             train=False,
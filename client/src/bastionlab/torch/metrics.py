@@ -0,0 +1,68 @@
+from typing import Iterator
+import numpy as np
+import polars as pl
+from ..pb.bastionlab_torch_pb2 import Metric  # type: ignore [import]
+
+
+class MetricsHistory:
+    """Metrics of the batches of training or testing runs, stored in compact arrays.
+
+    The history can be indexed and iterated over like a list of `Metric` messages,
+    and exported with `to_numpy` or `to_polars`.
+
+    Args:
+        capacity: Number of metrics initially allocated (the arrays grow as needed).
+    """
+
+    DTYPE = np.dtype(
+        [
+            ("epoch", np.int32),
+            ("batch", np.int32),
+            ("value", np.float32),
+            ("uncertainty", np.float32),
+            ("nb_epochs", np.int32),
+            ("nb_batches", np.int32),
+        ]
+    )
+
+    def __init__(self, capacity: int = 64) -> None:
+        self._data = np.empty(max(capacity, 1), dtype=MetricsHistory.DTYPE)
+        self._len = 0
+
+    def append(self, metric: Metric) -> None:
+        if self._len == len(self._data):
+            self._data = np.concatenate(
+                [self._data, np.empty(len(self._data), dtype=MetricsHistory.DTYPE)]
+            )
+        self._data[self._len] = tuple(
+            getattr(metric, name) for name in MetricsHistory.DTYPE.names
+        )
+        self._len += 1
+
+    def extend(self, other: "MetricsHistory") -> None:
+        for metric in other:
+            self.append(metric)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, idx: int) -> Metric:
+        row = self._data[: self._len][idx]
+        return Metric(**{name: row[name].item() for name in MetricsHistory.DTYPE.names})
+
+    def __iter__(self) -> Iterator[Metric]:
+        for idx in range(self._len):
+            yield self[idx]
+
+    def to_numpy(self) -> np.ndarray:
+        """Returns the metrics as a numpy structured array with one field per attribute of `Metric`."""
+        return self._data[: self._len].copy()
+
+    def to_polars(self) -> pl.DataFrame:
+        """Returns the metrics as a Polars DataFrame with one column per attribute of `Metric`."""
+        return pl.DataFrame(
+            {name: self._data[name][: self._len] for name in MetricsHistory.DTYPE.names}
+        )
+
+
+__all__ = ["MetricsHistory"]
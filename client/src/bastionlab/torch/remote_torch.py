@@ -3,7 +3,9 @@ import hashlib
 import io
 from typing import Iterator, TYPE_CHECKING, List, Optional, Any
 from dataclasses import dataclass
-from .utils import DataWrapper, Chunk, TensorDataset, send_tensor
+from .utils import DataWrapper, Chunk, TensorDataset, send_tensor, deserialize_tensor
+from ..errors import GRPCException
+from ..streaming import record_received
 from ..pb.bastionlab_torch_pb2 import UpdateTensor, RemoteDatasetReference
 from ..pb.bastionlab_pb2 import Reference
 from torch.utils.data import Dataset, DataLoader
@@ -38,7 +40,9 @@ class RemoteTensor:
 
     @staticmethod
     def _send_tensor(client: "BastionLabTorch", tensor: torch.Tensor) -> "RemoteTensor":
-        res = client.stub.SendTensor(send_tensor(tensor))
+        res = client.stub.SendTensor(
+            send_tensor(tensor, client.client._chunk_sizer("SendTensor"))
+        )
         dtype, shape = _get_tensor_metadata(res.meta)
         return RemoteTensor(client, res.identifier, *dtype, *shape)
 
@@ -47,6 +51,31 @@ class RemoteTensor:
         dtypes, shape = _get_tensor_metadata(ref.meta)
         return RemoteTensor(client, ref.identifier, dtypes[0], shape[0])
 
+    def fetch(self) -> torch.Tensor:
+        """
+        Fetches the tensor from the server.
+
+        The tensor is received in the raw tensor format and written directly
+        into a preallocated tensor. Only tensors sent with `BastionLabTorch.RemoteTensor`
+        can be fetched.
+
+        Returns:
+            torch.Tensor
+        """
+        self._client.client.refresh_session_if_needed()
+
+        stats = self._client.client._received_stats("FetchTensor")
+        return GRPCException.map_error(
+            lambda: deserialize_tensor(
+                chunk.data
+                for chunk in record_received(
+                    stats,
+                    self._client.stub.FetchTensor(_make_id_reference(self.identifier)),
+                    lambda chunk: len(chunk.data),
+                )
+            )
+        )
+
     def __str__(self) -> str:
         return f"RemoteTensor(identifier={self._identifier}, dtype={self._dtype}, shape={self._shape})"
 
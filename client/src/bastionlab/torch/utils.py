@@ -1,13 +1,34 @@
 import io
-from typing import Callable, Iterator, List, Tuple, TypeVar, Optional, Any
+import json
+import math
+import os
+import re
+import struct
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+    Optional,
+    Any,
+    Union,
+)
+import time
 import torch
 from torch import Tensor
 from torch.nn import Module
 from torch.nn.parameter import Parameter
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, DataLoader, IterableDataset
 from tqdm import tqdm  # type: ignore [import]
 from ..pb.bastionlab_torch_pb2 import Chunk  # type: ignore [import]
 from ..pb.bastionlab_pb2 import Reference
+from ..streaming import ChunkSizer, StreamStats
 
 T = TypeVar("T")
 U = TypeVar("U")
@@ -90,24 +111,214 @@ def data_from_wrapper(wrapper: DataWrapper) -> Tuple[List[Tensor], Optional[Tens
     return (columns, labels)
 
 
-def dataset_from_chunks(chunks: Iterator[Chunk]) -> TensorDataset:
-    """Builds a `TensorDataset` from a chunks iterator (returned by the underlying gRPC protocol)."""
-    wrappers = unstream_artifacts(
-        (chunk.data for chunk in chunks), deserialization_fn=torch.jit.load
+def _dataset_objects(chunks: Iterator[Chunk]) -> Iterator[memoryview]:
+    """Splits a dataset stream received from the server into its serialized objects."""
+    return unstream_artifacts(
+        (chunk.data for chunk in chunks),
+        deserialization_fn=lambda buff: buff.getbuffer(),
     )
 
-    data = [data_from_wrapper(wrapper) for wrapper in wrappers]
 
-    columns = [torch.cat([x[i] for x, _ in data]) for i in range(len(data[0][0]))]
-    labels = (
-        torch.cat([y for _, y in data if y is not None])
-        if data[0][1] is not None
-        else None
-    )
+#: Name of the manifest of a dataset fetched to a directory, listing its tensor files.
+DATASET_MANIFEST = "dataset.json"
+
+
+def _map_file(
+    path: str, dtype: torch.dtype, shape: Tuple[int, ...], shared: bool
+) -> Tensor:
+    """Returns a tensor memory-mapped from a file holding its contiguous storage."""
+    numel = math.prod(shape)
+    if numel == 0:
+        # empty files cannot be mapped
+        return torch.empty(shape, dtype=dtype)
+    return torch.from_file(path, shared=shared, size=numel, dtype=dtype).view(shape)
+
+
+def _allocate_tensors(
+    specs: List[Tuple[str, torch.dtype, Tuple[int, ...]]], out_dir: Optional[str]
+) -> Dict[str, Tensor]:
+    """Allocates the named tensors of a dataset, in memory or, if `out_dir` is set,
+    as writable memory maps of files of `out_dir`."""
+    if out_dir is None:
+        return {name: torch.empty(shape, dtype=dtype) for name, dtype, shape in specs}
+
+    os.makedirs(out_dir, exist_ok=True)
+    tensors = {}
+    for name, dtype, shape in specs:
+        if name != "labels" and re.fullmatch(r"samples_\d+", name) is None:
+            raise ValueError(f"Invalid data, unknown field {name}.")
+        path = os.path.join(out_dir, f"{name}.bin")
+        with open(path, "wb") as f:
+            f.truncate(math.prod(shape) * torch.empty(0, dtype=dtype).element_size())
+        tensors[name] = _map_file(path, dtype, shape, shared=True)
+    return tensors
+
+
+def _write_manifest(out_dir: str, tensors: Dict[str, Tensor]) -> None:
+    manifest = {
+        "version": 1,
+        "tensors": [
+            {
+                "name": name,
+                "file": f"{name}.bin",
+                "dtype": RAW_TENSOR_KINDS[tensor.dtype],
+                "shape": list(tensor.shape),
+            }
+            for name, tensor in tensors.items()
+        ],
+    }
+    with open(os.path.join(out_dir, DATASET_MANIFEST), "w") as f:
+        json.dump(manifest, f)
+
+
+def load_dataset_dir(out_dir: str) -> TensorDataset:
+    """Opens a dataset fetched to a directory (see `BastionLabTorch.fetch_dataset`).
+
+    The tensors are memory-mapped from their files (copy-on-write: changes are not written back).
+    """
+    with open(os.path.join(out_dir, DATASET_MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != 1:
+        raise ValueError(
+            f"Unsupported dataset manifest version: {manifest.get('version')}"
+        )
+    named = [
+        (
+            t["name"],
+            _map_file(
+                os.path.join(out_dir, t["file"]),
+                RAW_TENSOR_DTYPES[t["dtype"]],
+                tuple(t["shape"]),
+                shared=False,
+            ),
+        )
+        for t in manifest["tensors"]
+    ]
+    columns, labels = _columns_and_labels(named)
+    return TensorDataset(columns, labels)
+
+
+def dataset_from_chunks(
+    chunks: Iterator[Chunk], out_dir: Optional[str] = None
+) -> TensorDataset:
+    """Builds a `TensorDataset` from a chunks iterator (returned by the underlying gRPC protocol).
 
+    When the dataset is streamed in the raw batch format, its columns are allocated as soon
+    as the dataset header is received and each batch is copied into them when it arrives.
+    Batches serialized as TorchScript `DataWrapper` modules (older servers) are concatenated
+    at the end.
+
+    Args:
+        chunks: Chunks received from the server.
+        out_dir: If set, the columns are written to files of this directory, along with a manifest
+            (see `load_dataset_dir`), and the returned dataset is memory-mapped from them.
+    """
+    objects = _dataset_objects(chunks)
+    first = next(objects, None)
+    if first is None:
+        raise ValueError("Invalid data, empty dataset stream.")
+
+    if first[: len(DATASET_HEADER_MAGIC)] != DATASET_HEADER_MAGIC:
+        data = [data_from_wrapper(torch.jit.load(io.BytesIO(first)))]
+        data += [data_from_wrapper(torch.jit.load(io.BytesIO(x))) for x in objects]
+
+        columns = [torch.cat([x[i] for x, _ in data]) for i in range(len(data[0][0]))]
+        labels = (
+            torch.cat([y for _, y in data if y is not None])
+            if data[0][1] is not None
+            else None
+        )
+        if out_dir is None:
+            return TensorDataset(columns, labels)
+
+        named = [(f"samples_{i}", column) for i, column in enumerate(columns)]
+        if labels is not None:
+            named.append(("labels", labels))
+        tensors = _allocate_tensors(
+            [(name, x.dtype, tuple(x.shape)) for name, x in named], out_dir
+        )
+        for name, x in named:
+            tensors[name].copy_(x)
+        _write_manifest(out_dir, tensors)
+        columns, labels = _columns_and_labels(list(tensors.items()))
+        return TensorDataset(columns, labels)
+
+    tensors = _allocate_tensors(
+        [
+            (name, header.dtype, header.shape)
+            for name, header, _ in _raw_entries(
+                first, DATASET_HEADER_MAGIC, with_storage=False
+            )
+        ],
+        out_dir,
+    )
+    nb_samples = min((len(tensor) for tensor in tensors.values()), default=0)
+    offset = 0
+    for batch in objects:
+        rows = 0
+        for name, header, storage in _raw_entries(batch, DATASET_BATCH_MAGIC):
+            if name not in tensors or len(header.shape) == 0:
+                raise ValueError(f"Invalid data, unexpected tensor {name} in batch.")
+            rows = header.shape[0]
+            _copy_storage(tensors[name][offset : offset + rows], header, storage)
+        offset += rows
+    if offset != nb_samples:
+        raise ValueError("Invalid data, truncated dataset stream.")
+
+    if out_dir is not None:
+        _write_manifest(out_dir, tensors)
+    columns, labels = _columns_and_labels(list(tensors.items()))
     return TensorDataset(columns, labels)
 
 
+def dataset_batches_from_chunks(
+    chunks: Iterator[Chunk],
+) -> Iterator[Tuple[List[Tensor], Optional[Tensor]]]:
+    """Yields the batches of a dataset (lists of column tensors and labels) as they are received."""
+    objects = _dataset_objects(chunks)
+    first = next(objects, None)
+    if first is None:
+        raise ValueError("Invalid data, empty dataset stream.")
+
+    if first[: len(DATASET_HEADER_MAGIC)] != DATASET_HEADER_MAGIC:
+        yield data_from_wrapper(torch.jit.load(io.BytesIO(first)))
+        for x in objects:
+            yield data_from_wrapper(torch.jit.load(io.BytesIO(x)))
+        return
+
+    for batch in objects:
+        yield deserialize_raw_batch(io.BytesIO(batch))
+
+
+class IterableTensorDataset(IterableDataset):
+    """A dataset compliant with Torch's `IterableDataset` whose samples are downloaded
+    from the server while they are being iterated over.
+
+    Each iteration opens a new stream: only the batch being consumed is held in memory.
+    Samples have the same form as those of `TensorDataset`. As with other iterable datasets,
+    a `DataLoader` using several worker processes would yield every sample once per worker.
+
+    Args:
+        fetch: Function opening the stream of chunks of the dataset.
+    """
+
+    def __init__(self, fetch: Callable[[], Iterator[Chunk]]) -> None:
+        super().__init__()
+        self._fetch = fetch
+
+    def iter_batches(self) -> Iterator[Tuple[List[Tensor], Optional[Tensor]]]:
+        """Yields the batches of the dataset (lists of column tensors and labels) as they are received."""
+        yield from dataset_batches_from_chunks(self._fetch())
+
+    def __iter__(self) -> Iterator[Tuple[List[Tensor], Optional[Tensor]]]:
+        for columns, labels in self.iter_batches():
+            for i in range(len(columns[0])):
+                yield (
+                    [column[i] for column in columns],
+                    labels[i] if labels is not None else None,
+                )
+
+
 def id(l: List[T], _: Optional[U] = None) -> U:
     """Identity functions. Here for type checking."""
     res: U = l  # type: ignore [assignment]
@@ -135,36 +346,96 @@ def chunks(
         yield cat_fn(chunk)
 
 
-def serialize_batch(
-    privacy_limit: Optional[float] = None,
-) -> Callable[[Tuple[List[Tensor], Tensor], io.BytesIO], None]:
-    """Serializes a batch of data by wrapping it in a `DataWrapper` module, using torch.jit utility functions and
-    writes the output to the given buffer.
-    """
+def pipelined(
+    fn: Callable[[T], U], it: Iterator[T], workers: int, prefetch: int
+) -> Iterator[U]:
+    """Applies `fn` to the elements of `it` on a pool of threads and yields the results in order.
 
-    def inner(data: Tuple[List[Tensor], Tensor], buff: io.BytesIO) -> None:
-        torch.jit.save(torch.jit.script(DataWrapper(*data, privacy_limit)), buff)
+    At most `prefetch` elements are processed (or waiting to be consumed) ahead of the
+    consumer, which bounds the memory used by the pipeline.
 
-    return inner
+    Args:
+        fn: function applied to every element.
+        it: input iterator.
+        workers: number of threads; if 0, `fn` is applied in the calling thread.
+        prefetch: maximum number of elements processed ahead of the consumer.
+    """
+    if workers <= 0:
+        yield from map(fn, it)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending: Deque[Future] = deque()
+    try:
+        for x in it:
+            pending.append(pool.submit(fn, x))
+            if len(pending) >= max(prefetch, 1):
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        # stop early if the consumer lost interest or an error occurred
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+def make_sizer(
+    chunk_size: Union[int, ChunkSizer, None], name: str = "stream"
+) -> ChunkSizer:
+    """Returns `chunk_size` if it is a `ChunkSizer`, a sizer with a fixed size if it is
+    an int and an adaptive sizer if it is None."""
+    if isinstance(chunk_size, ChunkSizer):
+        return chunk_size
+    return ChunkSizer(StreamStats(name), chunk_size=chunk_size)
 
 
 def stream_artifacts(
     artifacts: Iterator[T],
-    chunk_size: int,
+    chunk_size: Union[int, ChunkSizer, None],
     serialization_fn: Callable[[T, io.BytesIO], None] = torch.save,
-) -> Iterator[Tuple[int, bytes]]:
+    workers: int = 0,
+    prefetch: int = 4,
+) -> Iterator[Tuple[int, memoryview]]:
     """Converts an iterator of objects into an iterator of bytes chunks.
 
+    Each chunk is yielded with the number of bytes serialized but not sent yet. Chunks are
+    views over an internal buffer that are only valid until the next chunk is requested.
+
     Args:
         artifacts: Iterator whose objects will be converted.
-        chunk_size: Size of the bytes chunks.
+        chunk_size: Size of the bytes chunks, or the `ChunkSizer` that chooses it (adaptive if None).
         serialization_fn: Function used to convert an object into bytes and write these bytes to a buffer.
+        workers: Number of threads serializing objects in parallel, while the previous ones are being sent.
+                 If 0, objects are serialized one at a time when the chunks are consumed.
+        prefetch: Maximum number of objects serialized ahead of the chunks being sent.
+                  The order of the objects is preserved.
     """
+    sizer = make_sizer(chunk_size)
     eoi = False
     buff = io.BytesIO()
+    # start of the serialized bytes that have not been sent yet
+    offset = 0
+
+    def serialize(artifact: T) -> memoryview:
+        artifact_buff = io.BytesIO()
+        serialization_fn(artifact, artifact_buff)
+        return artifact_buff.getbuffer()
+
+    serialized = (
+        pipelined(serialize, artifacts, workers, prefetch) if workers > 0 else None
+    )
+
     while not eoi:
-        while buff.tell() < chunk_size:
+        chunk_size = sizer.size
+        while buff.tell() - offset < chunk_size:
             try:
+                if serialized is not None:
+                    data = serialized.__next__()
+                    buff.write(data.nbytes.to_bytes(SIZE_LEN, byteorder="little"))
+                    buff.write(data)
+                    continue
+
                 artifact = artifacts.__next__()
                 header = buff.tell()
                 buff.write(b"\xde\xad\xbe\xef\xde\xad\xbe\xef")
@@ -179,15 +450,26 @@ def stream_artifacts(
             except StopIteration:
                 eoi = True
                 break
-        position = buff.tell()
-        buff.seek(0)
-        if eoi:
-            yield (position, buff.read(position))
-        else:
-            yield (position, buff.read(chunk_size))
-            tail = buff.read(position - chunk_size)
+        end = buff.tell()
+        size = end - offset if eoi else chunk_size
+        # slices of the buffer are sent without copies, they must be released before
+        # the buffer is written to again
+        with buff.getbuffer() as view:
+            data = view[offset : offset + size]
+            start = time.perf_counter()
+            yield (end - offset, data)
+            sizer.record(size, time.perf_counter() - start)
+            data.release()
+        offset += size
+        # only move the unsent bytes to the start of the buffer once most of it has been
+        # sent, so that each byte is moved a bounded number of times
+        if not eoi and offset > end // 2:
+            with buff.getbuffer() as view:
+                tail = bytes(view[offset:end])
             buff.seek(0)
             buff.write(tail)
+            buff.truncate()
+            offset = 0
 
 
 def unstream_artifacts(
@@ -195,39 +477,31 @@ def unstream_artifacts(
 ) -> Iterator[T]:
     """Converts an iterator of bytes chunks into an iterator of objects.
 
+    Each object is preceded by its size in bytes (as written by `stream_artifacts`) and
+    is deserialized as soon as all its bytes have been received.
+
     Args:
         stream: Iterator of bytes chunks.
     """
-    buff = io.BytesIO()
-    init_chunk = stream.__next__()
-    size = int.from_bytes(init_chunk[:8], "little")
-    buff.write(init_chunk[8:])
-    eoi = False
-
-    while not eoi:
-        while buff.tell() < size + 4:
-            try:
-                buff.write(stream.__next__())
-            except StopIteration:
-                buff.seek(0)
-                yield deserialization_fn(buff)
-                eoi = True
+    buff = bytearray()
+    pos = 0
+    for data in stream:
+        buff += data
+        while len(buff) - pos >= SIZE_LEN:
+            size = int.from_bytes(buff[pos : pos + SIZE_LEN], "little")
+            if len(buff) - pos - SIZE_LEN < size:
                 break
-
-        if not eoi:
-            end = buff.tell()
-            buff.seek(size)
-            header = buff.read(SIZE_LEN)
-            size = int.from_bytes(header, "little")
-            tail = buff.read(end - size - SIZE_LEN)
-            buff.seek(0)
-            yield deserialization_fn(buff)
-            buff.seek(0)
-            buff.write(tail)
+            pos += SIZE_LEN
+            yield deserialization_fn(io.BytesIO(buff[pos : pos + size]))
+            pos += size
+        del buff[:pos]
+        pos = 0
+    if len(buff) > 0:
+        raise ValueError("Invalid data, truncated object in stream.")
 
 
 def data_chunks_generator(
-    stream: Iterator[Tuple[int, bytes]],
+    stream: Iterator[Tuple[int, memoryview]],
     name: str,
     description: str,
     meta: bytes,
@@ -260,14 +534,16 @@ def data_chunks_generator(
                 )
                 t.set_description(f"Sending {name}")
 
+        # protobuf needs an owned bytes object: only copy one chunk at a time
+        data = bytes(x)
         if first:
             first = False
-            yield Chunk(data=x, name=name, description=description, meta=meta)
+            yield Chunk(data=data, name=name, description=description, meta=meta)
         else:
-            yield Chunk(data=x, name=name, description="", meta=bytes())
+            yield Chunk(data=data, name=name, description="", meta=bytes())
 
         if progress and t is not None:
-            t.update(len(x))
+            t.update(len(data))
         last_estimate = estimate
 
 
@@ -281,39 +557,104 @@ def make_batch(data: List[Tuple[List[Tensor], Tensor]]) -> Tuple[List[Tensor], T
     )
 
 
+def tensor_columns(dataset: Dataset) -> Optional[Tuple[List[Tensor], Optional[Tensor]]]:
+    """Returns the column tensors and the labels tensor of tensor-backed datasets, or None.
+
+    Supported datasets are `bastionlab.torch.utils.TensorDataset`, anything exposing
+    `columns` (a list of tensors) and `labels` (a tensor or None) attributes, and
+    `torch.utils.data.TensorDataset` whose samples are interpreted as they are by
+    `make_batch`: the features of the first tensor are the columns and the second
+    tensor holds the labels.
+    """
+    if isinstance(dataset, torch.utils.data.TensorDataset):
+        tensors = dataset.tensors
+        if len(tensors) >= 2 and tensors[0].dim() >= 2:
+            return (list(tensors[0].unbind(1)), tensors[1])
+        return None
+
+    columns = getattr(dataset, "columns", None)
+    labels = getattr(dataset, "labels", None)
+    if (
+        isinstance(columns, (list, tuple))
+        and len(columns) > 0
+        and all(isinstance(column, Tensor) for column in columns)
+        and (labels is None or isinstance(labels, Tensor))
+    ):
+        return (list(columns), labels)
+    return None
+
+
+def dataset_batches(
+    dataset: Dataset, batch_size: int, num_workers: int = 0
+) -> Iterator[Tuple[List[Tensor], Optional[Tensor]]]:
+    """Groups the samples of a dataset in batches of column tensors and labels.
+
+    Tensor-backed datasets (see `tensor_columns`) are sliced directly, without
+    going through individual samples. Other datasets are loaded with a `DataLoader`
+    using a batched sampler and `num_workers` worker processes.
+
+    Args:
+        dataset: Dataset to be split in batches.
+        batch_size: size of the batches (in number of samples).
+        num_workers: number of worker processes used to load the samples of datasets
+            that are not tensor-backed (0 means loading them in the main process).
+    """
+    data = tensor_columns(dataset)
+    if data is not None:
+        columns, labels = data
+        for i in range(0, len(columns[0]), batch_size):
+            yield (
+                [column[i : i + batch_size] for column in columns],
+                labels[i : i + batch_size] if labels is not None else None,
+            )
+        return
+
+    yield from DataLoader(
+        dataset, batch_size=batch_size, num_workers=num_workers, collate_fn=make_batch
+    )
+
+
 def serialize_dataset(
     dataset: Dataset,
     name: str,
     description: str,
     privacy_limit: Optional[float] = None,
-    chunk_size: int = 100_000_000,
+    chunk_size: Union[int, ChunkSizer, None] = None,
     batch_size: int = 1024,
     train_dataset: Optional[Reference] = None,
     progress: bool = False,
+    num_workers: int = 0,
+    serialization_workers: int = 2,
+    prefetch: int = 4,
 ) -> Iterator[Chunk]:
     """Coverts a dataset into an iterator of bytes chunks.
 
-    The dataset is processed one batch at a time. Each batch is wrapped in a `DataModuleWrapper`
-    and serialized using `torch.jit` utility functions.
+    The dataset is processed one batch at a time (see `dataset_batches`). Each batch is serialized in the raw batch
+    format (see `serialize_raw_batch`), which the server is told to expect through the meta field of the first chunk.
 
     Args:
         dataset: Dataset to be serialized.
         name: Name of the dataset on the server.
         description: Description of the dataset.
         privacy_limit: Maximum privacy budget that can be spent on this dataset.
-        chunk_size: size of the bytes chunks sent over gRPC.
+        chunk_size: size of the bytes chunks sent over gRPC, or the `ChunkSizer` that chooses it (adaptive if None).
         batch_size: size of the batches (in number of samples) during the serialization step.
         train_dataset: metadata, True means this dataset is suited for training, False that it should be used for testing/validating only
+        num_workers: number of worker processes used to load the samples of datasets that are not tensor-backed.
+        serialization_workers: number of threads serializing batches in parallel, while previous batches are being sent.
+        prefetch: maximum number of batches serialized ahead of the ones being sent (bounds memory usage).
     """
     return data_chunks_generator(
         stream_artifacts(
-            chunks(iter(dataset), batch_size, cat_fn=make_batch),
+            dataset_batches(dataset, batch_size, num_workers),
             chunk_size,
-            serialization_fn=serialize_batch(privacy_limit),
+            serialization_fn=serialize_raw_batch(privacy_limit),
+            workers=serialization_workers,
+            prefetch=prefetch,
         ),
         name=name,
         description=description,
-        meta=bytes(),
+        meta=DATASET_BATCH_META,
         progress=progress,
     )
 
@@ -322,7 +663,7 @@ def serialize_model(
     model: Module,
     name: str,
     description: str,
-    chunk_size: int = 100_000_000,
+    chunk_size: Union[int, ChunkSizer, None] = None,
     progress: bool = False,
 ) -> Iterator[Chunk]:
     """Coverts a model into an iterator of bytes chunks.
@@ -334,7 +675,7 @@ def serialize_model(
         model: Model to be serialized.
         name: Name of the model on the server.
         description: Description of the model.
-        chunk_size: size of the bytes chunks sent over gRPC.
+        chunk_size: size of the bytes chunks sent over gRPC, or the `ChunkSizer` that chooses it (adaptive if None).
     """
     ts = torch.jit.script(model)
     return data_chunks_generator(
@@ -403,15 +744,312 @@ def bulk_deserialize(b: bytes) -> Any:
     return torch.load(buff)
 
 
+#: Magic bytes starting a tensor serialized in the raw tensor format.
+RAW_TENSOR_MAGIC = b"BLTENSOR"
+
+#: Version of the raw tensor format.
+RAW_TENSOR_VERSION = 1
+
+# Names of the dtypes in the raw tensor format (tch kinds).
+RAW_TENSOR_KINDS = {
+    torch.uint8: "Uint8",
+    torch.int8: "Int8",
+    torch.int16: "Int16",
+    torch.int32: "Int",
+    torch.int64: "Int64",
+    torch.float16: "Half",
+    torch.float32: "Float",
+    torch.float64: "Double",
+    torch.complex32: "ComplexHalf",
+    torch.complex64: "ComplexFloat",
+    torch.complex128: "ComplexDouble",
+    torch.bool: "Bool",
+    torch.bfloat16: "BFloat16",
+}
+RAW_TENSOR_DTYPES = {v: k for k, v in RAW_TENSOR_KINDS.items()}
+
+
+@dataclass
+class RawTensorHeader:
+    """Header of a tensor serialized in the raw tensor format, followed by `nbytes` bytes of storage.
+
+    Layout (little-endian): magic (8 bytes), version (u8), length of the dtype name (u8),
+    dtype name (ascii), number of dimensions (u32), shape (i64 each), strides in elements (i64 each),
+    size of the storage in bytes (u64).
+    """
+
+    dtype: torch.dtype
+    shape: Tuple[int, ...]
+    strides: Tuple[int, ...]
+    nbytes: int
+
+    @staticmethod
+    def of(tensor: Tensor) -> "RawTensorHeader":
+        if tensor.dtype not in RAW_TENSOR_KINDS:
+            raise ValueError(f"Unsupported dtype in raw tensor format: {tensor.dtype}")
+        return RawTensorHeader(
+            tensor.dtype,
+            tuple(tensor.shape),
+            tuple(tensor.stride()),
+            tensor.numel() * tensor.element_size(),
+        )
+
+    def encode(self) -> bytes:
+        kind = RAW_TENSOR_KINDS[self.dtype].encode("ascii")
+        ndim = len(self.shape)
+        return b"".join(
+            [
+                RAW_TENSOR_MAGIC,
+                struct.pack("<BB", RAW_TENSOR_VERSION, len(kind)),
+                kind,
+                struct.pack(
+                    f"<I{ndim}q{ndim}qQ", ndim, *self.shape, *self.strides, self.nbytes
+                ),
+            ]
+        )
+
+    @staticmethod
+    def decode(
+        data: Union[bytes, memoryview]
+    ) -> Optional[Tuple["RawTensorHeader", int]]:
+        """Parses the header at the start of `data`.
+
+        Returns the header and its length in bytes, or None if `data` is too short.
+        """
+        pos = len(RAW_TENSOR_MAGIC)
+        if len(data) < pos + 2:
+            return None
+        if bytes(data[:pos]) != RAW_TENSOR_MAGIC:
+            raise ValueError("Invalid data, expected a raw tensor.")
+        version, kind_len = struct.unpack_from("<BB", data, pos)
+        if version != RAW_TENSOR_VERSION:
+            raise ValueError(f"Unsupported raw tensor format version: {version}")
+        pos += 2
+        if len(data) < pos + kind_len + 4:
+            return None
+        kind = bytes(data[pos : pos + kind_len]).decode("ascii")
+        (ndim,) = struct.unpack_from("<I", data, pos + kind_len)
+        pos += kind_len + 4
+        if len(data) < pos + 16 * ndim + 8:
+            return None
+        values = struct.unpack_from(f"<{ndim}q{ndim}qQ", data, pos)
+        pos += 16 * ndim + 8
+        return (
+            RawTensorHeader(
+                RAW_TENSOR_DTYPES[kind],
+                tuple(values[:ndim]),
+                tuple(values[ndim : 2 * ndim]),
+                values[-1],
+            ),
+            pos,
+        )
+
+
+def _storage_bytes(tensor: Tensor) -> memoryview:
+    """Returns a zero-copy byte view of the storage of a contiguous CPU tensor."""
+    return memoryview(tensor.reshape(-1).view(torch.uint8).numpy())
+
+
+#: Magic bytes starting a dataset batch serialized in the raw batch format.
+DATASET_BATCH_MAGIC = b"BLDSBTCH"
+
+#: Version of the raw batch format.
+DATASET_BATCH_VERSION = 1
+
+#: Magic bytes starting the header of a dataset streamed in the raw batch format.
+DATASET_HEADER_MAGIC = b"BLDSHEAD"
+
+#: Meta field announcing the raw batch format, sent with the first chunk of a dataset upload
+#: and in the reference of a dataset fetch.
+DATASET_BATCH_META = b'{"batch_format": 1}'
+
+
+def serialize_raw_batch(
+    privacy_limit: Optional[float] = None,
+) -> Callable[[Tuple[List[Tensor], Optional[Tensor]], io.BytesIO], None]:
+    """Serializes a batch of data in the raw batch format and writes the output to the given buffer.
+
+    Layout (little-endian): magic (8 bytes), version (u8), privacy limit (f64, -1.0 if None),
+    number of tensors (u32), then for each tensor: length of its name (u16), name (utf-8) and
+    the tensor in the raw tensor format (see `RawTensorHeader`). Columns are named `samples_{i}`
+    and labels `labels`.
+
+    No TorchScript compilation is involved: the storages of the tensors are copied directly
+    into the buffer.
+    """
+
+    def inner(data: Tuple[List[Tensor], Optional[Tensor]], buff: io.BytesIO) -> None:
+        columns, labels = data
+        named = [(f"samples_{i}", column) for i, column in enumerate(columns)]
+        if labels is not None:
+            named.append(("labels", labels))
+
+        buff.write(DATASET_BATCH_MAGIC)
+        buff.write(
+            struct.pack(
+                "<BdI",
+                DATASET_BATCH_VERSION,
+                privacy_limit if privacy_limit is not None else -1.0,
+                len(named),
+            )
+        )
+        for name, tensor in named:
+            tensor = tensor.detach().cpu().contiguous()
+            encoded_name = name.encode("utf-8")
+            buff.write(struct.pack("<H", len(encoded_name)))
+            buff.write(encoded_name)
+            buff.write(RawTensorHeader.of(tensor).encode())
+            buff.write(_storage_bytes(tensor))
+
+    return inner
+
+
+def _raw_entries(
+    data: memoryview, magic: bytes, with_storage: bool = True
+) -> List[Tuple[str, RawTensorHeader, memoryview]]:
+    """Parses the named tensors of a raw batch, or of a dataset header if `with_storage` is False
+    (in which case the returned storages are empty)."""
+    pos = len(magic)
+    if bytes(data[:pos]) != magic:
+        raise ValueError("Invalid data, unexpected object in dataset stream.")
+    version, _, count = struct.unpack_from("<BdI", data, pos)
+    if version != DATASET_BATCH_VERSION:
+        raise ValueError(f"Unsupported raw batch format version: {version}")
+    pos += struct.calcsize("<BdI")
+
+    entries = []
+    for _ in range(count):
+        (name_len,) = struct.unpack_from("<H", data, pos)
+        name = bytes(data[pos + 2 : pos + 2 + name_len]).decode("utf-8")
+        pos += 2 + name_len
+        parsed = RawTensorHeader.decode(data[pos:])
+        nbytes = parsed[0].nbytes if parsed is not None and with_storage else 0
+        if parsed is None or len(data) < pos + parsed[1] + nbytes:
+            raise ValueError("Invalid data, truncated raw batch.")
+        header, header_len = parsed
+        pos += header_len
+        entries.append((name, header, data[pos : pos + nbytes]))
+        pos += nbytes
+    return entries
+
+
+def _columns_and_labels(named: List[Tuple[str, T]]) -> Tuple[List[T], Optional[T]]:
+    """Sorts named objects (`samples_{i}` and `labels`) into columns and labels."""
+    opt_columns: List[Optional[T]] = []
+    labels: Optional[T] = None
+    for name, x in named:
+        if name == "labels":
+            labels = x
+        elif name.startswith("samples_"):
+            idx = int(name[8:])
+            if len(opt_columns) <= idx:
+                opt_columns += [None] * (idx + 1 - len(opt_columns))
+            opt_columns[idx] = x
+        else:
+            raise Exception(f"Unknown field {name} in raw batch")
+    if any([x is None for x in opt_columns]):
+        raise Exception(f"Missing column in raw batch.")
+    columns: List[T] = [x for x in opt_columns if x is not None]
+
+    return (columns, labels)
+
+
+def _copy_storage(dst: Tensor, header: RawTensorHeader, storage: memoryview) -> None:
+    """Copies a raw tensor into `dst`, a contiguous tensor of the same shape and dtype."""
+    if tuple(dst.shape) != header.shape or dst.dtype != header.dtype:
+        raise ValueError(
+            f"Invalid data, expected a {dst.dtype} tensor of shape {tuple(dst.shape)}, "
+            f"got a {header.dtype} tensor of shape {header.shape}."
+        )
+    if (
+        header.strides == dst.stride()
+        and header.nbytes == dst.numel() * dst.element_size()
+    ):
+        _storage_bytes(dst)[:] = storage
+    else:
+        element_size = dst.element_size()
+        src = torch.empty(header.nbytes // element_size, dtype=header.dtype)
+        _storage_bytes(src)[:] = storage
+        dst.copy_(src.as_strided(header.shape, header.strides))
+
+
+def deserialize_raw_batch(
+    buff: io.BytesIO,
+) -> Tuple[List[Tensor], Optional[Tensor]]:
+    """Parses a batch of data serialized in the raw batch format (see `serialize_raw_batch`)."""
+    named = []
+    for name, header, storage in _raw_entries(buff.getbuffer(), DATASET_BATCH_MAGIC):
+        tensor = torch.empty(header.shape, dtype=header.dtype)
+        _copy_storage(tensor, header, storage)
+        named.append((name, tensor))
+    return _columns_and_labels(named)
+
+
 def send_tensor(
-    tensor: torch.Tensor, chunk_size: Optional[int] = 32
+    tensor: torch.Tensor, chunk_size: Union[int, ChunkSizer, None] = None
 ) -> Iterator[Chunk]:
-    buf = io.BytesIO()
+    """Converts a tensor into an iterator of BastionAI gRPC protocol `Chunk` messages.
+
+    The tensor is sent in the raw tensor format: a small header (see `RawTensorHeader`)
+    followed by the bytes of its storage, which are read directly from memory.
 
-    torch.jit.save(torch.jit.script(DataWrapper([tensor], None)), buf)
-    buf.seek(0)
-    buf_len = len(buf.getvalue())
-    while buf.tell() < buf_len:
-        data = buf.read(chunk_size)
+    Args:
+        tensor: Tensor to be sent.
+        chunk_size: size of the bytes chunks sent over gRPC, or the `ChunkSizer` that chooses it (adaptive if None).
+    """
+    sizer = make_sizer(chunk_size, "SendTensor")
+    # only copies if the tensor is not already a contiguous CPU tensor
+    tensor = tensor.detach().cpu().contiguous()
+    header = RawTensorHeader.of(tensor).encode()
+    storage = _storage_bytes(tensor)
+
+    offset = -len(header)
+    while offset < storage.nbytes:
+        size = sizer.size
+        if offset < 0:
+            data = header + bytes(storage[: max(size - len(header), 0)])
+        else:
+            data = bytes(storage[offset : offset + size])
+        offset += len(data)
 
+        start = time.perf_counter()
         yield Chunk(data=data, description="", meta=bytes(), name="", secret=bytes())
+        sizer.record(len(data), time.perf_counter() - start)
+
+
+def deserialize_tensor(chunks: Iterator[bytes]) -> Tensor:
+    """Builds a tensor from chunks of bytes in the raw tensor format.
+
+    The tensor is preallocated as soon as the header is received and the
+    chunks are copied into its storage as they arrive.
+    """
+    head = b""
+    parsed = None
+    for data in chunks:
+        head += data
+        parsed = RawTensorHeader.decode(head)
+        if parsed is not None:
+            break
+    if parsed is None:
+        raise ValueError("Invalid data, truncated raw tensor header.")
+    header, header_len = parsed
+
+    element_size = torch.empty(0, dtype=header.dtype).element_size()
+    storage = torch.empty(header.nbytes // element_size, dtype=header.dtype)
+    dst = _storage_bytes(storage)
+    offset = 0
+
+    def copy(data: bytes) -> None:
+        nonlocal offset
+        if offset + len(data) > dst.nbytes:
+            raise ValueError("Invalid data, raw tensor storage is too long.")
+        dst[offset : offset + len(data)] = data
+        offset += len(data)
+
+    copy(head[header_len:])
+    for data in chunks:
+        copy(data)
+    if offset != dst.nbytes:
+        raise ValueError("Invalid data, truncated raw tensor storage.")
+
+    return storage.as_strided(header.shape, header.strides)
@@ -0,0 +1,175 @@
+//! Adaptive chunking shared by all the streaming endpoints.
+//!
+//! Streams start with a reasonable chunk size and then look for the size that maximizes
+//! throughput by measuring how long sending each chunk takes (that is, how long the
+//! channel applies backpressure). Chunks never exceed the maximum gRPC message size.
+
+use std::fmt;
+use std::time::{Duration, Instant};
+
+/// Maximum size of a gRPC message accepted by default by the clients (4 MiB).
+pub const MAX_MESSAGE_SIZE: usize = 4 * 1024 * 1024;
+
+/// Room left in a message for the protobuf framing and the other fields of a chunk.
+pub const MESSAGE_OVERHEAD: usize = 16 * 1024;
+
+/// Chunk size used at the start of a stream.
+pub const INITIAL_CHUNK_SIZE: usize = 256 * 1024;
+
+/// Smallest chunk size the sizer adapts to.
+pub const MIN_CHUNK_SIZE: usize = 32 * 1024;
+
+/// Number of chunks over which the throughput is measured before adapting the size.
+const WINDOW_CHUNKS: u64 = 4;
+
+/// Relative throughput change under which two measurements are considered equal.
+const TOLERANCE: f64 = 0.05;
+
+/// Statistics of a stream of chunks.
+#[derive(Debug, Clone, Default)]
+pub struct StreamStats {
+    pub chunks: u64,
+    pub bytes: u64,
+    pub elapsed: Duration,
+    pub min_chunk_size: usize,
+    pub max_chunk_size: usize,
+}
+
+impl StreamStats {
+    pub fn record(&mut self, bytes: usize, elapsed: Duration) {
+        if self.chunks == 0 || bytes < self.min_chunk_size {
+            self.min_chunk_size = bytes;
+        }
+        self.max_chunk_size = self.max_chunk_size.max(bytes);
+        self.chunks += 1;
+        self.bytes += bytes as u64;
+        self.elapsed += elapsed;
+    }
+
+    /// Throughput in bytes per second.
+    pub fn throughput(&self) -> f64 {
+        let secs = self.elapsed.as_secs_f64();
+        if secs > 0.0 {
+            self.bytes as f64 / secs
+        } else {
+            0.0
+        }
+    }
+}
+
+impl fmt::Display for StreamStats {
+    fn fmt(&self, f: &mut fmt::Formatter<'_>) -> fmt::Result {
+        write!(
+            f,
+            "{} bytes in {} chunks ({}-{} bytes) in {}ms ({:.1} MB/s)",
+            self.bytes,
+            self.chunks,
+            self.min_chunk_size,
+            self.max_chunk_size,
+            self.elapsed.as_millis(),
+            self.throughput() / 1e6,
+        )
+    }
+}
+
+/// Chooses the size of the chunks of a stream.
+///
+/// The size is adapted by hill climbing: it is doubled (or halved) after each window
+/// of chunks as long as the measured throughput improves, and the direction is reversed
+/// when it degrades.
+#[derive(Debug, Clone)]
+pub struct ChunkSizer {
+    size: usize,
+    min: usize,
+    max: usize,
+    fixed: bool,
+    growing: bool,
+    window: StreamStats,
+    last_throughput: Option<f64>,
+    stats: StreamStats,
+}
+
+impl Default for ChunkSizer {
+    fn default() -> Self {
+        ChunkSizer::new(MAX_MESSAGE_SIZE)
+    }
+}
+
+impl ChunkSizer {
+    /// Returns an adaptive sizer for a channel accepting messages of up to `max_message_size` bytes.
+    pub fn new(max_message_size: usize) -> Self {
+        let max = max_message_size
+            .saturating_sub(MESSAGE_OVERHEAD)
+            .max(MIN_CHUNK_SIZE);
+        ChunkSizer {
+            size: INITIAL_CHUNK_SIZE.min(max),
+            min: MIN_CHUNK_SIZE,
+            max,
+            fixed: false,
+            growing: true,
+            window: StreamStats::default(),
+            last_throughput: None,
+            stats: StreamStats::default(),
+        }
+    }
+
+    /// Returns a sizer that always uses the same chunk size.
+    pub fn fixed(size: usize) -> Self {
+        ChunkSizer {
+            size,
+            min: size,
+            max: size,
+            fixed: true,
+            ..Default::default()
+        }
+    }
+
+    /// Size of the next chunk.
+    pub fn size(&self) -> usize {
+        self.size
+    }
+
+    pub fn stats(&self) -> &StreamStats {
+        &self.stats
+    }
+
+    /// Records that a chunk of `bytes` bytes took `elapsed` to be sent and adapts the size.
+    pub fn record(&mut self, bytes: usize, elapsed: Duration) {
+        self.stats.record(bytes, elapsed);
+        if self.fixed {
+            return;
+        }
+
+        self.window.record(bytes, elapsed);
+        if self.window.chunks < WINDOW_CHUNKS {
+            return;
+        }
+
+        let throughput = self.window.throughput();
+        self.window = StreamStats::default();
+        if let Some(last) = self.last_throughput {
+            if throughput < last * (1.0 - TOLERANCE) {
+                self.growing = !self.growing;
+            } else if throughput < last * (1.0 + TOLERANCE) {
+                // no significant change: keep the current size
+                self.last_throughput = Some(throughput);
+                return;
+            }
+        }
+        self.last_throughput = Some(throughput);
+
+        self.size = if self.growing {
+            (self.size * 2).min(self.max)
+        } else {
+            (self.size / 2).max(self.min)
+        };
+    }
+
+    /// Runs `send` and records the time it took to send a chunk of `bytes` bytes.
+    pub fn timed<T>(&mut self, bytes: usize, send: impl FnOnce() -> T) -> T {
+        let start = Instant::now();
+        let res = send();
+        self.record(bytes, start.elapsed());
+        res
+    }
+}
@@ -26,6 +26,18 @@ pub struct BastionLabConfig {
 
     pub public_keys_directory: String,
     pub session_expiry_in_secs: u64,
+
+    // Server-side cache of query results (disabled when the size is 0)
+    #[serde(default)]
+    pub query_cache_size_in_bytes: u64,
+    // Lifetime of the cached results (unlimited when 0)
+    #[serde(default)]
+    pub query_cache_ttl_in_secs: u64,
+
+    // Memory budget of the dataframe store, above which the least recently used dataframes
+    // are spilled to disk (never spilled when 0)
+    #[serde(default)]
+    pub store_memory_size_in_bytes: u64,
 }
 
 fn uri_to_socket(uri: &Uri) -> Result<SocketAddr> {
@@ -49,6 +61,18 @@ impl BastionLabConfig {
     pub fn session_expiry(&self) -> Result<u64> {
         Ok(self.session_expiry_in_secs)
     }
+
+    pub fn query_cache_size(&self) -> Result<u64> {
+        Ok(self.query_cache_size_in_bytes)
+    }
+
+    pub fn query_cache_ttl(&self) -> Result<u64> {
+        Ok(self.query_cache_ttl_in_secs)
+    }
+
+    pub fn store_memory_size(&self) -> Result<u64> {
+        Ok(self.store_memory_size_in_bytes)
+    }
 }
 
 fn deserialize_uri<'de, D>(deserializer: D) -> Result<Uri, D::Error>
@@ -1,5 +1,6 @@
 pub mod array_store;
 pub mod auth;
+pub mod chunking;
 pub mod common_conversions;
 pub mod config;
 pub mod prelude;
@@ -103,6 +103,24 @@ impl SessionManager {
         Ok(session.client_info.clone())
     }
 
+    /// Returns the key of the session of a token, as stored in the session map
+    pub fn get_session_key(&self, token: &Option<Bytes>) -> Vec<u8> {
+        match token {
+            Some(v) => v.to_vec(),
+            None => vec![0u8; 32],
+        }
+    }
+
+    /// Whether the session of the given key still exists and has not expired
+    pub fn is_session_alive(&self, key: &[u8]) -> bool {
+        let sessions = self.sessions.read().expect("Poisoned lock");
+        match sessions.get(key) {
+            // sessions do not expire when auth is disabled
+            Some(session) => !self.auth_enabled() || SystemTime::now() <= session.expiry,
+            None => false,
+        }
+    }
+
     fn new_challenge(&self) -> [u8; 32] {
         let rng = ring::rand::SystemRandom::new();
         loop {
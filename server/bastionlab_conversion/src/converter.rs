@@ -34,7 +34,7 @@ impl Converter {
         tensor
     }
 
-    pub fn df_to_ndarray(&self, df: &DataFrame) -> Result<String, Status> {
+    pub fn df_to_ndarray(&self, df: &DataFrame, session: &[u8]) -> Result<String, Status> {
         let set = HashSet::from_iter(df.dtypes().iter().map(|dtype| dtype.to_string()));
         if set.len() > 1 {
             return Err(Status::aborted(
@@ -94,7 +94,7 @@ impl Converter {
                 return Err(Status::aborted(format!("{:?} not support ", dtype)));
             }
         };
-        let identifier = self.polars.insert_array(arr);
+        let identifier = self.polars.insert_array(arr, session);
         Ok(identifier)
     }
 
@@ -232,6 +232,7 @@ impl ConversionService for Converter {
         &self,
         request: Request<RemoteDataFrame>,
     ) -> Result<Response<RemoteArray>, Status> {
+        let session = self.polars.session_key(&request)?;
         let identifier = request.into_inner().identifier;
 
         /*
@@ -252,7 +253,7 @@ impl ConversionService for Converter {
             |dtype: &str| -> bool { dtypes.iter().find(|s| s.contains(dtype)).is_some() };
         let arr = if !(dtype_exists("list") || dtype_exists("utf8")) {
             RemoteArray {
-                identifier: (self.df_to_ndarray(&df)?),
+                identifier: (self.df_to_ndarray(&df, &session)?),
             }
         } else if dtype_exists("list") {
             /*
@@ -274,7 +275,7 @@ impl ConversionService for Converter {
             */
             let array = ArrayStore::stack(Axis(1), &out[..])?;
             RemoteArray {
-                identifier: self.polars.insert_array(array),
+                identifier: self.polars.insert_array(array, &session),
             }
         } else {
             return Err(
@@ -288,6 +289,7 @@ impl ConversionService for Converter {
         &self,
         request: Request<ToTokenizedArrays>,
     ) -> Result<Response<RemoteArrays>, Status> {
+        let session = self.polars.session_key(&request)?;
         let (identifier, add_special_tokens, model, config, revision, auth_token) = (
             request.get_ref().identifier.clone(),
             request.get_ref().add_special_tokens,
@@ -328,10 +330,14 @@ impl ConversionService for Converter {
             };
 
             let ids = RemoteArray {
-                identifier: self.polars.insert_array(ArrayStore::AxdynI64(ids)),
+                identifier: self
+                    .polars
+                    .insert_array(ArrayStore::AxdynI64(ids), &session),
             };
             let masks = RemoteArray {
-                identifier: self.polars.insert_array(ArrayStore::AxdynI64(masks)),
+                identifier: self
+                    .polars
+                    .insert_array(ArrayStore::AxdynI64(masks), &session),
             };
 
             identifiers.append(&mut vec![ids, masks]);
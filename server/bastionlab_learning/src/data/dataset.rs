@@ -1,5 +1,7 @@
 use super::privacy_guard::{BatchDependence, PrivacyBudget, PrivacyContext, PrivacyGuard};
-use crate::serialization::SizedObjectsBytes;
+use crate::serialization::{
+    BatchFormat, DatasetBatch, DatasetHeader, RawTensorHeader, SizedObjectsBytes,
+};
 use rand::{seq::SliceRandom, thread_rng};
 use std::convert::TryFrom;
 use std::io::Cursor;
@@ -139,73 +141,151 @@ impl Dataset {
     pub fn len(&self) -> usize {
         self.labels.lock().unwrap().size()[0] as usize
     }
+
+    /// Returns the privacy limit of the dataset, or -1.0 if it is not private.
+    pub fn privacy_limit(&self) -> f64 {
+        match self.privacy_context.read().unwrap().limit() {
+            PrivacyBudget::NotPrivate => -1.0,
+            PrivacyBudget::Private(eps) => eps as f64,
+        }
+    }
+
+    /// Serializes the dataset in the raw batch format: a [`DatasetHeader`] describing
+    /// the whole columns followed by [`DatasetBatch`]es of about `batch_bytes` bytes.
+    pub fn to_raw_batches(&self, batch_bytes: usize) -> Result<SizedObjectsBytes, TchError> {
+        let guards: Vec<_> = self
+            .samples_inputs
+            .iter()
+            .map(|input| input.lock().unwrap())
+            .collect();
+        let labels = self.labels.lock().unwrap();
+        let mut named_tensors: Vec<_> = guards
+            .iter()
+            .enumerate()
+            .map(|(i, input)| (format!("samples_{}", i), input.deref()))
+            .collect();
+        named_tensors.push((String::from("labels"), &*labels));
+
+        let privacy_limit = self.privacy_limit();
+        let header = DatasetHeader {
+            tensors: named_tensors
+                .iter()
+                .map(|(name, tensor)| (name.clone(), RawTensorHeader::contiguous(tensor)))
+                .collect(),
+            privacy_limit,
+        };
+        let mut dataset_bytes = SizedObjectsBytes::new();
+        dataset_bytes.append_back(header.encode()?);
+
+        let nb_samples = labels.size()[0];
+        let row_bytes: usize = named_tensors
+            .iter()
+            .map(|(_, tensor)| {
+                let row_numel: i64 = tensor.size()[1..].iter().product();
+                row_numel as usize * tensor.kind().elt_size_in_bytes()
+            })
+            .sum();
+        let batch_rows = (batch_bytes / row_bytes.max(1)).max(1) as i64;
+
+        let mut start = 0;
+        while start < nb_samples {
+            let len = batch_rows.min(nb_samples - start);
+            let batch = DatasetBatch {
+                tensors: named_tensors
+                    .iter()
+                    .map(|(name, tensor)| Ok((name.clone(), tensor.f_narrow(0, start, len)?)))
+                    .collect::<Result<Vec<_>, TchError>>()?,
+                privacy_limit,
+            };
+            dataset_bytes.append_back(batch.encode()?);
+            start += len;
+        }
+
+        Ok(dataset_bytes)
+    }
 }
 
-impl TryFrom<SizedObjectsBytes> for Dataset {
-    type Error = TchError;
+/// Accumulates the named tensors of the batches of an uploaded dataset.
+///
+/// Tensors are concatenated once all batches have been received, in [`DatasetBuilder::build`].
+#[derive(Debug)]
+pub struct DatasetBuilder {
+    samples_inputs: Vec<Vec<Tensor>>,
+    labels: Vec<Tensor>,
+    privacy_limit: PrivacyBudget,
+}
 
-    fn try_from(value: SizedObjectsBytes) -> Result<Self, Self::Error> {
-        let mut samples_inputs: Vec<Option<Arc<Mutex<Tensor>>>> = Vec::new();
-        let mut labels: Option<Arc<Mutex<Tensor>>> = None;
-        #[allow(unused_variables)]
-        let mut privacy_limit = PrivacyBudget::Private(0.0);
+impl Default for DatasetBuilder {
+    fn default() -> Self {
+        DatasetBuilder {
+            samples_inputs: Vec::new(),
+            labels: Vec::new(),
+            privacy_limit: PrivacyBudget::Private(0.0),
+        }
+    }
+}
 
-        for object in value {
-            let data =
-                Tensor::load_multi_from_stream_with_device(Cursor::new(object), Device::Cpu)?;
-            for (name, tensor) in data {
-                match &*name {
-                    "labels" => match &labels {
-                        Some(labels) => {
-                            let mut labels = labels.lock().unwrap();
-                            *labels = Tensor::f_cat(&[&*labels, &tensor], 0)?;
-                        }
-                        None => {
-                            labels = Some(Arc::new(Mutex::new(tensor)));
-                        }
-                    },
-                    "privacy_limit" => {
-                        let limit = tensor.f_double_value(&[])? as f32;
-                        #[allow(unused_assignments)]
-                        {
-                            privacy_limit = if limit < 0.0 {
-                                PrivacyBudget::NotPrivate
-                            } else {
-                                PrivacyBudget::Private(limit)
-                            };
-                        }
-                    }
-                    s => {
-                        if s.starts_with("samples_") {
-                            let idx: usize = s[8..].parse().or(Err(TchError::FileFormat(
-                                String::from(format!("Invalid data, unknown field {}.", s)),
-                            )))?;
-                            if samples_inputs.len() <= idx {
-                                for _ in samples_inputs.len()..(idx + 1) {
-                                    samples_inputs.push(None);
-                                }
-                            }
-                            match &samples_inputs[idx] {
-                                Some(samples_input) => {
-                                    let mut samples_input = samples_input.lock().unwrap();
-                                    *samples_input = Tensor::f_cat(&[&*samples_input, &tensor], 0)?;
-                                }
-                                None => {
-                                    samples_inputs[idx] = Some(Arc::new(Mutex::new(tensor)));
-                                }
-                            }
-                        } else {
-                            return Err(TchError::FileFormat(String::from(format!(
-                                "Invalid data, unknown field {}.",
-                                s
-                            ))));
-                        }
-                    }
-                };
+impl DatasetBuilder {
+    /// Adds a tensor named `labels`, `privacy_limit` or `samples_{i}` to the dataset.
+    pub fn push(&mut self, name: &str, tensor: Tensor) -> Result<(), TchError> {
+        match name {
+            "labels" => self.labels.push(tensor),
+            "privacy_limit" => self.set_privacy_limit(tensor.f_double_value(&[])?),
+            s => {
+                let idx: usize = s
+                    .strip_prefix("samples_")
+                    .and_then(|idx| idx.parse().ok())
+                    .ok_or(TchError::FileFormat(format!(
+                        "Invalid data, unknown field {}.",
+                        s
+                    )))?;
+                if self.samples_inputs.len() <= idx {
+                    self.samples_inputs.resize_with(idx + 1, Vec::new);
+                }
+                self.samples_inputs[idx].push(tensor);
+            }
+        };
+        Ok(())
+    }
+
+    /// Sets the privacy limit of the dataset, a negative limit means the dataset is not private.
+    pub fn set_privacy_limit(&mut self, limit: f64) {
+        self.privacy_limit = if limit < 0.0 {
+            PrivacyBudget::NotPrivate
+        } else {
+            PrivacyBudget::Private(limit as f32)
+        };
+    }
+
+    /// Adds all the tensors contained in a serialized batch.
+    pub fn push_batch(&mut self, batch: Vec<u8>, format: BatchFormat) -> Result<(), TchError> {
+        match format {
+            BatchFormat::TorchScript => {
+                let data =
+                    Tensor::load_multi_from_stream_with_device(Cursor::new(batch), Device::Cpu)?;
+                for (name, tensor) in data {
+                    self.push(&name, tensor)?;
+                }
+            }
+            BatchFormat::Raw => {
+                let batch = DatasetBatch::decode(&batch)?;
+                self.set_privacy_limit(batch.privacy_limit);
+                for (name, tensor) in batch.tensors {
+                    self.push(&name, tensor)?;
+                }
             }
         }
-        let labels = labels.unwrap();
-        let label_size = labels.lock().unwrap().size();
+        Ok(())
+    }
+
+    pub fn build(self) -> Result<Dataset, TchError> {
+        if self.labels.is_empty() {
+            return Err(TchError::FileFormat(String::from(
+                "Invalid data, missing labels.",
+            )));
+        }
+        let labels = Tensor::f_cat(&self.labels, 0)?;
+        let label_size = labels.size();
         let nb_samples = if label_size.len() > 0 {
             Ok(label_size[0])
         } else {
@@ -213,17 +293,51 @@ impl TryFrom<SizedObjectsBytes> for Dataset {
                 "Labels tensor has no dimmensions, cannot infer dataset size.",
             )))
         }?;
+        let samples_inputs = self
+            .samples_inputs
+            .iter()
+            .enumerate()
+            .map(|(i, tensors)| {
+                if tensors.is_empty() {
+                    return Err(TchError::FileFormat(format!(
+                        "Invalid data, missing field samples_{}.",
+                        i
+                    )));
+                }
+                Ok(Arc::new(Mutex::new(Tensor::f_cat(tensors, 0)?)))
+            })
+            .collect::<Result<Vec<_>, _>>()?;
+
         Ok(Dataset {
-            samples_inputs: samples_inputs.into_iter().map(|opt| opt.unwrap()).collect(),
-            labels,
+            samples_inputs,
+            labels: Arc::new(Mutex::new(labels)),
             privacy_context: Arc::new(RwLock::new(PrivacyContext::new(
-                privacy_limit,
+                self.privacy_limit,
                 nb_samples as usize,
             ))),
         })
     }
 }
 
+impl Dataset {
+    /// Builds a dataset from its batches serialized in the given format.
+    pub fn from_batches(value: SizedObjectsBytes, format: BatchFormat) -> Result<Self, TchError> {
+        let mut builder = DatasetBuilder::default();
+        for object in value {
+            builder.push_batch(object, format)?;
+        }
+        builder.build()
+    }
+}
+
+impl TryFrom<SizedObjectsBytes> for Dataset {
+    type Error = TchError;
+
+    fn try_from(value: SizedObjectsBytes) -> Result<Self, Self::Error> {
+        Dataset::from_batches(value, BatchFormat::TorchScript)
+    }
+}
+
 impl TryFrom<&Dataset> for SizedObjectsBytes {
     type Error = TchError;
 
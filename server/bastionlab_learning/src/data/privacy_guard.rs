@@ -136,6 +136,10 @@ impl PrivacyContext {
         self.nb_samples
     }
 
+    pub fn limit(&self) -> PrivacyBudget {
+        self.limit
+    }
+
     fn update_budget(&mut self, budget: PrivacyBudget) {
         match (&mut self.expended, budget) {
             (PrivacyBudget::NotPrivate, _) => (),
@@ -1,6 +1,6 @@
 use std::io::Cursor;
 
-use tch::{Device, TchError, Tensor};
+use tch::{Device, Kind, TchError, Tensor};
 
 fn read_le_usize(input: &mut &[u8]) -> usize {
     let (int_bytes, rest) = input.split_at(std::mem::size_of::<usize>());
@@ -96,9 +96,379 @@ impl TryFrom<&BinaryModule> for SizedObjectsBytes {
 impl TryFrom<&SizedObjectsBytes> for tch::Tensor {
     type Error = TchError;
     fn try_from(value: &SizedObjectsBytes) -> Result<Self, Self::Error> {
+        if RawTensorHeader::is_raw_tensor(&value.0) {
+            return raw_tensor_from_bytes(&value.0);
+        }
+        // legacy format: a TorchScript archive holding the tensor
         let object = value.0.clone();
         let data = Tensor::load_multi_from_stream_with_device(Cursor::new(object), Device::Cpu)?;
         let data = data[0].1.detach();
         Ok(data)
     }
 }
+
+/// Magic bytes starting a tensor serialized in the raw tensor format.
+pub const RAW_TENSOR_MAGIC: &[u8; 8] = b"BLTENSOR";
+
+/// Version of the raw tensor format.
+pub const RAW_TENSOR_VERSION: u8 = 1;
+
+/// Header of a tensor serialized in the raw tensor format:
+///
+/// `header = [magic: 8 bytes | version: u8 | kind_len: u8 | kind: kind_len bytes (ascii)
+///            | ndim: u32 | shape: ndim * i64 | strides: ndim * i64 | nbytes: u64]`
+///
+/// `tensor = [header | storage: nbytes bytes]`
+///
+/// All integers are little-endian. The storage contains the raw (little-endian) elements,
+/// laid out according to the strides (in number of elements).
+#[derive(Debug, Clone, PartialEq)]
+pub struct RawTensorHeader {
+    pub kind: Kind,
+    pub shape: Vec<i64>,
+    pub strides: Vec<i64>,
+    pub nbytes: usize,
+}
+
+/// Name of a [`tch::Kind`] in the raw tensor format.
+pub fn kind_name(kind: Kind) -> Result<&'static str, TchError> {
+    Ok(match kind {
+        Kind::Uint8 => "Uint8",
+        Kind::Int8 => "Int8",
+        Kind::Int16 => "Int16",
+        Kind::Int => "Int",
+        Kind::Int64 => "Int64",
+        Kind::Half => "Half",
+        Kind::Float => "Float",
+        Kind::Double => "Double",
+        Kind::ComplexHalf => "ComplexHalf",
+        Kind::ComplexFloat => "ComplexFloat",
+        Kind::ComplexDouble => "ComplexDouble",
+        Kind::Bool => "Bool",
+        Kind::BFloat16 => "BFloat16",
+        kind => {
+            return Err(TchError::Kind(format!(
+                "Unsupported kind in raw tensor format: {:?}",
+                kind
+            )))
+        }
+    })
+}
+
+/// Parses the name of a [`tch::Kind`] in the raw tensor format.
+pub fn kind_from_name(name: &str) -> Result<Kind, TchError> {
+    Ok(match name {
+        "Uint8" => Kind::Uint8,
+        "Int8" => Kind::Int8,
+        "Int16" => Kind::Int16,
+        "Int" => Kind::Int,
+        "Int64" => Kind::Int64,
+        "Half" => Kind::Half,
+        "Float" => Kind::Float,
+        "Double" => Kind::Double,
+        "ComplexHalf" => Kind::ComplexHalf,
+        "ComplexFloat" => Kind::ComplexFloat,
+        "ComplexDouble" => Kind::ComplexDouble,
+        "Bool" => Kind::Bool,
+        "BFloat16" => Kind::BFloat16,
+        name => {
+            return Err(TchError::Kind(format!(
+                "Unsupported kind in raw tensor format: {}",
+                name
+            )))
+        }
+    })
+}
+
+fn take<'a>(input: &mut &'a [u8], n: usize) -> Option<&'a [u8]> {
+    if input.len() < n {
+        return None;
+    }
+    let (head, rest) = input.split_at(n);
+    *input = rest;
+    Some(head)
+}
+
+fn take_u64(input: &mut &[u8]) -> Option<u64> {
+    take(input, 8).map(|b| u64::from_le_bytes(b.try_into().unwrap()))
+}
+
+fn take_i64(input: &mut &[u8]) -> Option<i64> {
+    take(input, 8).map(|b| i64::from_le_bytes(b.try_into().unwrap()))
+}
+
+impl RawTensorHeader {
+    /// Returns the header of the raw serialization of a contiguous tensor.
+    pub fn contiguous(tensor: &Tensor) -> Self {
+        let shape = tensor.size();
+        let mut strides = vec![1; shape.len()];
+        for i in (0..shape.len().saturating_sub(1)).rev() {
+            strides[i] = strides[i + 1] * shape[i + 1].max(1);
+        }
+        RawTensorHeader {
+            kind: tensor.kind(),
+            nbytes: tensor.numel() * tensor.kind().elt_size_in_bytes(),
+            shape,
+            strides,
+        }
+    }
+
+    /// Returns true if `input` starts with the magic bytes of the raw tensor format.
+    pub fn is_raw_tensor(input: &[u8]) -> bool {
+        input.starts_with(RAW_TENSOR_MAGIC)
+    }
+
+    pub fn encode(&self) -> Result<Vec<u8>, TchError> {
+        let kind = kind_name(self.kind)?;
+        let mut buf = Vec::with_capacity(8 + 2 + kind.len() + 4 + 16 * self.shape.len() + 8);
+        buf.extend_from_slice(RAW_TENSOR_MAGIC);
+        buf.push(RAW_TENSOR_VERSION);
+        buf.push(kind.len() as u8);
+        buf.extend_from_slice(kind.as_bytes());
+        buf.extend_from_slice(&(self.shape.len() as u32).to_le_bytes());
+        for x in self.shape.iter().chain(self.strides.iter()) {
+            buf.extend_from_slice(&x.to_le_bytes());
+        }
+        buf.extend_from_slice(&(self.nbytes as u64).to_le_bytes());
+        Ok(buf)
+    }
+
+    /// Parses the header at the start of `input`.
+    ///
+    /// Returns the header and its length in bytes, or `None` if `input` is too short
+    /// to contain the whole header.
+    pub fn decode(input: &[u8]) -> Result<Option<(Self, usize)>, TchError> {
+        let total = input.len();
+        let mut input = input;
+        let header = (|| {
+            let magic = take(&mut input, RAW_TENSOR_MAGIC.len())?;
+            let version = take(&mut input, 1)?[0];
+            let kind_len = take(&mut input, 1)?[0] as usize;
+            let kind = take(&mut input, kind_len)?;
+            let ndim = u32::from_le_bytes(take(&mut input, 4)?.try_into().unwrap()) as usize;
+            let shape = (0..ndim)
+                .map(|_| take_i64(&mut input))
+                .collect::<Option<Vec<_>>>()?;
+            let strides = (0..ndim)
+                .map(|_| take_i64(&mut input))
+                .collect::<Option<Vec<_>>>()?;
+            let nbytes = take_u64(&mut input)? as usize;
+            Some((magic, version, kind, shape, strides, nbytes))
+        })();
+
+        let (magic, version, kind, shape, strides, nbytes) = match header {
+            Some(header) => header,
+            None => return Ok(None),
+        };
+        if magic != RAW_TENSOR_MAGIC {
+            return Err(TchError::FileFormat(String::from(
+                "Invalid data, expected a raw tensor.",
+            )));
+        }
+        if version != RAW_TENSOR_VERSION {
+            return Err(TchError::FileFormat(format!(
+                "Unsupported raw tensor format version: {}",
+                version
+            )));
+        }
+        let kind = kind_from_name(std::str::from_utf8(kind).map_err(|_| {
+            TchError::FileFormat(String::from("Invalid kind in raw tensor header."))
+        })?)?;
+
+        Ok(Some((
+            RawTensorHeader {
+                kind,
+                shape,
+                strides,
+                nbytes,
+            },
+            total - input.len(),
+        )))
+    }
+
+    /// Builds a tensor from the storage bytes that follow this header.
+    pub fn tensor_from_storage(&self, storage: &[u8]) -> Result<Tensor, TchError> {
+        let elt_size = self.kind.elt_size_in_bytes();
+        if storage.len() != self.nbytes || self.nbytes % elt_size != 0 {
+            return Err(TchError::FileFormat(format!(
+                "Invalid raw tensor storage size: expected {} bytes, got {}",
+                self.nbytes,
+                storage.len()
+            )));
+        }
+        let storage_numel = (self.nbytes / elt_size) as i64;
+        // the farthest element must lie within the storage
+        let max_offset: i64 = self
+            .shape
+            .iter()
+            .zip(self.strides.iter())
+            .map(|(&size, &stride)| (size - 1).max(0) * stride)
+            .sum();
+        let numel: i64 = self.shape.iter().product();
+        if self.strides.iter().any(|&s| s < 0) || (numel > 0 && max_offset >= storage_numel) {
+            return Err(TchError::FileFormat(String::from(
+                "Invalid raw tensor strides.",
+            )));
+        }
+
+        let storage = Tensor::of_data_size(storage, &[storage_numel], self.kind);
+        Ok(storage
+            .f_as_strided(&self.shape, &self.strides, 0)?
+            .contiguous())
+    }
+}
+
+/// Serializes a tensor in the raw tensor format.
+pub fn raw_tensor_to_bytes(tensor: &Tensor) -> Result<Vec<u8>, TchError> {
+    let tensor = tensor.to_device(Device::Cpu).contiguous();
+    let header = RawTensorHeader::contiguous(&tensor);
+    let mut buf = header.encode()?;
+    let offset = buf.len();
+    buf.resize(offset + header.nbytes, 0);
+    tensor.f_copy_data_u8(&mut buf[offset..], tensor.numel())?;
+    Ok(buf)
+}
+
+/// Deserializes a tensor in the raw tensor format.
+pub fn raw_tensor_from_bytes(input: &[u8]) -> Result<Tensor, TchError> {
+    let (header, len) = RawTensorHeader::decode(input)?.ok_or_else(|| {
+        TchError::FileFormat(String::from("Invalid data, truncated raw tensor header."))
+    })?;
+    header.tensor_from_storage(&input[len..])
+}
+
+/// Magic bytes starting a dataset batch serialized in the raw batch format.
+pub const DATASET_BATCH_MAGIC: &[u8; 8] = b"BLDSBTCH";
+
+/// Version of the raw batch format.
+pub const DATASET_BATCH_VERSION: u8 = 1;
+
+/// Approximate size of the batches of a dataset sent in the raw batch format.
+pub const DATASET_BATCH_BYTES: usize = 4 * 1024 * 1024;
+
+/// Format of the batches of an uploaded dataset, announced by the client in the meta field
+/// of the first chunk (`{"batch_format": 1}`), which is empty with older clients.
+#[derive(Debug, Clone, Copy, PartialEq, Eq)]
+pub enum BatchFormat {
+    /// Every batch is a TorchScript module holding named tensors as parameters.
+    TorchScript,
+    /// Every batch is a [`DatasetBatch`].
+    Raw,
+}
+
+/// A batch of a dataset serialized in the raw batch format:
+///
+/// `batch = [magic: 8 bytes | version: u8 | privacy_limit: f64 | count: u32 | tensor, ...]`
+///
+/// `tensor = [name_len: u16 | name: name_len bytes (utf-8) | raw tensor (see RawTensorHeader)]`
+///
+/// All integers are little-endian. Tensors are named `samples_{i}` (input columns) and `labels`.
+#[derive(Debug)]
+pub struct DatasetBatch {
+    pub tensors: Vec<(String, Tensor)>,
+    pub privacy_limit: f64,
+}
+
+impl DatasetBatch {
+    pub fn encode(&self) -> Result<Vec<u8>, TchError> {
+        let mut buf = Vec::new();
+        buf.extend_from_slice(DATASET_BATCH_MAGIC);
+        buf.push(DATASET_BATCH_VERSION);
+        buf.extend_from_slice(&self.privacy_limit.to_le_bytes());
+        buf.extend_from_slice(&(self.tensors.len() as u32).to_le_bytes());
+        for (name, tensor) in self.tensors.iter() {
+            buf.extend_from_slice(&(name.len() as u16).to_le_bytes());
+            buf.extend_from_slice(name.as_bytes());
+            buf.append(&mut raw_tensor_to_bytes(tensor)?);
+        }
+        Ok(buf)
+    }
+
+    pub fn decode(input: &[u8]) -> Result<Self, TchError> {
+        let truncated = || TchError::FileFormat(String::from("Invalid data, truncated batch."));
+        let mut input = input;
+
+        if take(&mut input, DATASET_BATCH_MAGIC.len()).ok_or_else(truncated)? != DATASET_BATCH_MAGIC
+        {
+            return Err(TchError::FileFormat(String::from(
+                "Invalid data, expected a raw dataset batch.",
+            )));
+        }
+        let version = take(&mut input, 1).ok_or_else(truncated)?[0];
+        if version != DATASET_BATCH_VERSION {
+            return Err(TchError::FileFormat(format!(
+                "Unsupported raw batch format version: {}",
+                version
+            )));
+        }
+        let privacy_limit = f64::from_le_bytes(
+            take(&mut input, 8)
+                .ok_or_else(truncated)?
+                .try_into()
+                .unwrap(),
+        );
+        let count = u32::from_le_bytes(
+            take(&mut input, 4)
+                .ok_or_else(truncated)?
+                .try_into()
+                .unwrap(),
+        );
+
+        let mut tensors = Vec::with_capacity(count as usize);
+        for _ in 0..count {
+            let name_len = u16::from_le_bytes(
+                take(&mut input, 2)
+                    .ok_or_else(truncated)?
+                    .try_into()
+                    .unwrap(),
+            ) as usize;
+            let name =
+                String::from_utf8(take(&mut input, name_len).ok_or_else(truncated)?.to_vec())
+                    .map_err(|_| {
+                        TchError::FileFormat(String::from("Invalid tensor name in batch."))
+                    })?;
+            let (header, header_len) = RawTensorHeader::decode(input)?.ok_or_else(truncated)?;
+            take(&mut input, header_len);
+            let storage = take(&mut input, header.nbytes).ok_or_else(truncated)?;
+            tensors.push((name, header.tensor_from_storage(storage)?));
+        }
+
+        Ok(DatasetBatch {
+            tensors,
+            privacy_limit,
+        })
+    }
+}
+
+/// Magic bytes starting the header of a dataset streamed in the raw batch format.
+pub const DATASET_HEADER_MAGIC: &[u8; 8] = b"BLDSHEAD";
+
+/// Header sent before the batches of a dataset streamed in the raw batch format, so that
+/// the receiver can allocate the whole dataset upfront:
+///
+/// `header = [magic: 8 bytes | version: u8 | privacy_limit: f64 | count: u32 | tensor, ...]`
+///
+/// `tensor = [name_len: u16 | name: name_len bytes (utf-8) | raw tensor header (see RawTensorHeader)]`
+///
+/// Each raw tensor header describes a whole column (or the labels), without its storage.
+#[derive(Debug)]
+pub struct DatasetHeader {
+    pub tensors: Vec<(String, RawTensorHeader)>,
+    pub privacy_limit: f64,
+}
+
+impl DatasetHeader {
+    pub fn encode(&self) -> Result<Vec<u8>, TchError> {
+        let mut buf = Vec::new();
+        buf.extend_from_slice(DATASET_HEADER_MAGIC);
+        buf.push(DATASET_BATCH_VERSION);
+        buf.extend_from_slice(&self.privacy_limit.to_le_bytes());
+        buf.extend_from_slice(&(self.tensors.len() as u32).to_le_bytes());
+        for (name, header) in self.tensors.iter() {
+            buf.extend_from_slice(&(name.len() as u16).to_le_bytes());
+            buf.extend_from_slice(name.as_bytes());
+            buf.append(&mut header.encode()?);
+        }
+        Ok(buf)
+    }
+}
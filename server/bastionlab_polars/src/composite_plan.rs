@@ -1,20 +1,37 @@
 use base64;
 use bastionlab_common::common_conversions::{
-    lazy_frame_from_logical_plan, series_to_tensor, tensor_to_series,
+    lazy_frame_from_logical_plan, load_udf, series_to_tensor, tensor_to_series,
 };
+use log::info;
 use polars::{lazy::dsl::Expr, prelude::*};
 use regex::Regex;
+use ring::digest;
 use serde::{Deserialize, Serialize};
-use std::{collections::HashMap, io::Cursor};
-use tch::CModule;
+use std::{
+    collections::HashMap,
+    io::Read,
+    sync::{Arc, Mutex},
+};
 use tonic::Status;
 
 use crate::{
     access_control::{Context, Policy, VerificationResult},
+    polars_proto::{PlanEncoding, Query},
     visitable::{Visitable, VisitableMut},
     BastionLabPolars, DataFrameArtifact,
 };
 
+/// Encodings of composite plans accepted by [`CompositePlan::decode`].
+pub const PLAN_ENCODINGS: [PlanEncoding; 3] = [
+    PlanEncoding::Json,
+    PlanEncoding::Msgpack,
+    PlanEncoding::MsgpackZstd,
+];
+
+/// Maximum size of a decompressed composite plan: it bounds the memory used by compressed
+/// plans that expand far more than expected.
+const MAX_DECOMPRESSED_PLAN_SIZE: u64 = 64 * 1024 * 1024;
+
 #[derive(Debug, Serialize, Deserialize)]
 pub struct CompositePlan {
     segments: Vec<CompositePlanSegment>,
@@ -23,11 +40,58 @@ pub struct CompositePlan {
 #[derive(Debug, Serialize, Deserialize)]
 #[serde(tag = "type")]
 pub enum CompositePlanSegment {
-    PolarsPlanSegment { plan: LogicalPlan },
-    UdfPlanSegment { columns: Vec<String>, udf: String },
-    EntryPointPlanSegment { identifier: String },
+    PolarsPlanSegment {
+        plan: LogicalPlan,
+    },
+    UdfPlanSegment {
+        columns: Vec<String>,
+        /// Base64-encoded TorchScript module (sent by older clients).
+        #[serde(default)]
+        udf: Option<String>,
+        /// Digest of a module previously uploaded to the module cache.
+        #[serde(default)]
+        digest: Option<String>,
+    },
+    EntryPointPlanSegment {
+        identifier: String,
+    },
     StackPlanSegment,
-    RowCountSegment { row: String },
+    RowCountSegment {
+        row: String,
+    },
+}
+
+impl CompositePlanSegment {
+    /// Number of input data frames the segment pops from the stack.
+    fn arity(&self) -> Result<usize, Status> {
+        Ok(match self {
+            CompositePlanSegment::PolarsPlanSegment { plan } => {
+                let mut scans = 0;
+                plan.visit(&mut scans, |plan, scans| {
+                    if let LogicalPlan::DataFrameScan { .. } = plan {
+                        *scans += 1;
+                    }
+                    Ok(())
+                })?;
+                scans
+            }
+            CompositePlanSegment::UdfPlanSegment { .. }
+            | CompositePlanSegment::RowCountSegment { .. } => 1,
+            CompositePlanSegment::EntryPointPlanSegment { .. } => 0,
+            CompositePlanSegment::StackPlanSegment => 2,
+        })
+    }
+}
+
+/// Content hash of the data frame computed by a segment (given in its JSON serialization)
+/// from inputs with the given hashes.
+fn frame_hash(segment: &str, inputs: &[String]) -> String {
+    let mut ctx = digest::Context::new(&digest::SHA256);
+    ctx.update(segment.as_bytes());
+    for input in inputs {
+        ctx.update(input.as_bytes());
+    }
+    hex::encode(ctx.finish().as_ref())
 }
 
 #[derive(Debug, Clone, Copy)]
@@ -39,20 +103,129 @@ pub struct StatsEntry {
 #[derive(Debug, Clone)]
 pub struct DataFrameStats(HashMap<String, StatsEntry>);
 
+#[derive(Clone)]
 struct StackFrame {
     df: DataFrame,
     stats: DataFrameStats,
 }
 
 impl CompositePlan {
+    /// Decodes the composite plan of a query, sent in any of the encodings in [`PLAN_ENCODINGS`].
+    pub fn decode(query: &Query) -> Result<Self, Status> {
+        let encoding = PlanEncoding::from_i32(query.encoding).ok_or_else(|| {
+            Status::invalid_argument(format!("Unknown plan encoding: {}", query.encoding))
+        })?;
+        match encoding {
+            PlanEncoding::Json => serde_json::from_str(&query.composite_plan).map_err(|e| {
+                Status::invalid_argument(format!(
+                    "Could not deserialize composite plan: {}{}",
+                    e, query.composite_plan
+                ))
+            }),
+            PlanEncoding::Msgpack => rmp_serde::from_slice(&query.encoded_plan).map_err(|e| {
+                Status::invalid_argument(format!("Could not deserialize composite plan: {}", e))
+            }),
+            PlanEncoding::MsgpackZstd => {
+                let mut data = Vec::new();
+                zstd::stream::read::Decoder::new(&query.encoded_plan[..])
+                    .and_then(|decoder| {
+                        decoder
+                            .take(MAX_DECOMPRESSED_PLAN_SIZE + 1)
+                            .read_to_end(&mut data)
+                    })
+                    .map_err(|e| {
+                        Status::invalid_argument(format!(
+                            "Could not decompress composite plan: {}",
+                            e
+                        ))
+                    })?;
+                if data.len() as u64 > MAX_DECOMPRESSED_PLAN_SIZE {
+                    return Err(Status::invalid_argument(format!(
+                        "Composite plan is larger than {} bytes once decompressed",
+                        MAX_DECOMPRESSED_PLAN_SIZE
+                    )));
+                }
+                rmp_serde::from_slice(&data).map_err(|e| {
+                    Status::invalid_argument(format!("Could not deserialize composite plan: {}", e))
+                })
+            }
+        }
+    }
+
+    /// Identifiers of the data frames the plan reads from.
+    pub fn entry_points(&self) -> Vec<String> {
+        self.segments
+            .iter()
+            .filter_map(|seg| match seg {
+                CompositePlanSegment::EntryPointPlanSegment { identifier } => {
+                    Some(identifier.clone())
+                }
+                _ => None,
+            })
+            .collect()
+    }
+
+    /// Returns the arity and the frame hash of every segment, given their JSON serializations.
+    fn frame_hashes(&self, segments: &[String]) -> Result<Vec<(usize, String)>, Status> {
+        let mut hashes: Vec<String> = Vec::new();
+        let mut res = Vec::with_capacity(self.segments.len());
+        for (seg, serialized) in self.segments.iter().zip(segments) {
+            let arity = seg.arity()?;
+            let inputs = hashes.len().saturating_sub(arity);
+            let hash = frame_hash(serialized, &hashes[inputs..]);
+            hashes.truncate(inputs);
+            hashes.push(hash.clone());
+            res.push((arity, hash));
+        }
+        Ok(res)
+    }
+
     pub fn run(self, state: &BastionLabPolars, user_id: &str) -> Result<DataFrameArtifact, Status> {
         let mut stack = Vec::new();
-        let plan_str = serde_json::to_string(&self.segments).map_err(|e| {
-            Status::invalid_argument(format!("Could not parse composite plan: {e}"))
-        })?;
+        // segments are only serialized once, for the query details and the frame hashes
+        let segments = self
+            .segments
+            .iter()
+            .map(serde_json::to_string)
+            .collect::<Result<Vec<_>, _>>()
+            .map_err(|e| {
+                Status::invalid_argument(format!("Could not parse composite plan: {e}"))
+            })?;
+        let plan_str = format!("[{}]", segments.join(","));
         let mut blacklist_hashmap = HashMap::new();
 
-        for seg in self.segments {
+        // The plan is a DAG flattened in postfix order: when both sides of a join (or the
+        // inputs of a SQL query) derive from the same pipeline, its segments are repeated.
+        // Data frames are addressed by the hash of their segment and inputs so that repeated
+        // subplans are only run once per query. Only the data frames of repeated segments are
+        // kept, until their last use.
+        let hashes = self.frame_hashes(&segments)?;
+        drop(segments);
+        let mut uses: HashMap<String, usize> = HashMap::new();
+        for (_, hash) in hashes.iter() {
+            *uses.entry(hash.clone()).or_insert(0) += 1;
+        }
+        let mut frames: HashMap<String, StackFrame> = HashMap::new();
+        let nb_segments = self.segments.len();
+        let mut reused = 0;
+
+        for (seg, (arity, hash)) in self.segments.into_iter().zip(hashes) {
+            let remaining = {
+                let n = uses.get_mut(&hash).unwrap();
+                *n -= 1;
+                *n
+            };
+            let frame = match remaining {
+                0 => frames.remove(&hash),
+                _ => frames.get(&hash).cloned(),
+            };
+            if let Some(frame) = frame {
+                stack.truncate(stack.len().saturating_sub(arity));
+                stack.push(frame);
+                reused += 1;
+                continue;
+            }
+
             match seg {
                 CompositePlanSegment::PolarsPlanSegment { mut plan } => {
                     let stats = initialize_plan(&mut plan, &mut stack)?;
@@ -72,20 +245,21 @@ impl CompositePlan {
 
                     stack.push(StackFrame { df, stats });
                 }
-                CompositePlanSegment::UdfPlanSegment { columns, udf } => {
-                    let module =
-                        CModule::load_data(&mut Cursor::new(base64::decode(udf).map_err(|e| {
-                            Status::invalid_argument(format!(
-                                "Could not decode base64-encoded udf: {}",
-                                e
-                            ))
-                        })?))
-                        .map_err(|e| {
-                            Status::invalid_argument(format!(
-                                "Could not deserialize udf from bytes: {}",
-                                e
+                CompositePlanSegment::UdfPlanSegment {
+                    columns,
+                    udf,
+                    digest,
+                } => {
+                    let module = match (digest, udf) {
+                        (Some(digest), _) => state.get_udf(&digest)?,
+                        (None, Some(udf)) => Arc::new(Mutex::new(load_udf(udf)?)),
+                        (None, None) => {
+                            return Err(Status::invalid_argument(
+                                "Could not apply udf: no module given",
                             ))
-                        })?;
+                        }
+                    };
+                    let module = module.lock().unwrap();
 
                     let mut frame = stack.pop().ok_or_else(|| {
                         Status::invalid_argument("Could not apply udf: no input data frame")
@@ -146,6 +320,18 @@ impl CompositePlan {
                     stack.push(StackFrame { df, stats });
                 }
             }
+
+            // every segment pushes exactly one data frame
+            if remaining > 0 {
+                frames.insert(hash, stack.last().unwrap().clone());
+            }
+        }
+
+        if reused > 0 {
+            info!(
+                "Reused the results of {} out of {} plan segments",
+                reused, nb_segments
+            );
         }
 
         if stack.len() != 1 {
@@ -190,6 +376,11 @@ impl CompositePlan {
             policy,
             blacklist,
             query_details: plan_str,
+            ephemeral: false,
+            holders: None,
+            spilled: None,
+            last_access: 0,
+            unloaded: false,
         })
     }
 }
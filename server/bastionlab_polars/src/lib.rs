@@ -10,12 +10,13 @@ use polars::prelude::*;
 use rand::rngs::StdRng;
 use rand::seq::SliceRandom;
 use rand::{thread_rng, SeedableRng};
+use ring::digest;
 use serde::{Deserialize, Serialize};
 use serde_json;
-use std::fs::{create_dir, read_dir, OpenOptions};
-use std::io::{Error, ErrorKind};
+use std::io::{Cursor, Error};
 use std::{future::Future, pin::Pin, time::Instant};
-use tokio_stream::wrappers::ReceiverStream;
+use tch::CModule;
+use tokio_stream::{wrappers::ReceiverStream, StreamExt};
 use tonic::{Request, Response, Status, Streaming};
 use utils::sanitize_df;
 use uuid::Uuid;
@@ -25,8 +26,9 @@ pub mod polars_proto {
 }
 
 use polars_proto::{
-    polars_service_server::PolarsService, Empty, FetchChunk, Query, ReferenceList,
-    ReferenceRequest, ReferenceResponse, SendChunk, SplitRequest,
+    polars_service_server::PolarsService, Empty, FetchChunk, Queries, Query, QueryCacheStats,
+    ReferenceList, ReferenceRequest, ReferenceRequestList, ReferenceResponse, SendChunk,
+    ServerInfo, SplitRequest, StorageTier, StoreStats, UdfChunk, UdfReference,
 };
 
 mod serialization;
@@ -35,6 +37,15 @@ use serialization::*;
 mod composite_plan;
 use composite_plan::*;
 
+mod persistence;
+
+mod query_cache;
+pub use query_cache::QueryCache;
+
+mod spill;
+use spill::SpillFile;
+pub use spill::SpillStore;
+
 mod visitable;
 
 pub mod access_control;
@@ -52,6 +63,10 @@ pub enum FetchStatus {
     Warning(String),
 }
 
+/// Key under which the query cache holds references to the results it caches, along with
+/// the sessions holding them (session keys are never empty).
+const CACHE_HOLDER: &[u8] = &[];
+
 /// This a DataFrame intended to be streamed to the client.
 /// It can be delayed when the data owner's approval is required.
 pub struct DelayedDataFrame {
@@ -66,6 +81,26 @@ pub struct DataFrameArtifact {
     fetchable: VerificationResult,
     blacklist: Vec<String>,
     query_details: String,
+    /// Whether the dataframe is a side table, private to the session that uploaded it.
+    #[serde(skip)]
+    ephemeral: bool,
+    /// Number of references held by each session (and by the query cache, see `CACHE_HOLDER`),
+    /// if the dataframe is session-scoped: it is dropped once they have all been released or
+    /// their sessions have ended. Side tables and the results of queries are session-scoped
+    /// until they are pinned or saved.
+    #[serde(skip)]
+    holders: Option<HashMap<Vec<u8>, usize>>,
+    /// File the dataframe is memory-mapped from, if it has been spilled to disk or loaded
+    /// from a saved dataframe.
+    #[serde(skip)]
+    spilled: Option<Arc<SpillFile>>,
+    /// Time of the last access to the data, according to the clock of the spill store.
+    #[serde(skip)]
+    last_access: u64,
+    /// Whether the data of a saved dataframe has not been loaded yet: `dataframe` is then
+    /// empty (with the schema of the data), and `spilled` refers to the file of the data.
+    #[serde(skip)]
+    unloaded: bool,
 }
 
 impl DataFrameArtifact {
@@ -79,6 +114,54 @@ impl DataFrameArtifact {
             },
             blacklist,
             query_details: String::from("uploaded dataframe"),
+            ephemeral: false,
+            holders: None,
+            spilled: None,
+            last_access: 0,
+            unloaded: false,
+        }
+    }
+
+    /// Scopes the dataframe to the session of the given key, which holds a reference to it.
+    pub fn with_session(mut self, session: Vec<u8>) -> Self {
+        self.holders = Some(HashMap::from([(session, 1)]));
+        self
+    }
+
+    /// Makes the dataframe a side table.
+    pub fn into_ephemeral(mut self) -> Self {
+        self.ephemeral = true;
+        self
+    }
+
+    /// Whether the session of the given key holds a reference to the dataframe.
+    fn is_held_by(&self, session: &[u8]) -> bool {
+        self.holders
+            .as_ref()
+            .map_or(false, |holders| holders.contains_key(session))
+    }
+
+    /// Adds `count` references held by a session, if the dataframe is session-scoped.
+    fn hold(&mut self, session: &[u8], count: usize) {
+        if let Some(holders) = &mut self.holders {
+            *holders.entry(session.to_vec()).or_insert(0) += count;
+        }
+    }
+
+    /// Removes (at most) `count` references held by a session. Returns whether the dataframe
+    /// is not held anymore.
+    fn release(&mut self, session: &[u8], count: usize) -> bool {
+        match &mut self.holders {
+            Some(holders) => {
+                if let Some(n) = holders.get_mut(session) {
+                    *n = n.saturating_sub(count);
+                    if *n == 0 {
+                        holders.remove(session);
+                    }
+                }
+                holders.is_empty()
+            }
+            None => false,
         }
     }
 
@@ -94,14 +177,41 @@ impl DataFrameArtifact {
             blacklist: self.blacklist.clone(),
             fetchable: self.fetchable.clone(),
             query_details: self.query_details.clone(),
+            ephemeral: false,
+            holders: None,
+            spilled: None,
+            last_access: 0,
+            unloaded: false,
         }
     }
 }
 
+/// An array, with the number of references held by each session: it is dropped once they
+/// have all been released or their sessions have ended.
+struct ArrayArtifact {
+    array: ArrayStore,
+    holders: HashMap<Vec<u8>, usize>,
+}
+
+/// Maximum number of udfs kept loaded: the least recently used ones are unloaded beyond it,
+/// clients upload them again when a query needs them.
+const UDF_CACHE_SIZE: usize = 256;
+
+struct CachedUdf {
+    module: Arc<Mutex<CModule>>,
+    last_use: Instant,
+}
+
 #[derive(Clone)]
 pub struct BastionLabPolars {
     dataframes: Arc<RwLock<HashMap<String, DataFrameArtifact>>>,
-    arrays: Arc<RwLock<HashMap<String, ArrayStore>>>,
+    arrays: Arc<RwLock<HashMap<String, ArrayArtifact>>>,
+    /// TorchScript udfs, keyed by the digest of their serialization.
+    udfs: Arc<RwLock<HashMap<String, CachedUdf>>>,
+    /// Results of the queries, reused by identical queries (disabled when None).
+    query_cache: Option<Arc<Mutex<QueryCache>>>,
+    /// Disk tier of the dataframe store (dataframes are only kept in memory when None).
+    spill: Option<Arc<SpillStore>>,
     sess_manager: Arc<SessionManager>,
 }
 
@@ -110,15 +220,29 @@ impl BastionLabPolars {
         Self {
             dataframes: Arc::new(RwLock::new(HashMap::new())),
             arrays: Arc::new(RwLock::new(HashMap::new())),
+            udfs: Arc::new(RwLock::new(HashMap::new())),
+            query_cache: None,
+            spill: None,
             sess_manager,
         }
     }
 
+    pub fn with_query_cache(mut self, cache: QueryCache) -> Self {
+        self.query_cache = Some(Arc::new(Mutex::new(cache)));
+        self
+    }
+
+    pub fn with_spill_store(mut self, store: SpillStore) -> Self {
+        self.spill = Some(Arc::new(store));
+        self
+    }
+
     fn get_df(
         &self,
         identifier: &str,
         client_info: Option<ClientInfo>,
     ) -> Result<DelayedDataFrame, Status> {
+        self.touch_df(identifier)?;
         let dfs = self.dataframes.read().unwrap();
         let artifact = dfs.get(identifier).ok_or_else(|| {
             Status::not_found(format!(
@@ -258,6 +382,7 @@ Reason: {}",
     }
 
     pub fn get_df_unchecked(&self, identifier: &str) -> Result<DataFrame, Status> {
+        self.touch_df(identifier)?;
         let dfs = self.dataframes.read().unwrap();
         Ok(dfs
             .get(identifier)
@@ -302,27 +427,324 @@ Reason: {}",
         )?)
     }
 
-    fn get_headers(&self) -> Result<Vec<(String, String)>, Status> {
+    fn get_headers(&self) -> Result<Vec<(String, String, StorageTier)>, Status> {
         let dataframes = self.dataframes.read().unwrap();
         let mut res = Vec::with_capacity(dataframes.len());
-        for (k, v) in dataframes.iter() {
+        // side tables are private to the session that uploaded them
+        for (k, v) in dataframes.iter().filter(|(_, v)| !v.ephemeral) {
             let header = get_df_header(&v.dataframe)?;
-            res.push((k.clone(), header));
+            let tier = match v.spilled {
+                Some(_) => StorageTier::Disk,
+                None => StorageTier::Memory,
+            };
+            res.push((k.clone(), header, tier));
         }
         Ok(res)
     }
 
-    pub fn insert_df(&self, df: DataFrameArtifact) -> String {
+    /// Runs the serialized composite plan of a query and stores the resulting dataframe,
+    /// scoped to the session of the given key.
+    fn run_composite_plan(
+        &self,
+        query: &Query,
+        user_id: &str,
+        session: &[u8],
+        client_info: ClientInfo,
+    ) -> Result<ReferenceResponse, Status> {
+        let composite_plan = CompositePlan::decode(query)?;
+
+        let cache_key = match &self.query_cache {
+            Some(_) => Some(QueryCache::key(&composite_plan, user_id)?),
+            None => None,
+        };
+        if let Some(res) = cache_key
+            .as_deref()
+            .and_then(|key| self.get_cached_query(key, session))
+        {
+            info!("Reused cached result {}", res.identifier);
+            return Ok(res);
+        }
+        let inputs = composite_plan.entry_points();
+
+        let start_time = Instant::now();
+
+        let mut res = composite_plan.run(self, user_id)?;
+        // TODO: this isn't really great.. this does a full serialization under the hood
+        let hash = hash_dataset(&mut res.dataframe)
+            .map_err(|e| Status::internal(format!("Polars error: {e}")))?;
+
+        let header = get_df_header(&res.dataframe)?;
+        let size = res.dataframe.estimated_size();
+        let identifier = self.insert_df(res.with_session(session.to_vec()));
+        if let Some(key) = cache_key {
+            self.cache_query(key, &identifier, &header, inputs, size);
+        }
+
+        let elapsed = start_time.elapsed();
+
+        telemetry::add_event(
+            TelemetryEventProps::RunQuery {
+                dataset_name: Some(identifier.clone()),
+                dataset_hash: Some(hash),
+                time_taken: elapsed.as_millis() as f64,
+            },
+            Some(client_info),
+        );
+
+        info!("Succesfully ran query on {}", identifier.clone());
+
+        Ok(ReferenceResponse {
+            identifier,
+            header,
+            ..Default::default()
+        })
+    }
+
+    /// Returns the reference of the cached result of a query, if it is still stored, and
+    /// makes the session hold it.
+    fn get_cached_query(&self, key: &str, session: &[u8]) -> Option<ReferenceResponse> {
+        let (identifier, header) = self.query_cache.as_ref()?.lock().unwrap().get(key)?;
+        self.dataframes
+            .write()
+            .unwrap()
+            .get_mut(&identifier)?
+            .hold(session, 1);
+        Some(ReferenceResponse {
+            identifier,
+            header,
+            ..Default::default()
+        })
+    }
+
+    /// Caches the result of a query, which the cache holds, and releases the results evicted
+    /// from the cache.
+    fn cache_query(
+        &self,
+        key: String,
+        identifier: &str,
+        header: &str,
+        inputs: Vec<String>,
+        size: usize,
+    ) {
+        let cache = match &self.query_cache {
+            Some(cache) => cache,
+            None => return,
+        };
         let mut dfs = self.dataframes.write().unwrap();
+        let mut cache = cache.lock().unwrap();
+        // unless it has already been released
+        if let Some(df) = dfs.get_mut(identifier) {
+            if cache.insert(
+                key,
+                identifier.to_string(),
+                header.to_string(),
+                inputs,
+                size,
+            ) {
+                df.hold(CACHE_HOLDER, 1);
+            }
+        }
+        let evicted = cache.evict();
+        Self::release_cached(&mut dfs, &mut cache, evicted);
+    }
+
+    /// Releases the references held by the query cache on the given results. The results
+    /// that are not held anymore are dropped, along with the cache entries reading from them.
+    /// Pinned and saved dataframes are never dropped. Returns the number of dropped dataframes.
+    fn release_cached(
+        dfs: &mut HashMap<String, DataFrameArtifact>,
+        cache: &mut QueryCache,
+        mut identifiers: Vec<String>,
+    ) -> usize {
+        let mut dropped = 0;
+        while let Some(identifier) = identifiers.pop() {
+            let unheld = dfs
+                .get_mut(&identifier)
+                .map_or(false, |df| df.release(CACHE_HOLDER, 1));
+            if unheld {
+                dfs.remove(&identifier);
+                dropped += 1;
+                identifiers.extend(cache.invalidate(&identifier));
+            }
+        }
+        dropped
+    }
+
+    pub fn insert_df(&self, mut df: DataFrameArtifact) -> String {
         let identifier = format!("{}", Uuid::new_v4());
-        dfs.insert(identifier.clone(), df);
+        if let Some(spill) = &self.spill {
+            df.last_access = spill.tick();
+        }
+        self.dataframes
+            .write()
+            .unwrap()
+            .insert(identifier.clone(), df);
+        self.spill_cold();
         identifier
     }
 
-    pub fn insert_array(&self, array: ArrayStore) -> String {
+    /// Records an access to the data of a dataframe, and reloads it in memory if it has been
+    /// spilled to disk (unless it does not fit in the memory budget by itself). The data of
+    /// saved dataframes is memory-mapped on their first access.
+    fn touch_df(&self, identifier: &str) -> Result<(), Status> {
+        if self.map_saved_df(identifier)? {
+            return Ok(());
+        }
+        let spill = match &self.spill {
+            Some(spill) => spill,
+            None => return Ok(()),
+        };
+        let file = {
+            let mut dfs = self.dataframes.write().unwrap();
+            // missing dataframes are reported by the callers
+            let df = match dfs.get_mut(identifier) {
+                Some(df) => df,
+                None => return Ok(()),
+            };
+            df.last_access = spill.tick();
+            match &df.spilled {
+                Some(file) if file.size() as usize <= spill.max_memory_bytes() => file.clone(),
+                _ => return Ok(()),
+            }
+        };
+
+        let dataframe = spill.reload(&file)?;
+        {
+            let mut dfs = self.dataframes.write().unwrap();
+            if let Some(df) = dfs.get_mut(identifier) {
+                // unless reloaded concurrently
+                if df.spilled.as_ref().map_or(false, |f| Arc::ptr_eq(f, &file)) {
+                    df.dataframe = dataframe;
+                    df.spilled = None;
+                }
+            }
+        }
+        self.spill_cold();
+        Ok(())
+    }
+
+    /// Loads the data of a saved dataframe registered by `load_dfs`, memory-mapped from its
+    /// IPC file. Returns false if it has already been loaded.
+    fn map_saved_df(&self, identifier: &str) -> Result<bool, Status> {
+        let file = match self.dataframes.read().unwrap().get(identifier) {
+            Some(DataFrameArtifact {
+                unloaded: true,
+                spilled: Some(file),
+                ..
+            }) => file.clone(),
+            _ => return Ok(false),
+        };
+        let dataframe = file
+            .map()
+            .map_err(|e| Status::internal(format!("Could not load dataframe: {e}")))?;
+
+        let mut dfs = self.dataframes.write().unwrap();
+        if let Some(df) = dfs.get_mut(identifier) {
+            // unless loaded concurrently
+            if df.unloaded {
+                df.dataframe = dataframe;
+                df.unloaded = false;
+                if let Some(spill) = &self.spill {
+                    df.last_access = spill.tick();
+                }
+            }
+        }
+        Ok(true)
+    }
+
+    /// Spills the least recently accessed dataframes to disk until the dataframes held in
+    /// memory fit in the budget of the spill store.
+    pub fn spill_cold(&self) {
+        let spill = match &self.spill {
+            Some(spill) => spill,
+            None => return,
+        };
+        let victims: Vec<(String, DataFrame)> = {
+            let dfs = self.dataframes.read().unwrap();
+            let mut in_memory: Vec<_> = dfs
+                .iter()
+                .filter(|(_, df)| df.spilled.is_none())
+                .map(|(identifier, df)| (df.last_access, df.dataframe.estimated_size(), identifier))
+                .collect();
+            let mut bytes: usize = in_memory.iter().map(|(_, size, _)| size).sum();
+            if bytes <= spill.max_memory_bytes() {
+                return;
+            }
+            in_memory.sort();
+            let mut victims = Vec::new();
+            for (_, size, identifier) in in_memory {
+                if bytes <= spill.max_memory_bytes() {
+                    break;
+                }
+                bytes -= size;
+                victims.push((identifier.clone(), dfs[identifier].dataframe.clone()));
+            }
+            victims
+        };
+
+        // the data is written without holding the lock: the dataframes stay readable
+        for (identifier, dataframe) in victims {
+            let (file, mapped) = match spill.spill(&identifier, dataframe) {
+                Ok(res) => res,
+                Err(e) => {
+                    error!("Could not spill dataframe {}: {}", identifier, e.message());
+                    continue;
+                }
+            };
+            let mut dfs = self.dataframes.write().unwrap();
+            // unless dropped or spilled concurrently (the file is then removed)
+            if let Some(df) = dfs.get_mut(&identifier) {
+                if df.spilled.is_none() {
+                    df.dataframe = mapped;
+                    df.spilled = Some(Arc::new(file));
+                }
+            }
+        }
+    }
+
+    /// Returns the storage tier of a dataframe.
+    fn get_tier(&self, identifier: &str) -> StorageTier {
+        let dfs = self.dataframes.read().unwrap();
+        match dfs.get(identifier).map(|df| df.spilled.is_some()) {
+            Some(true) => StorageTier::Disk,
+            _ => StorageTier::Memory,
+        }
+    }
+
+    fn store_stats(&self) -> StoreStats {
+        let mut stats = StoreStats::default();
+        for df in self.dataframes.read().unwrap().values() {
+            match &df.spilled {
+                Some(file) => {
+                    stats.disk_dataframes += 1;
+                    stats.disk_bytes += file.size();
+                }
+                None => {
+                    stats.memory_dataframes += 1;
+                    stats.memory_bytes += df.dataframe.estimated_size() as u64;
+                }
+            }
+        }
+        if let Some(spill) = &self.spill {
+            stats.max_memory_bytes = spill.max_memory_bytes() as u64;
+            let (spills, reloads) = spill.counters();
+            stats.spills = spills;
+            stats.reloads = reloads;
+        }
+        stats
+    }
+
+    /// Stores an array, held by the session of the given key.
+    pub fn insert_array(&self, array: ArrayStore, session: &[u8]) -> String {
         let mut arrays = self.arrays.write().unwrap();
         let identifier = format!("{}", Uuid::new_v4());
-        arrays.insert(identifier.clone(), array);
+        arrays.insert(
+            identifier.clone(),
+            ArrayArtifact {
+                array,
+                holders: HashMap::from([(session.to_vec(), 1)]),
+            },
+        );
         identifier
     }
 
@@ -330,76 +752,274 @@ Reason: {}",
         let arrays = self.arrays.read().unwrap();
         let arr = arrays
             .get(identifier)
-            .cloned()
+            .map(|artifact| artifact.array.clone())
             .ok_or(Status::invalid_argument(format!(
                 "Could not find Array: {identifier}"
             )))?;
         Ok(arr)
     }
 
-    fn persist_df(&self, identifier: &str) -> Result<(), Status> {
-        let dataframes = self
-            .dataframes
-            .read()
-            .map_err(|_| Status::internal("Unable to read dataframes!"))?;
+    /// Returns the key of the session of a request.
+    pub fn session_key<T>(&self, request: &Request<T>) -> Result<Vec<u8>, Status> {
+        let token = self.sess_manager.get_token(request)?;
+        Ok(self.sess_manager.get_session_key(&token))
+    }
 
-        let df_artifact = dataframes
-            .get(identifier)
-            .ok_or_else(|| Status::not_found("Unable to find dataframe!"))?;
+    /// Loads a serialized TorchScript module in the udf cache and returns its digest.
+    /// Modules already in the cache are not loaded again. Beyond `UDF_CACHE_SIZE` modules,
+    /// the least recently used one is unloaded.
+    pub fn insert_udf(&self, data: &[u8]) -> Result<String, Status> {
+        let digest = hex::encode(digest::digest(&digest::SHA256, data).as_ref());
+        if let Some(udf) = self.udfs.write().unwrap().get_mut(&digest) {
+            udf.last_use = Instant::now();
+            return Ok(digest);
+        }
+
+        let module = CModule::load_data(&mut Cursor::new(data)).map_err(|e| {
+            Status::invalid_argument(format!("Could not deserialize udf from bytes: {}", e))
+        })?;
+        let mut udfs = self.udfs.write().unwrap();
+        if udfs.len() >= UDF_CACHE_SIZE && !udfs.contains_key(&digest) {
+            // queries running it keep the module alive until they end
+            let lru = udfs
+                .iter()
+                .min_by_key(|(_, udf)| udf.last_use)
+                .map(|(digest, _)| digest.clone());
+            if let Some(lru) = lru {
+                udfs.remove(&lru);
+            }
+        }
+        udfs.insert(
+            digest.clone(),
+            CachedUdf {
+                module: Arc::new(Mutex::new(module)),
+                last_use: Instant::now(),
+            },
+        );
+        Ok(digest)
+    }
+
+    pub fn get_udf(&self, digest: &str) -> Result<Arc<Mutex<CModule>>, Status> {
+        let mut udfs = self.udfs.write().unwrap();
+        let udf = udfs
+            .get_mut(digest)
+            .ok_or_else(|| Status::not_found(format!("Could not find udf: digest={}", digest)))?;
+        udf.last_use = Instant::now();
+        Ok(udf.module.clone())
+    }
+
+    fn persist_df(&self, identifier: &str) -> Result<(), Status> {
+        // the data of a saved dataframe may not have been loaded yet
+        self.map_saved_df(identifier)?;
+        let df_artifact = {
+            let dataframes = self
+                .dataframes
+                .read()
+                .map_err(|_| Status::internal("Unable to read dataframes!"))?;
+            dataframes
+                .get(identifier)
+                .ok_or_else(|| Status::not_found("Unable to find dataframe!"))?
+                .clone()
+        };
 
         if df_artifact.policy.check_savable() != true {
             return Err(Status::unknown("Dataframe is not savable"));
         }
 
-        let error = create_dir("data_frames");
-        match error {
-            Ok(_) => {}
-            Err(err) => {
-                if err.kind() != ErrorKind::AlreadyExists {
-                    return Err(Status::unknown(err.kind().to_string()));
+        persistence::save(identifier, &df_artifact)
+            .map_err(|e| Status::internal(format!("Could not save dataframe: {e}")))?;
+
+        // saved dataframes outlive the sessions that hold them, and are not evicted
+        let mut dfs = self.dataframes.write().unwrap();
+        if let Some(df) = dfs.get_mut(identifier) {
+            df.holders = None;
+        }
+        if let Some(cache) = &self.query_cache {
+            cache.lock().unwrap().remove_result(identifier);
+        }
+        Ok(())
+    }
+
+    /// Loads the saved dataframes. Only their metadata and schema are read: their data is
+    /// memory-mapped on its first access (see `touch_df`). Dataframes saved by previous
+    /// versions are read in memory, and saved again in the current format.
+    pub fn load_dfs(&self) -> Result<(), Error> {
+        for (identifier, legacy) in persistence::list()? {
+            let res = if legacy {
+                persistence::migrate(&identifier)
+            } else {
+                persistence::register(&identifier)
+            };
+            match res {
+                Ok(df) => {
+                    self.dataframes.write().unwrap().insert(identifier, df);
                 }
+                Err(e) => error!("Could not load saved dataframe {}: {}", identifier, e),
             }
         }
+        // migrated dataframes are in memory
+        self.spill_cold();
+        Ok(())
+    }
 
-        let path = format!("data_frames/{}.json", identifier);
-        let df_store = OpenOptions::new()
-            .write(true)
-            .create(true)
-            .open(path)
-            .map_err(|_| Status::internal("Unable to find or create storage file!"))?;
+    pub fn delete_dfs(&self, identifier: &str) -> Result<(), Error> {
+        let mut dfs = self.dataframes.write().unwrap();
+        dfs.remove(identifier);
+        if let Some(cache) = &self.query_cache {
+            let mut cache = cache.lock().unwrap();
+            let invalidated = cache.invalidate(identifier);
+            Self::release_cached(&mut dfs, &mut cache, invalidated);
+        }
 
-        serde_json::to_writer(df_store, df_artifact)
-            .map_err(|_| Status::internal("Could not serialize dataframe artifact!"))?;
+        persistence::remove(identifier);
+        Ok(())
+    }
 
+    /// Whether the session of the given key holds a reference to the dataframe.
+    fn is_session_df(&self, identifier: &str, session: &[u8]) -> bool {
+        self.dataframes
+            .read()
+            .unwrap()
+            .get(identifier)
+            .map_or(false, |df| df.is_held_by(session))
+    }
+
+    /// Makes a session-scoped dataframe held by the session of the given key outlive the
+    /// sessions holding it.
+    fn pin_df(&self, identifier: &str, session: &[u8]) -> Result<(), Status> {
+        let mut dfs = self.dataframes.write().unwrap();
+        let df = dfs.get_mut(identifier).ok_or_else(|| {
+            Status::not_found(format!(
+                "Could not find dataframe: identifier={}",
+                identifier
+            ))
+        })?;
+        if df.holders.is_some() && !df.is_held_by(session) {
+            return Err(Status::permission_denied(
+                "Only the sessions holding a dataframe can pin it.",
+            ));
+        }
+        df.holders = None;
+        // pinned dataframes are not evicted
+        if let Some(cache) = &self.query_cache {
+            cache.lock().unwrap().remove_result(identifier);
+        }
         Ok(())
     }
 
-    pub fn load_dfs(&self) -> Result<(), Error> {
-        let files = read_dir("data_frames")?;
+    /// Releases references to session-scoped dataframes and arrays held by the session of the
+    /// given key (one per occurrence of an identifier). They are dropped once neither a session
+    /// nor the query cache holds them. Unknown identifiers, references the session does not
+    /// hold and dataframes that are not session-scoped are ignored. Returns the number of
+    /// dropped dataframes and arrays.
+    pub fn release_dfs(&self, identifiers: &[String], session: &[u8]) -> usize {
+        let mut counts: HashMap<&str, usize> = HashMap::new();
+        for identifier in identifiers {
+            *counts.entry(identifier.as_str()).or_insert(0) += 1;
+        }
+        self.release_references(counts, session)
+    }
 
-        for file in files {
-            let file = file?;
-            let identifier = file.file_name().to_str().unwrap().replace(".json", "");
+    /// Releases the given number of references held by a session, per identifier.
+    fn release_references(&self, counts: HashMap<&str, usize>, session: &[u8]) -> usize {
+        let mut dropped = Vec::new();
+        let mut dfs = self.dataframes.write().unwrap();
+        for (identifier, count) in counts.iter() {
+            let unheld = dfs
+                .get_mut(*identifier)
+                .map_or(false, |df| df.release(session, *count));
+            if unheld {
+                dfs.remove(*identifier);
+                dropped.push(*identifier);
+            }
+        }
+        let mut released = dropped.len();
+        if let Some(cache) = &self.query_cache {
+            let mut cache = cache.lock().unwrap();
+            let invalidated = dropped
+                .iter()
+                .flat_map(|identifier| cache.invalidate(identifier))
+                .collect();
+            released += Self::release_cached(&mut dfs, &mut cache, invalidated);
+        }
+        drop(dfs);
 
-            let file = std::fs::OpenOptions::new()
-                .read(true)
-                .open(file.path().to_str().unwrap())?;
-            let reader = std::io::BufReader::new(file);
-            let df: DataFrameArtifact = serde_json::from_reader(reader)?;
+        let mut arrays = self.arrays.write().unwrap();
+        for (identifier, count) in counts.iter() {
+            let unheld = match arrays.get_mut(*identifier) {
+                Some(artifact) => {
+                    if let Some(n) = artifact.holders.get_mut(session) {
+                        *n = n.saturating_sub(*count);
+                        if *n == 0 {
+                            artifact.holders.remove(session);
+                        }
+                    }
+                    artifact.holders.is_empty()
+                }
+                None => false,
+            };
+            if unheld {
+                arrays.remove(*identifier);
+                released += 1;
+            }
+        }
+        released
+    }
 
-            let mut dfs = self.dataframes.write().unwrap();
-            dfs.insert(identifier, df);
+    /// Makes the session of the given key hold references to session-scoped dataframes and
+    /// arrays (one per occurrence of an identifier).
+    pub fn hold_dfs(&self, identifiers: &[String], session: &[u8]) {
+        let mut dfs = self.dataframes.write().unwrap();
+        let mut arrays = self.arrays.write().unwrap();
+        for identifier in identifiers {
+            if let Some(df) = dfs.get_mut(identifier) {
+                df.hold(session, 1);
+            } else if let Some(artifact) = arrays.get_mut(identifier) {
+                *artifact.holders.entry(session.to_vec()).or_insert(0) += 1;
+            }
         }
-        Ok(())
     }
 
-    pub fn delete_dfs(&self, identifier: &str) -> Result<(), Error> {
+    /// Drops the session-scoped dataframes and the arrays whose sessions have all ended or
+    /// expired, and releases the cached query results that have expired.
+    pub fn reclaim_session_artifacts(&self) {
+        let is_alive = |session: &Vec<u8>| {
+            session == CACHE_HOLDER || self.sess_manager.is_session_alive(session)
+        };
         let mut dfs = self.dataframes.write().unwrap();
-        dfs.remove(identifier);
+        let ended: Vec<String> = dfs
+            .iter_mut()
+            .filter_map(|(identifier, df)| {
+                let holders = df.holders.as_mut()?;
+                holders.retain(|session, _| is_alive(session));
+                holders.is_empty().then(|| identifier.clone())
+            })
+            .collect();
+        for identifier in ended.iter() {
+            dfs.remove(identifier);
+        }
+        let mut reclaimed = ended.len();
+        if let Some(cache) = &self.query_cache {
+            let mut cache = cache.lock().unwrap();
+            let mut released: Vec<String> = ended
+                .iter()
+                .flat_map(|identifier| cache.invalidate(identifier))
+                .collect();
+            released.extend(cache.evict());
+            reclaimed += Self::release_cached(&mut dfs, &mut cache, released);
+        }
+        drop(dfs);
 
-        let path = "data_frames/".to_owned() + identifier + ".json";
-        std::fs::remove_file(path).unwrap_or(());
-        Ok(())
+        let mut arrays = self.arrays.write().unwrap();
+        let count = arrays.len();
+        arrays.retain(|_, artifact| {
+            artifact.holders.retain(|session, _| is_alive(session));
+            !artifact.holders.is_empty()
+        });
+        reclaimed += count - arrays.len();
+        if reclaimed > 0 {
+            info!("Reclaimed {} dataframes and arrays", reclaimed);
+        }
     }
 }
 
@@ -411,47 +1031,72 @@ fn get_df_header(df: &DataFrame) -> Result<String, Status> {
 #[tonic::async_trait]
 impl PolarsService for BastionLabPolars {
     type FetchDataFrameStream = ReceiverStream<Result<FetchChunk, Status>>;
+    type FetchDataFramesStream = ReceiverStream<Result<FetchChunk, Status>>;
 
     async fn run_query(
         &self,
         request: Request<Query>,
     ) -> Result<Response<ReferenceResponse>, Status> {
         let token = self.sess_manager.get_token(&request)?;
-
-        let composite_plan: CompositePlan = serde_json::from_str(&request.get_ref().composite_plan)
-            .map_err(|e| {
-                Status::invalid_argument(format!(
-                    "Could not deserialize composite plan: {}{}",
-                    e,
-                    &request.get_ref().composite_plan
-                ))
-            })?;
         let user_id = self.sess_manager.get_user_id(token.clone())?;
+        let session = self.sess_manager.get_session_key(&token);
+        let client_info = self.sess_manager.get_client_info(token)?;
 
-        let start_time = Instant::now();
-
-        let mut res = composite_plan.run(self, &user_id)?;
-        // TODO: this isn't really great.. this does a full serialization under the hood
-        let hash = hash_dataset(&mut res.dataframe)
-            .map_err(|e| Status::internal(format!("Polars error: {e}")))?;
-
-        let header = get_df_header(&res.dataframe)?;
-        let identifier = self.insert_df(res);
+        let res = self.run_composite_plan(request.get_ref(), &user_id, &session, client_info)?;
+        Ok(Response::new(res))
+    }
 
-        let elapsed = start_time.elapsed();
+    async fn run_queries(
+        &self,
+        request: Request<Queries>,
+    ) -> Result<Response<ReferenceList>, Status> {
+        let token = self.sess_manager.get_token(&request)?;
+        let user_id = self.sess_manager.get_user_id(token.clone())?;
+        let session = self.sess_manager.get_session_key(&token);
+        let client_info = self.sess_manager.get_client_info(token)?;
 
-        telemetry::add_event(
-            TelemetryEventProps::RunQuery {
-                dataset_name: Some(identifier.clone()),
-                dataset_hash: Some(hash),
-                time_taken: elapsed.as_millis() as f64,
-            },
-            Some(self.sess_manager.get_client_info(token)?),
-        );
+        // the plans are independent: run them concurrently
+        let tasks: Vec<_> = request
+            .into_inner()
+            .list
+            .into_iter()
+            .map(|query| {
+                let state = self.clone();
+                let user_id = user_id.clone();
+                let session = session.clone();
+                let client_info = client_info.clone();
+                tokio::task::spawn_blocking(move || {
+                    state.run_composite_plan(&query, &user_id, &session, client_info)
+                })
+            })
+            .collect();
 
-        info!("Succesfully ran query on {}", identifier.clone());
+        let mut list = Vec::with_capacity(tasks.len());
+        let mut error = None;
+        for (index, task) in tasks.into_iter().enumerate() {
+            let res = task
+                .await
+                .unwrap_or_else(|e| Err(Status::internal(format!("Query panicked: {e}"))));
+            match res {
+                Ok(reference) => list.push(reference),
+                Err(e) if error.is_none() => {
+                    error = Some(Status::new(
+                        e.code(),
+                        format!("Query {}: {}", index, e.message()),
+                    ))
+                }
+                Err(_) => (),
+            }
+        }
 
-        Ok(Response::new(ReferenceResponse { identifier, header }))
+        if let Some(error) = error {
+            // do not leave the results of the other queries behind (cached results may
+            // also be held by other sessions)
+            let identifiers: Vec<String> = list.into_iter().map(|r| r.identifier).collect();
+            self.release_dfs(&identifiers, &session);
+            return Err(error);
+        }
+        Ok(Response::new(ReferenceList { list }))
     }
 
     async fn send_data_frame(
@@ -461,8 +1106,14 @@ impl PolarsService for BastionLabPolars {
         let start_time = Instant::now();
 
         let token = self.sess_manager.get_token(&request)?;
+        let session = self.sess_manager.get_session_key(&token);
         let client_info = self.sess_manager.get_client_info(token)?;
-        let (df, hash) = unserialize_dataframe(request.into_inner()).await?;
+        let (df, hash, ephemeral) = unserialize_dataframe(request.into_inner()).await?;
+        let df = if ephemeral {
+            df.with_session(session).into_ephemeral()
+        } else {
+            df
+        };
         let header = get_df_header(&df.dataframe)?;
         let identifier = self.insert_df(df);
 
@@ -481,7 +1132,11 @@ impl PolarsService for BastionLabPolars {
             identifier.clone()
         );
 
-        Ok(Response::new(ReferenceResponse { identifier, header }))
+        Ok(Response::new(ReferenceResponse {
+            identifier,
+            header,
+            ..Default::default()
+        }))
     }
 
     async fn fetch_data_frame(
@@ -500,6 +1155,23 @@ impl PolarsService for BastionLabPolars {
         Ok(fut.await)
     }
 
+    async fn fetch_data_frames(
+        &self,
+        request: Request<ReferenceRequestList>,
+    ) -> Result<Response<Self::FetchDataFramesStream>, Status> {
+        let token = self.sess_manager.get_token(&request)?;
+        let client_info = self.sess_manager.get_client_info(token)?;
+
+        // the policy of each dataframe is checked individually
+        let dfs = request
+            .get_ref()
+            .list
+            .iter()
+            .map(|reference| self.get_df(&reference.identifier, Some(client_info.clone())))
+            .collect::<Result<Vec<_>, _>>()?;
+        Ok(serialize_delayed_dataframes(dfs).await)
+    }
+
     async fn list_data_frames(
         &self,
         request: Request<Empty>,
@@ -509,7 +1181,11 @@ impl PolarsService for BastionLabPolars {
         let list = self
             .get_headers()?
             .into_iter()
-            .map(|(identifier, header)| ReferenceResponse { identifier, header })
+            .map(|(identifier, header, tier)| ReferenceResponse {
+                identifier,
+                header,
+                tier: tier as i32,
+            })
             .collect();
         telemetry::add_event(
             TelemetryEventProps::ListDataFrame {},
@@ -526,13 +1202,18 @@ impl PolarsService for BastionLabPolars {
 
         let identifier = String::from(&request.get_ref().identifier);
         let header = self.get_header(&identifier)?;
+        let tier = self.get_tier(&identifier) as i32;
         telemetry::add_event(
             TelemetryEventProps::GetDataFrameHeader {
                 dataset_name: Some(identifier.clone()),
             },
             Some(self.sess_manager.get_client_info(token)?),
         );
-        Ok(Response::new(ReferenceResponse { identifier, header }))
+        Ok(Response::new(ReferenceResponse {
+            identifier,
+            header,
+            tier,
+        }))
     }
 
     async fn persist_data_frame(
@@ -560,11 +1241,17 @@ impl PolarsService for BastionLabPolars {
 
         let identifier = &request.get_ref().identifier;
         let user_id = self.sess_manager.get_user_id(token.clone())?;
-        let owner_check = self.sess_manager.verify_if_owner(&user_id)?;
-        if owner_check {
+        let session = self.sess_manager.get_session_key(&token);
+        if self.is_session_df(identifier, &session) {
+            // sessions can delete the session-scoped dataframes they hold, unless other
+            // sessions hold them too
+            self.release_references(HashMap::from([(identifier.as_str(), usize::MAX)]), &session);
+        } else if self.sess_manager.verify_if_owner(&user_id)? {
             self.delete_dfs(identifier)?;
         } else {
-            return Err(Status::internal("Only data owners can delete dataframes."));
+            return Err(Status::internal(
+                "Only data owners can delete dataframes (except session-scoped dataframes).",
+            ));
         }
         telemetry::add_event(
             TelemetryEventProps::DeleteDataframe {
@@ -574,10 +1261,113 @@ impl PolarsService for BastionLabPolars {
         );
         Ok(Response::new(Empty {}))
     }
+
+    async fn pin_data_frame(
+        &self,
+        request: Request<ReferenceRequest>,
+    ) -> Result<Response<Empty>, Status> {
+        let token = self.sess_manager.get_token(&request)?;
+
+        let identifier = &request.get_ref().identifier;
+        self.pin_df(identifier, &self.sess_manager.get_session_key(&token))?;
+        info!("Pinned dataframe {}", identifier);
+        Ok(Response::new(Empty {}))
+    }
+
+    async fn release_data_frames(
+        &self,
+        request: Request<ReferenceRequestList>,
+    ) -> Result<Response<Empty>, Status> {
+        let token = self.sess_manager.get_token(&request)?;
+
+        let identifiers: Vec<String> = request
+            .into_inner()
+            .list
+            .into_iter()
+            .map(|r| r.identifier)
+            .collect();
+        let dropped = self.release_dfs(&identifiers, &self.sess_manager.get_session_key(&token));
+        if dropped > 0 {
+            info!("Dropped {} released dataframes and arrays", dropped);
+        }
+        Ok(Response::new(Empty {}))
+    }
+
+    async fn hold_data_frames(
+        &self,
+        request: Request<ReferenceRequestList>,
+    ) -> Result<Response<Empty>, Status> {
+        let token = self.sess_manager.get_token(&request)?;
+
+        let identifiers: Vec<String> = request
+            .into_inner()
+            .list
+            .into_iter()
+            .map(|r| r.identifier)
+            .collect();
+        self.hold_dfs(&identifiers, &self.sess_manager.get_session_key(&token));
+        Ok(Response::new(Empty {}))
+    }
+
+    async fn send_udf(
+        &self,
+        request: Request<Streaming<UdfChunk>>,
+    ) -> Result<Response<UdfReference>, Status> {
+        self.sess_manager.get_token(&request)?;
+
+        let mut stream = request.into_inner();
+        let mut data = Vec::new();
+        while let Some(chunk) = stream.next().await {
+            data.append(&mut chunk?.data);
+        }
+
+        let state = self.clone();
+        let digest = tokio::task::spawn_blocking(move || state.insert_udf(&data))
+            .await
+            .map_err(|e| Status::internal(format!("Could not load udf: {e}")))??;
+
+        info!("Succesfully loaded udf {}", digest);
+
+        Ok(Response::new(UdfReference { digest }))
+    }
+
+    async fn get_server_info(
+        &self,
+        _request: Request<Empty>,
+    ) -> Result<Response<ServerInfo>, Status> {
+        Ok(Response::new(ServerInfo {
+            version: env!("CARGO_PKG_VERSION").to_string(),
+            plan_encodings: PLAN_ENCODINGS.iter().map(|e| *e as i32).collect(),
+        }))
+    }
+
+    async fn get_cache_stats(
+        &self,
+        request: Request<Empty>,
+    ) -> Result<Response<QueryCacheStats>, Status> {
+        self.sess_manager.get_token(&request)?;
+
+        let stats = match &self.query_cache {
+            Some(cache) => cache.lock().unwrap().stats(),
+            None => QueryCacheStats::default(),
+        };
+        Ok(Response::new(stats))
+    }
+
+    async fn get_store_stats(
+        &self,
+        request: Request<Empty>,
+    ) -> Result<Response<StoreStats>, Status> {
+        self.sess_manager.get_token(&request)?;
+
+        Ok(Response::new(self.store_stats()))
+    }
+
     async fn split(
         &self,
         request: Request<SplitRequest>,
     ) -> Result<Response<ReferenceList>, Status> {
+        let session = self.session_key(&request)?;
         #[allow(unused)]
         let (arrays, train_size, test_size, shuffle, random_state) = (
             &request.get_ref().arrays,
@@ -631,12 +1421,14 @@ impl PolarsService for BastionLabPolars {
             let (upper, lower) = array.split((train_size, test_size));
             out_arrays.append(&mut vec![
                 ReferenceResponse {
-                    identifier: self.insert_array(upper),
+                    identifier: self.insert_array(upper, &session),
                     header: String::default(),
+                    ..Default::default()
                 },
                 ReferenceResponse {
-                    identifier: self.insert_array(lower),
+                    identifier: self.insert_array(lower, &session),
                     header: String::default(),
+                    ..Default::default()
                 },
             ])
         }
@@ -0,0 +1,155 @@
+use polars::prelude::*;
+use serde::{Deserialize, Serialize};
+use std::ffi::OsString;
+use std::fs::{self, File};
+use std::io::{BufReader, BufWriter, Error, ErrorKind, Write};
+use std::path::{Path, PathBuf};
+use std::sync::Arc;
+
+use crate::{
+    access_control::{Policy, VerificationResult},
+    spill::SpillFile,
+    DataFrameArtifact,
+};
+
+/// Directory of the saved dataframes.
+///
+/// Each dataframe is saved as two files: `{identifier}.arrow`, an Arrow IPC file holding its
+/// data, and `{identifier}.meta.json`, holding the rest of the artifact. Previous versions
+/// saved the whole artifact in `{identifier}.json`: these files are migrated when loaded.
+pub const DATA_FRAMES_DIRECTORY: &str = "data_frames";
+
+/// A saved dataframe artifact, without its data.
+#[derive(Serialize, Deserialize)]
+struct ArtifactMetadata {
+    policy: Policy,
+    fetchable: VerificationResult,
+    blacklist: Vec<String>,
+    query_details: String,
+}
+
+fn data_path(identifier: &str) -> PathBuf {
+    Path::new(DATA_FRAMES_DIRECTORY).join(format!("{}.arrow", identifier))
+}
+
+fn metadata_path(identifier: &str) -> PathBuf {
+    Path::new(DATA_FRAMES_DIRECTORY).join(format!("{}.meta.json", identifier))
+}
+
+fn legacy_path(identifier: &str) -> PathBuf {
+    Path::new(DATA_FRAMES_DIRECTORY).join(format!("{}.json", identifier))
+}
+
+fn to_io_error(e: PolarsError) -> Error {
+    Error::new(ErrorKind::Other, e.to_string())
+}
+
+/// Writes a file through a temporary file renamed once complete: the previous version of the
+/// file stays valid while it is written, and after that for the dataframes mapped from it.
+fn write_file(path: &Path, write: impl FnOnce(File) -> Result<(), Error>) -> Result<(), Error> {
+    let mut tmp = OsString::from(path);
+    tmp.push(".tmp");
+    write(File::create(&tmp)?)?;
+    fs::rename(&tmp, path)
+}
+
+/// Saves a dataframe artifact.
+pub fn save(identifier: &str, artifact: &DataFrameArtifact) -> Result<(), Error> {
+    fs::create_dir_all(DATA_FRAMES_DIRECTORY)?;
+    let mut df = artifact.dataframe.clone();
+    // a single record batch can be mapped without copies
+    df.rechunk();
+    write_file(&data_path(identifier), |file| {
+        IpcWriter::new(file).finish(&mut df).map_err(to_io_error)
+    })?;
+
+    let metadata = ArtifactMetadata {
+        policy: artifact.policy.clone(),
+        fetchable: artifact.fetchable.clone(),
+        blacklist: artifact.blacklist.clone(),
+        query_details: artifact.query_details.clone(),
+    };
+    // written last: the dataframe is only loaded once both files are complete
+    write_file(&metadata_path(identifier), |file| {
+        let mut writer = BufWriter::new(file);
+        serde_json::to_writer(&mut writer, &metadata)?;
+        writer.flush()
+    })?;
+    fs::remove_file(legacy_path(identifier)).unwrap_or(());
+    Ok(())
+}
+
+/// Returns the identifiers of the saved dataframes, and whether they are saved in the legacy
+/// format.
+pub fn list() -> Result<Vec<(String, bool)>, Error> {
+    let mut res = Vec::new();
+    for entry in fs::read_dir(DATA_FRAMES_DIRECTORY)? {
+        let name = entry?.file_name();
+        // other entries are IPC files, temporary files and the directory of the spill store
+        match name.to_str() {
+            Some(name) if name.ends_with(".meta.json") => {
+                res.push((name.trim_end_matches(".meta.json").to_owned(), false))
+            }
+            Some(name) if name.ends_with(".json") => {
+                let identifier = name.trim_end_matches(".json");
+                // unless its migration was interrupted after the new files were written
+                if !metadata_path(identifier).exists() {
+                    res.push((identifier.to_owned(), true));
+                }
+            }
+            _ => (),
+        }
+    }
+    Ok(res)
+}
+
+/// Loads a saved dataframe artifact without reading its data: the schema of the dataframe is
+/// read from the footer of its IPC file, the returned artifact holds an empty dataframe with
+/// this schema, and the data is mapped on its first access (see `BastionLabPolars::touch_df`).
+pub fn register(identifier: &str) -> Result<DataFrameArtifact, Error> {
+    let metadata: ArtifactMetadata =
+        serde_json::from_reader(BufReader::new(File::open(metadata_path(identifier))?))?;
+
+    let path = data_path(identifier);
+    let schema = IpcReader::new(File::open(&path)?)
+        .schema()
+        .map_err(to_io_error)?;
+    let columns = schema
+        .iter()
+        .map(|(name, dtype)| Series::new_empty(name, dtype))
+        .collect();
+    let dataframe = DataFrame::new(columns).map_err(to_io_error)?;
+
+    Ok(DataFrameArtifact {
+        dataframe,
+        policy: metadata.policy,
+        fetchable: metadata.fetchable,
+        blacklist: metadata.blacklist,
+        query_details: metadata.query_details,
+        ephemeral: false,
+        holders: None,
+        spilled: Some(Arc::new(SpillFile::saved(path)?)),
+        last_access: 0,
+        unloaded: true,
+    })
+}
+
+/// Loads a dataframe artifact saved in the legacy format, and saves it again in the current
+/// format. The whole dataframe is read in memory.
+pub fn migrate(identifier: &str) -> Result<DataFrameArtifact, Error> {
+    let artifact: DataFrameArtifact =
+        serde_json::from_reader(BufReader::new(File::open(legacy_path(identifier))?))?;
+    save(identifier, &artifact)?;
+    Ok(artifact)
+}
+
+/// Removes the files of a saved dataframe.
+pub fn remove(identifier: &str) {
+    for path in [
+        data_path(identifier),
+        metadata_path(identifier),
+        legacy_path(identifier),
+    ] {
+        fs::remove_file(path).unwrap_or(());
+    }
+}
@@ -0,0 +1,188 @@
+use ring::digest;
+use std::collections::HashMap;
+use std::time::{Duration, Instant};
+use tonic::Status;
+
+use crate::{composite_plan::CompositePlan, polars_proto::QueryCacheStats};
+
+struct CacheEntry {
+    identifier: String,
+    header: String,
+    /// Identifiers of the data frames the plan reads from.
+    inputs: Vec<String>,
+    size: usize,
+    created: Instant,
+    last_access: Instant,
+}
+
+/// Cache of the results of composite plans, shared by all sessions.
+///
+/// Results are keyed by a hash of the (decoded) plan, which includes the identifiers of its
+/// input data frames, and of the user running it, as policies may depend on the user.
+/// When the estimated size of the results exceeds the budget, the least recently used
+/// results are evicted. The cache holds a reference to the results it caches: the caller
+/// must release it for the results it evicts or forgets (see [`QueryCache::evict`]).
+pub struct QueryCache {
+    max_bytes: usize,
+    ttl: Option<Duration>,
+    entries: HashMap<String, CacheEntry>,
+    bytes: usize,
+    hits: u64,
+    misses: u64,
+    evictions: u64,
+}
+
+impl QueryCache {
+    pub fn new(max_bytes: usize, ttl: Option<Duration>) -> Self {
+        QueryCache {
+            max_bytes,
+            ttl,
+            entries: HashMap::new(),
+            bytes: 0,
+            hits: 0,
+            misses: 0,
+            evictions: 0,
+        }
+    }
+
+    /// Returns the cache key of a plan run by the given user. It does not depend on the
+    /// encoding the plan was sent in.
+    pub fn key(plan: &CompositePlan, user_id: &str) -> Result<String, Status> {
+        let mut ctx = digest::Context::new(&digest::SHA256);
+        ctx.update(&serde_json::to_vec(plan).map_err(|e| {
+            Status::invalid_argument(format!("Could not parse composite plan: {e}"))
+        })?);
+        ctx.update(user_id.as_bytes());
+        Ok(hex::encode(ctx.finish().as_ref()))
+    }
+
+    fn is_expired(&self, entry: &CacheEntry) -> bool {
+        self.ttl.map_or(false, |ttl| entry.created.elapsed() > ttl)
+    }
+
+    /// Returns the identifier and header of the cached result of a plan.
+    pub fn get(&mut self, key: &str) -> Option<(String, String)> {
+        let res = match self.entries.get(key) {
+            Some(entry) if !self.is_expired(entry) => {
+                Some((entry.identifier.clone(), entry.header.clone()))
+            }
+            _ => None,
+        };
+        match res {
+            Some(_) => {
+                self.hits += 1;
+                self.entries.get_mut(key).unwrap().last_access = Instant::now();
+            }
+            None => self.misses += 1,
+        }
+        res
+    }
+
+    /// Records the result of a plan. Returns whether it is cached: results larger than the
+    /// budget are not, nor are the results of plans already cached by a concurrent run.
+    pub fn insert(
+        &mut self,
+        key: String,
+        identifier: String,
+        header: String,
+        inputs: Vec<String>,
+        size: usize,
+    ) -> bool {
+        if size > self.max_bytes || self.entries.contains_key(&key) {
+            return false;
+        }
+        let now = Instant::now();
+        self.entries.insert(
+            key,
+            CacheEntry {
+                identifier,
+                header,
+                inputs,
+                size,
+                created: now,
+                last_access: now,
+            },
+        );
+        self.bytes += size;
+        true
+    }
+
+    /// Removes the expired entries and the least recently used entries exceeding the budget.
+    /// Returns the identifiers of their results.
+    pub fn evict(&mut self) -> Vec<String> {
+        let mut evicted: Vec<String> = self
+            .entries
+            .iter()
+            .filter(|(_, entry)| self.is_expired(entry))
+            .map(|(key, _)| key.clone())
+            .collect();
+        for key in evicted.iter() {
+            self.bytes -= self.entries[key].size;
+        }
+        let mut bytes = self.bytes;
+        if bytes > self.max_bytes {
+            let mut lru: Vec<_> = self
+                .entries
+                .iter()
+                .filter(|(key, _)| !evicted.contains(*key))
+                .map(|(key, entry)| (entry.last_access, entry.size, key.clone()))
+                .collect();
+            lru.sort();
+            for (_, size, key) in lru {
+                if bytes <= self.max_bytes {
+                    break;
+                }
+                bytes -= size;
+                evicted.push(key);
+            }
+        }
+        self.bytes = bytes;
+        self.evictions += evicted.len() as u64;
+        evicted
+            .iter()
+            .map(|key| self.entries.remove(key).unwrap().identifier)
+            .collect()
+    }
+
+    /// Forgets the entries whose plan reads from or produced the given data frame. Returns
+    /// the identifiers of their results.
+    pub fn invalidate(&mut self, identifier: &str) -> Vec<String> {
+        self.forget(|entry| {
+            entry.identifier == identifier || entry.inputs.iter().any(|i| i == identifier)
+        })
+    }
+
+    /// Forgets the entry whose result is the given data frame, e.g. once it is pinned or saved.
+    /// Returns whether there was one.
+    pub fn remove_result(&mut self, identifier: &str) -> bool {
+        !self
+            .forget(|entry| entry.identifier == identifier)
+            .is_empty()
+    }
+
+    fn forget(&mut self, mut f: impl FnMut(&CacheEntry) -> bool) -> Vec<String> {
+        let mut bytes = self.bytes;
+        let mut forgotten = Vec::new();
+        self.entries.retain(|_, entry| {
+            if !f(entry) {
+                return true;
+            }
+            bytes -= entry.size;
+            forgotten.push(entry.identifier.clone());
+            false
+        });
+        self.bytes = bytes;
+        forgotten
+    }
+
+    pub fn stats(&self) -> QueryCacheStats {
+        QueryCacheStats {
+            hits: self.hits,
+            misses: self.misses,
+            entries: self.entries.len() as u64,
+            bytes: self.bytes as u64,
+            max_bytes: self.max_bytes as u64,
+            evictions: self.evictions,
+        }
+    }
+}
@@ -1,26 +1,35 @@
 use super::polars_proto::{fetch_chunk, FetchChunk, SendChunk};
 use crate::prelude::*;
 use crate::{DataFrameArtifact, DelayedDataFrame, FetchStatus};
+use bastionlab_common::chunking::ChunkSizer;
+use polars::export::arrow::io::ipc::write::{StreamWriter, WriteOptions};
 use polars::prelude::*;
 use ring::digest;
+use std::io::Write;
 use tokio::sync::mpsc;
 use tokio_stream::{wrappers::ReceiverStream, StreamExt};
 use tonic::{Response, Status};
 
-const CHUNK_SIZE: usize = 32 * 1024;
+/// Target size of the record batches of fetched dataframes. Clients decode the stream
+/// batch per batch, so this bounds how much has to be received before a batch is usable.
+const RECORD_BATCH_SIZE: usize = 4 * 1024 * 1024;
 
-// TODO PERF: Do a PR on polars/pypolars to add the streaming IPC (apache flight) format to the python interface
-// right now, there is only the file format which requires random access
-// which means, we have to do a full copy to a buffer and we cannot parse it as we go
-// also: polar's IpcStreamReader requires the underlying stream to be Seek; which is weird & does not make sense
+/// Magic bytes at the start of an Arrow IPC file. Clients used to upload dataframes in the
+/// file format, newer clients use the streaming format, which does not start with it.
+const ARROW_FILE_MAGIC: &[u8] = b"ARROW1";
 
+// note: polar's IpcStreamReader requires the underlying stream to be Seek; which is weird & does not make sense
+// so we still need to buffer the whole upload before parsing it
+
+/// Reads a dataframe sent in chunks, returning it along with its hash and whether it is ephemeral.
 pub async fn unserialize_dataframe(
     mut stream: tonic::Streaming<SendChunk>,
-) -> Result<(DataFrameArtifact, String), Status> {
+) -> Result<(DataFrameArtifact, String, bool), Status> {
     let mut buf: Vec<u8> = Vec::new();
     let mut first = true;
     let mut policy = String::new();
     let mut sanitized_columns = Vec::new();
+    let mut ephemeral = false;
 
     let mut hasher = digest::Context::new(&digest::SHA256);
 
@@ -31,6 +40,7 @@ pub async fn unserialize_dataframe(
         if first {
             policy = chunk.policy;
             sanitized_columns = chunk.sanitized_columns;
+            ephemeral = chunk.ephemeral;
             first = false;
         }
     }
@@ -42,11 +52,18 @@ pub async fn unserialize_dataframe(
     })?;
 
     let view = std::io::Cursor::new(&buf);
-    let df = polars::io::ipc::IpcReader::new(view)
-        .finish()
-        .map_err(|err| Status::invalid_argument(format!("Polars error: {err}")))?;
+    let df = if buf.starts_with(ARROW_FILE_MAGIC) {
+        polars::io::ipc::IpcReader::new(view).finish()
+    } else {
+        polars::io::ipc::IpcStreamReader::new(view).finish()
+    }
+    .map_err(|err| Status::invalid_argument(format!("Polars error: {err}")))?;
 
-    Ok((DataFrameArtifact::new(df, policy, sanitized_columns), hash))
+    Ok((
+        DataFrameArtifact::new(df, policy, sanitized_columns),
+        hash,
+        ephemeral,
+    ))
 }
 
 // so, to hash a dataset, this does a full serialization; that's kinda bad
@@ -66,62 +83,183 @@ fn dataframe_ser_helper(df: &mut DataFrame) -> Result<Vec<u8>, PolarsError> {
     Ok(buf)
 }
 
-pub async fn serialize_delayed_dataframe(
-    df: DelayedDataFrame,
-) -> Response<ReceiverStream<Result<FetchChunk, Status>>> {
-    let (tx, rx) = mpsc::channel(4);
+/// Writes `df` to `writer` using the Arrow IPC streaming format, cutting it in record batches
+/// of about `RECORD_BATCH_SIZE` bytes so that the receiving end can decode it as it arrives.
+fn write_dataframe_stream<W: Write>(df: &mut DataFrame, writer: W) -> Result<(), PolarsError> {
+    df.rechunk();
+
+    let height = df.height();
+    let row_size = (df.estimated_size() / height.max(1)).max(1);
+    let batch_rows = (RECORD_BATCH_SIZE / row_size).max(1);
 
-    match df.fetch_status {
-        FetchStatus::Pending(reason) => tx
-            .send(Ok(FetchChunk {
-                body: Some(fetch_chunk::Body::Pending(reason)),
-            }))
-            .await
-            .unwrap(),
-        FetchStatus::Warning(reason) => tx
-            .send(Ok(FetchChunk {
-                body: Some(fetch_chunk::Body::Warning(reason)),
-            }))
-            .await
-            .unwrap(),
-        _ => (),
+    let mut stream_writer = StreamWriter::new(writer, WriteOptions { compression: None });
+    stream_writer.start(&df.schema().to_arrow(), None)?;
+    for offset in (0..height).step_by(batch_rows) {
+        // slicing is zero-copy
+        let slice = df.slice(offset as i64, batch_rows);
+        for batch in slice.iter_chunks() {
+            stream_writer.write(&batch, None)?;
+        }
     }
+    stream_writer.finish()?;
 
-    tokio::spawn(async move {
-        // important things to note about tokio channels:
-        // - send() on them will block until there is space in the queue
-        // - send() returns an error when the receiver has been dropped / .close() has been called on it
-        //   this means that send() will return Err only when the client has "lost interest", has dropped the connection / call
-
-        let mut df: DataFrame = match df.future.await {
-            Ok(df) => df,
-            Err(e) => {
-                // ignore send() error: error means the channel has been closed, ie, client dropped the request.
-                let _ignored = tx.send(Err(e)).await;
-                return;
-            }
-        };
+    Ok(())
+}
+
+fn new_fetch_chunk(index: u32, body: fetch_chunk::Body) -> FetchChunk {
+    FetchChunk {
+        body: Some(body),
+        index,
+    }
+}
+
+/// [`Write`] adapter that cuts the bytes written to it into `FetchChunk`s, whose size is
+/// chosen by a [`ChunkSizer`], and sends them through a channel.
+///
+/// Sending blocks when the channel is full: it must be used from a blocking task.
+struct FetchChunkSender {
+    index: u32,
+    buf: Vec<u8>,
+    tx: mpsc::Sender<Result<FetchChunk, Status>>,
+    sizer: ChunkSizer,
+}
+
+impl FetchChunkSender {
+    fn new(index: u32, tx: mpsc::Sender<Result<FetchChunk, Status>>, sizer: ChunkSizer) -> Self {
+        FetchChunkSender {
+            index,
+            buf: Vec::with_capacity(sizer.size()),
+            tx,
+            sizer,
+        }
+    }
+
+    fn send_buf(&mut self) -> std::io::Result<()> {
+        if self.buf.is_empty() {
+            return Ok(());
+        }
+        let len = self.buf.len();
+        let data = std::mem::replace(&mut self.buf, Vec::new());
+        let (index, tx) = (self.index, &self.tx);
+        self.sizer
+            .timed(len, || {
+                tx.blocking_send(Ok(new_fetch_chunk(index, fetch_chunk::Body::Data(data))))
+            })
+            // send() returns an error only when the client has dropped the call
+            .map_err(|_| {
+                std::io::Error::new(std::io::ErrorKind::BrokenPipe, "Client dropped the stream")
+            })?;
+        self.buf.reserve(self.sizer.size());
+        Ok(())
+    }
+}
 
-        let res = dataframe_ser_helper(&mut df)
-            .map_err(|err| Status::internal(format!("Polars error: {err}"))); // this is an internal error
+impl Write for FetchChunkSender {
+    fn write(&mut self, data: &[u8]) -> std::io::Result<usize> {
+        let size = self.sizer.size();
+        let n = data.len().min(size.saturating_sub(self.buf.len()));
+        self.buf.extend_from_slice(&data[..n]);
+        if self.buf.len() >= size {
+            self.send_buf()?;
+        }
+        Ok(n)
+    }
 
-        let buf = match res {
-            Ok(buf) => buf,
+    fn flush(&mut self) -> std::io::Result<()> {
+        self.send_buf()
+    }
+}
+
+/// Sends the fetch status and then the data of `df` through `tx`, in `FetchChunk`s tagged with `index`.
+///
+/// When `reject_inline` is set, a denied fetch is reported with a `Rejected` chunk instead of
+/// ending the stream with an error, so that the other dataframes of the stream can still be sent.
+/// Returns `false` when the stream has to end: an error has been sent or the client dropped the call.
+async fn send_delayed_dataframe(
+    index: u32,
+    df: DelayedDataFrame,
+    tx: &mpsc::Sender<Result<FetchChunk, Status>>,
+    reject_inline: bool,
+) -> bool {
+    // important things to note about tokio channels:
+    // - send() on them will block until there is space in the queue
+    // - send() returns an error when the receiver has been dropped / .close() has been called on it
+    //   this means that send() will return Err only when the client has "lost interest", has dropped the connection / call
+
+    let status = match df.fetch_status {
+        FetchStatus::Pending(reason) => Some(fetch_chunk::Body::Pending(reason)),
+        FetchStatus::Warning(reason) => Some(fetch_chunk::Body::Warning(reason)),
+        FetchStatus::Ok => None,
+    };
+    if let Some(body) = status {
+        if tx.send(Ok(new_fetch_chunk(index, body))).await.is_err() {
+            return false;
+        }
+    }
+
+    let mut df: DataFrame = match df.future.await {
+        Ok(df) => df,
+        Err(e) if reject_inline && e.code() == tonic::Code::PermissionDenied => {
+            let body = fetch_chunk::Body::Rejected(String::from(e.message()));
+            return tx.send(Ok(new_fetch_chunk(index, body))).await.is_ok();
+        }
+        Err(e) => {
+            // ignore send() error: error means the channel has been closed, ie, client dropped the request.
+            let _ignored = tx.send(Err(e)).await;
+            return false;
+        }
+    };
+
+    // the dataframe is serialized as it is sent, record batch per record batch:
+    // there is no intermediate buffer holding the whole serialized dataframe
+    let tx = tx.clone();
+    tokio::task::spawn_blocking(move || {
+        let mut sender = FetchChunkSender::new(index, tx.clone(), ChunkSizer::default());
+        let res = write_dataframe_stream(&mut df, &mut sender)
+            .and_then(|_| sender.flush().map_err(PolarsError::from));
+        match res {
+            Ok(()) => {
+                info!("DataFrame fetched successfully: {}", sender.sizer.stats());
+                true
+            }
             Err(err) => {
-                // ignore send() error
-                let _ignored = tx.send(Err(err)).await;
-                return;
+                // this is an internal error
+                // a send() error means that the client isnt listening anymore and this one will be ignored too
+                let _ignored =
+                    tx.blocking_send(Err(Status::internal(format!("Polars error: {err}"))));
+                false
             }
-        };
+        }
+    })
+    .await
+    .unwrap_or(false)
+}
 
-        for chunk in buf.chunks(CHUNK_SIZE) {
-            let data = FetchChunk {
-                body: Some(fetch_chunk::Body::Data(chunk.into())),
-            };
+pub async fn serialize_delayed_dataframe(
+    df: DelayedDataFrame,
+) -> Response<ReceiverStream<Result<FetchChunk, Status>>> {
+    let (tx, rx) = mpsc::channel(4);
 
-            if let Err(_ignored) = tx.send(Ok(data)).await {
-                // we have a send() error, meaning client isnt listening anymore
-                // stop the task when this is the case
+    tokio::spawn(async move {
+        send_delayed_dataframe(0, df, &tx, false).await;
+    });
+
+    Response::new(ReceiverStream::new(rx))
+}
+
+/// Streams several dataframes one after the other in a single stream of `FetchChunk`s,
+/// each chunk carrying the position of its dataframe in `dfs`.
+///
+/// Each dataframe goes through its own fetch status: a denied fetch is reported for its
+/// dataframe only, and pending approvals are awaited in order.
+pub async fn serialize_delayed_dataframes(
+    dfs: Vec<DelayedDataFrame>,
+) -> Response<ReceiverStream<Result<FetchChunk, Status>>> {
+    let (tx, rx) = mpsc::channel(4);
+
+    tokio::spawn(async move {
+        for (index, df) in dfs.into_iter().enumerate() {
+            if !send_delayed_dataframe(index as u32, df, &tx, true).await {
                 return;
             }
         }
@@ -0,0 +1,142 @@
+use polars::prelude::*;
+use std::fs::{self, File};
+use std::io::ErrorKind;
+use std::path::PathBuf;
+use std::sync::atomic::{AtomicU64, Ordering};
+use tonic::Status;
+
+/// An Arrow IPC file holding the data of a dataframe on the disk tier. Spill files are
+/// removed once the dataframe is dropped or reloaded in memory (dataframes memory-mapped
+/// from them remain valid after that), the files of saved dataframes are kept.
+#[derive(Debug)]
+pub struct SpillFile {
+    path: PathBuf,
+    size: u64,
+    owned: bool,
+}
+
+impl SpillFile {
+    /// Refers to the IPC file of a saved dataframe.
+    pub fn saved(path: PathBuf) -> std::io::Result<Self> {
+        let size = fs::metadata(&path)?.len();
+        Ok(SpillFile {
+            path,
+            size,
+            owned: false,
+        })
+    }
+
+    pub fn size(&self) -> u64 {
+        self.size
+    }
+
+    /// Returns the dataframe memory-mapped from the file.
+    pub fn map(&self) -> PolarsResult<DataFrame> {
+        IpcReader::new(File::open(&self.path)?)
+            .memory_mapped(true)
+            .set_rechunk(false)
+            .finish()
+    }
+}
+
+impl Drop for SpillFile {
+    fn drop(&mut self) {
+        if self.owned {
+            fs::remove_file(&self.path).unwrap_or(());
+        }
+    }
+}
+
+/// Disk tier of the dataframe store.
+///
+/// When the dataframes held in memory exceed the budget, the least recently accessed ones
+/// are written to Arrow IPC files and replaced by dataframes memory-mapped from these files:
+/// they stay readable, the OS loading their pages when needed. They are reloaded in memory
+/// on their next access (see `BastionLabPolars::touch_df`).
+pub struct SpillStore {
+    directory: PathBuf,
+    max_memory_bytes: usize,
+    /// Access clock: dataframes record the time of their last access.
+    clock: AtomicU64,
+    spills: AtomicU64,
+    reloads: AtomicU64,
+}
+
+impl SpillStore {
+    /// Creates the store in `directory`. The files spilled by a previous run are removed.
+    pub fn new(directory: impl Into<PathBuf>, max_memory_bytes: usize) -> std::io::Result<Self> {
+        let directory = directory.into();
+        match fs::remove_dir_all(&directory) {
+            Err(e) if e.kind() != ErrorKind::NotFound => return Err(e),
+            _ => (),
+        }
+        fs::create_dir_all(&directory)?;
+        Ok(SpillStore {
+            directory,
+            max_memory_bytes,
+            clock: AtomicU64::new(0),
+            spills: AtomicU64::new(0),
+            reloads: AtomicU64::new(0),
+        })
+    }
+
+    pub fn max_memory_bytes(&self) -> usize {
+        self.max_memory_bytes
+    }
+
+    /// Advances the access clock and returns its new time.
+    pub fn tick(&self) -> u64 {
+        self.clock.fetch_add(1, Ordering::Relaxed) + 1
+    }
+
+    /// Writes a dataframe to a new spill file, and returns the dataframe memory-mapped from it.
+    pub fn spill(
+        &self,
+        identifier: &str,
+        mut df: DataFrame,
+    ) -> Result<(SpillFile, DataFrame), Status> {
+        let to_status =
+            |e: &dyn std::fmt::Display| Status::internal(format!("Could not spill dataframe: {e}"));
+
+        // a new file each time: a previous file may still be mapped
+        let path = self
+            .directory
+            .join(format!("{}-{}.arrow", identifier, self.tick()));
+        // a single record batch can be mapped without copies
+        df.rechunk();
+        let file = File::create(&path).map_err(|e| to_status(&e))?;
+        // removes the file on errors
+        let mut spill_file = SpillFile {
+            path: path.clone(),
+            size: 0,
+            owned: true,
+        };
+        IpcWriter::new(file)
+            .finish(&mut df)
+            .map_err(|e| to_status(&e))?;
+        spill_file.size = fs::metadata(&path).map_err(|e| to_status(&e))?.len();
+
+        let mapped = spill_file.map().map_err(|e| to_status(&e))?;
+
+        self.spills.fetch_add(1, Ordering::Relaxed);
+        Ok((spill_file, mapped))
+    }
+
+    /// Reads a spilled dataframe back in memory.
+    pub fn reload(&self, file: &SpillFile) -> Result<DataFrame, Status> {
+        let df = File::open(&file.path)
+            .map_err(PolarsError::from)
+            .and_then(|f| IpcReader::new(f).memory_mapped(false).finish())
+            .map_err(|e| Status::internal(format!("Could not reload dataframe: {e}")))?;
+        self.reloads.fetch_add(1, Ordering::Relaxed);
+        Ok(df)
+    }
+
+    /// Returns the number of dataframes spilled to disk and reloaded in memory so far.
+    pub fn counters(&self) -> (u64, u64) {
+        (
+            self.spills.load(Ordering::Relaxed),
+            self.reloads.load(Ordering::Relaxed),
+        )
+    }
+}
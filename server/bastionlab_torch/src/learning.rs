@@ -15,6 +15,7 @@ use std::io::Cursor;
 use std::sync::{Arc, RwLock};
 use std::time::{Instant, SystemTime, UNIX_EPOCH};
 use tch::{Device, TchError, Tensor};
+use tokio::sync::watch;
 use tonic::Status;
 
 #[derive(Debug)]
@@ -24,6 +25,62 @@ pub enum Run {
     Pending,
 }
 
+/// Progress of a training or testing run: its state and the metrics of all its completed batches.
+///
+/// Runs are shared through a [`watch`] channel so that metric streams are woken up
+/// as soon as a batch completes.
+#[derive(Debug)]
+pub struct RunProgress {
+    pub run: Run,
+    pub metrics: Vec<Metric>,
+    pub done: bool,
+}
+
+impl RunProgress {
+    /// Returns the channel of a new pending run.
+    pub fn channel() -> watch::Sender<RunProgress> {
+        let (tx, _) = watch::channel(RunProgress {
+            run: Run::Pending,
+            metrics: Vec::new(),
+            done: false,
+        });
+        tx
+    }
+}
+
+/// Publishes the results of the batches of a run and marks it as done when dropped,
+/// including when the task running it panics.
+struct RunReporter(Arc<watch::Sender<RunProgress>>);
+
+impl RunReporter {
+    fn push(&self, metric: Result<Metric, Status>) -> bool {
+        let ok = metric.is_ok();
+        self.0.send_modify(|progress| match metric {
+            Ok(m) => {
+                progress.metrics.push(m.clone());
+                progress.run = Run::Ok(m);
+            }
+            Err(e) => {
+                progress.run = Run::Error(e);
+                progress.done = true;
+            }
+        });
+        ok
+    }
+}
+
+impl Drop for RunReporter {
+    fn drop(&mut self) {
+        let panicking = std::thread::panicking();
+        self.0.send_modify(|progress| {
+            if panicking && !matches!(progress.run, Run::Error(_)) {
+                progress.run = Run::Error(Status::internal("Run failed unexpectedly"));
+            }
+            progress.done = true;
+        });
+    }
+}
+
 /// Returns a metric by name from config and computes per step privacy budget for metrics
 fn build_shared_context(
     metric: &str,
@@ -176,7 +233,7 @@ fn build_train_context<'a>(
 pub fn module_train(
     binary: Arc<RwLock<BinaryModule>>,
     dataset: Arc<RwLock<Dataset>>,
-    run: Arc<RwLock<Run>>,
+    run: Arc<watch::Sender<RunProgress>>,
     config: TrainConfig,
     device: Device,
     model_hash: String,
@@ -185,6 +242,7 @@ pub fn module_train(
     chkpt: Arc<RwLock<CheckPoint>>,
 ) {
     tokio::spawn(async move {
+        let reporter = RunReporter(Arc::clone(&run));
         let start_time = Instant::now();
         let epochs = config.epochs;
         let batch_size = config.batch_size;
@@ -235,19 +293,16 @@ pub fn module_train(
                     client_info.clone(),
                 );
                 for res in trainer {
-                    match tcherror_to_status(res.map(|(epoch, batch, value, std)| Metric {
+                    let metric = tcherror_to_status(res.map(|(epoch, batch, value, std)| Metric {
                         epoch,
                         batch,
                         value,
                         nb_epochs,
                         nb_batches,
                         uncertainty: 2.0 * std,
-                    })) {
-                        Ok(m) => *run.write().unwrap() = Run::Ok(m),
-                        Err(e) => {
-                            *run.write().unwrap() = Run::Error(e);
-                            break;
-                        }
+                    }));
+                    if !reporter.push(metric) {
+                        break;
                     }
                 }
                 telemetry::add_event(
@@ -262,7 +317,7 @@ pub fn module_train(
                     },
                     client_info,
                 );
-                match &*run.read().unwrap() {
+                match &run.borrow().run {
                     Run::Ok(_) => info!(
                         "Model trained successfully in {}ms",
                         start_time.elapsed().as_millis()
@@ -278,7 +333,9 @@ pub fn module_train(
                     ),
                 }
             }
-            Err(e) => *run.write().unwrap() = Run::Error(e),
+            Err(e) => {
+                reporter.push(Err(e));
+            }
         };
     });
 }
@@ -288,7 +345,7 @@ pub fn module_test(
     chkpt: Arc<RwLock<CheckPoint>>,
     binary: Arc<RwLock<BinaryModule>>,
     dataset: Arc<RwLock<Dataset>>,
-    run: Arc<RwLock<Run>>,
+    run: Arc<watch::Sender<RunProgress>>,
     config: TestConfig,
     device: Device,
     model_hash: String,
@@ -296,6 +353,7 @@ pub fn module_test(
     client_info: Option<ClientInfo>,
 ) {
     tokio::spawn(async move {
+        let reporter = RunReporter(run);
         let dataset = dataset.read().unwrap();
         let batch_size = config.batch_size as usize;
         let chkpt = &chkpt.read().unwrap();
@@ -332,18 +390,17 @@ pub fn module_test(
                     client_info.clone(),
                 );
                 for res in tester {
-                    *run.write().unwrap() =
-                        match tcherror_to_status(res.map(|(batch, value, std)| Metric {
-                            epoch: 0,
-                            batch,
-                            value,
-                            nb_epochs: 1,
-                            nb_batches,
-                            uncertainty: 2.0 * std,
-                        })) {
-                            Ok(m) => Run::Ok(m),
-                            Err(e) => Run::Error(e),
-                        };
+                    let metric = tcherror_to_status(res.map(|(batch, value, std)| Metric {
+                        epoch: 0,
+                        batch,
+                        value,
+                        nb_epochs: 1,
+                        nb_batches,
+                        uncertainty: 2.0 * std,
+                    }));
+                    if !reporter.push(metric) {
+                        break;
+                    }
                 }
                 telemetry::add_event(
                     TelemetryEventProps::TrainerLog {
@@ -362,7 +419,9 @@ pub fn module_test(
                     start_time.elapsed().as_millis()
                 );
             }
-            Err(e) => *run.write().unwrap() = Run::Error(e),
+            Err(e) => {
+                reporter.push(Err(e));
+            }
         }
     });
 }
@@ -1,3 +1,4 @@
+use bastionlab_common::chunking::ChunkSizer;
 use bastionlab_common::prelude::*;
 use bastionlab_common::session::SessionManager;
 use bastionlab_common::telemetry::{self, TelemetryEventProps};
@@ -5,8 +6,10 @@ use bastionlab_learning::nn::Module;
 use bastionlab_learning::{data::Dataset, nn::CheckPoint};
 use prost::Message;
 use ring::{digest, hmac};
+use std::collections::HashSet;
 use std::time::Instant;
 use tch::Tensor;
+use tokio::sync::{mpsc, watch};
 use tokio_stream::wrappers::ReceiverStream;
 use tonic::{Request, Response, Status, Streaming};
 use uuid::Uuid;
@@ -38,7 +41,9 @@ use learning::*;
 mod serialization;
 use serialization::*;
 
-use bastionlab_learning::serialization::{BinaryModule, SizedObjectsBytes};
+use bastionlab_learning::serialization::{
+    BatchFormat, BinaryModule, SizedObjectsBytes, DATASET_BATCH_BYTES,
+};
 
 /// The server's state
 #[derive(Clone)]
@@ -46,9 +51,12 @@ pub struct BastionLabTorch {
     binaries: Arc<RwLock<HashMap<String, Artifact<BinaryModule>>>>,
     checkpoints: Arc<RwLock<HashMap<String, Artifact<CheckPoint>>>>,
     datasets: Arc<RwLock<HashMap<String, Artifact<Dataset>>>>,
-    runs: Arc<RwLock<HashMap<Uuid, Arc<RwLock<Run>>>>>,
+    runs: Arc<RwLock<HashMap<Uuid, Arc<watch::Sender<RunProgress>>>>>,
     sess_manager: Arc<SessionManager>,
     tensors: Arc<RwLock<HashMap<String, Arc<Mutex<Tensor>>>>>,
+    /// Tensors uploaded with SendTensor: only those can be fetched back, tensors
+    /// converted from dataframes remain under the control of their policies.
+    fetchable_tensors: Arc<RwLock<HashSet<String>>>,
 }
 
 impl BastionLabTorch {
@@ -59,6 +67,7 @@ impl BastionLabTorch {
             datasets: Arc::new(RwLock::new(HashMap::new())),
             runs: Arc::new(RwLock::new(HashMap::new())),
             tensors: Arc::new(RwLock::new(HashMap::new())),
+            fetchable_tensors: Arc::new(RwLock::new(HashSet::new())),
             sess_manager,
         }
     }
@@ -167,6 +176,7 @@ impl BastionLabTorch {
 impl TorchService for BastionLabTorch {
     type FetchDatasetStream = ReceiverStream<Result<Chunk, Status>>;
     type FetchModuleStream = ReceiverStream<Result<Chunk, Status>>;
+    type FetchTensorStream = ReceiverStream<Result<Chunk, Status>>;
 
     async fn send_dataset(
         &self,
@@ -186,7 +196,10 @@ impl TorchService for BastionLabTorch {
             (hash, data.len())
         };
 
-        let dataset: Artifact<Dataset> = tcherror_to_status((artifact).deserialize())?;
+        let format = dataset_batch_format(&artifact.meta)?;
+        let dataset: Artifact<Dataset> = tcherror_to_status(
+            artifact.deserialize_with(|data| Dataset::from_batches(data, format)),
+        )?;
         let name = dataset.name.clone();
 
         let dataset = self.insert_dataset(dataset);
@@ -267,16 +280,22 @@ impl TorchService for BastionLabTorch {
         &self,
         request: Request<Reference>,
     ) -> Result<Response<Self::FetchDatasetStream>, Status> {
-        let identifier = request.into_inner().identifier;
+        let reference = request.into_inner();
+        let format = dataset_batch_format(&reference.meta)?;
         let serialized = {
             let datasets = self.datasets.read().unwrap();
             let artifact = datasets
-                .get(&identifier)
+                .get(&reference.identifier)
                 .ok_or(Status::not_found("Dataset not found"))?;
-            tcherror_to_status(artifact.serialize())?
+            tcherror_to_status(match format {
+                BatchFormat::TorchScript => artifact.serialize(),
+                BatchFormat::Raw => {
+                    artifact.serialize_with(|dataset| dataset.to_raw_batches(DATASET_BATCH_BYTES))
+                }
+            })?
         };
 
-        Ok(stream_data(serialized, 4_194_285, "Dataset".to_string()).await)
+        Ok(stream_data(serialized, ChunkSizer::default(), "Dataset".to_string()).await)
     }
 
     async fn fetch_module(
@@ -329,7 +348,7 @@ impl TorchService for BastionLabTorch {
             }
         };
 
-        Ok(stream_data(serialized, 4_194_285, "Model".to_string()).await)
+        Ok(stream_data(serialized, ChunkSizer::default(), "Model".to_string()).await)
     }
 
     async fn delete_dataset(&self, request: Request<Reference>) -> Result<Response<Empty>, Status> {
@@ -398,7 +417,7 @@ impl TorchService for BastionLabTorch {
         self.runs
             .write()
             .unwrap()
-            .insert(identifier, Arc::new(RwLock::new(Run::Pending)));
+            .insert(identifier, Arc::new(RunProgress::channel()));
         let run = Arc::clone(self.runs.read().unwrap().get(&identifier).unwrap());
         module_train(
             binary,
@@ -455,7 +474,7 @@ impl TorchService for BastionLabTorch {
         self.runs
             .write()
             .unwrap()
-            .insert(identifier, Arc::new(RwLock::new(Run::Pending)));
+            .insert(identifier, Arc::new(RunProgress::channel()));
         let run = Arc::clone(self.runs.read().unwrap().get(&identifier).unwrap());
         module_test(
             module,
@@ -543,14 +562,14 @@ impl TorchService for BastionLabTorch {
         let identifier = Uuid::parse_str(&request.into_inner().identifier)
             .map_err(|_| Status::invalid_argument("Invalid run reference"))?;
 
-        match &*self
+        match &self
             .runs
             .read()
             .unwrap()
             .get(&identifier)
-            .unwrap()
-            .read()
-            .unwrap()
+            .ok_or_else(|| Status::not_found("Run not found"))?
+            .borrow()
+            .run
         {
             Run::Pending => Err(Status::out_of_range("Run has not started.")),
             Run::Ok(m) => Ok(Response::new(m.clone())),
@@ -558,6 +577,53 @@ impl TorchService for BastionLabTorch {
         }
     }
 
+    type StreamMetricsStream = ReceiverStream<Result<Metric, Status>>;
+
+    async fn stream_metrics(
+        &self,
+        request: Request<Reference>,
+    ) -> Result<Response<Self::StreamMetricsStream>, Status> {
+        let identifier = Uuid::parse_str(&request.into_inner().identifier)
+            .map_err(|_| Status::invalid_argument("Invalid run reference"))?;
+        let mut updates = self
+            .runs
+            .read()
+            .unwrap()
+            .get(&identifier)
+            .ok_or_else(|| Status::not_found("Run not found"))?
+            .subscribe();
+
+        let (tx, rx) = mpsc::channel(16);
+        tokio::spawn(async move {
+            let mut sent = 0;
+            loop {
+                let (metrics, error, done) = {
+                    let progress = updates.borrow_and_update();
+                    let error = match &progress.run {
+                        Run::Error(e) => Some(Status::internal(e.message())),
+                        _ => None,
+                    };
+                    (progress.metrics[sent..].to_vec(), error, progress.done)
+                };
+                sent += metrics.len();
+                for metric in metrics {
+                    if tx.send(Ok(metric)).await.is_err() {
+                        return;
+                    }
+                }
+                if let Some(e) = error {
+                    let _ = tx.send(Err(e)).await;
+                    return;
+                }
+                if done || updates.changed().await.is_err() {
+                    return;
+                }
+            }
+        });
+
+        Ok(Response::new(ReceiverStream::new(rx)))
+    }
+
     async fn send_tensor(
         &self,
         request: Request<Streaming<Chunk>>,
@@ -574,10 +640,30 @@ impl TorchService for BastionLabTorch {
             data
         };
 
-        let (_, reference) = self.insert_tensor(Arc::new(Mutex::new(tensor)));
+        let (identifier, reference) = self.insert_tensor(Arc::new(Mutex::new(tensor)));
+        self.fetchable_tensors.write().unwrap().insert(identifier);
         Ok(Response::new(reference))
     }
 
+    async fn fetch_tensor(
+        &self,
+        request: Request<Reference>,
+    ) -> Result<Response<Self::FetchTensorStream>, Status> {
+        let identifier = request.into_inner().identifier;
+        if !self.fetchable_tensors.read().unwrap().contains(&identifier) {
+            return Err(Status::permission_denied(
+                "Only tensors uploaded with SendTensor can be fetched",
+            ));
+        }
+
+        let artifact = {
+            let tensor = self.get_tensor(&identifier)?;
+            let tensor = tensor.lock().unwrap();
+            tensor_to_artifact(&tensor)?
+        };
+        Ok(stream_data(artifact, ChunkSizer::default(), "Tensor".to_string()).await)
+    }
+
     async fn modify_tensor(
         &self,
         request: Request<UpdateTensor>,
@@ -1,11 +1,14 @@
 use super::Chunk;
 use crate::storage::Artifact;
-use bastionlab_learning::serialization::SizedObjectsBytes;
+use crate::utils::tcherror_to_status;
+use bastionlab_common::chunking::ChunkSizer;
+use bastionlab_learning::serialization::{raw_tensor_to_bytes, BatchFormat, SizedObjectsBytes};
 use log::info;
 use ring::hmac;
+use serde::Deserialize;
 use std::sync::{Arc, RwLock};
 use std::time::Instant;
-use tch::Device;
+use tch::{Device, Tensor};
 use tokio::sync::mpsc;
 use tokio_stream::{wrappers::ReceiverStream, StreamExt};
 use tonic::{Response, Status};
@@ -46,10 +49,39 @@ pub async fn unstream_data(
     })
 }
 
+/// Options of a dataset upload, sent by the client as JSON in the meta field of the first chunk.
+#[derive(Deserialize, Debug)]
+struct DatasetUploadMeta {
+    #[serde(default)]
+    batch_format: u8,
+}
+
+/// Returns the format of the batches of an uploaded dataset from the meta field of its first chunk.
+///
+/// Older clients use TorchScript batches, and send an empty meta field or a meta field that is
+/// not JSON, such as the protobuf-encoded `TensorMetaData` of the references returned by
+/// `AvailableDatasets`.
+pub fn dataset_batch_format(meta: &[u8]) -> Result<BatchFormat, Status> {
+    let meta: DatasetUploadMeta = match serde_json::from_slice(meta) {
+        Ok(meta) => meta,
+        Err(_) => return Ok(BatchFormat::TorchScript),
+    };
+    match meta.batch_format {
+        0 => Ok(BatchFormat::TorchScript),
+        1 => Ok(BatchFormat::Raw),
+        v => Err(Status::invalid_argument(format!(
+            "Unsupported dataset batch format: {}",
+            v
+        ))),
+    }
+}
+
 /// Converts a raw artifact (a header and a binary object) into a stream of chunks to be sent over gRPC.
+///
+/// The size of the chunks is chosen by `sizer`.
 pub async fn stream_data(
     artifact: Artifact<SizedObjectsBytes>,
-    chunk_size: usize,
+    mut sizer: ChunkSizer,
     stream_type: String,
 ) -> Response<ReceiverStream<Result<Chunk, Status>>> {
     let (tx, rx) = mpsc::channel(4);
@@ -59,46 +91,58 @@ pub async fn stream_data(
         .into_inner()
         .unwrap()
         .into();
-    let start_time = Instant::now();
     tokio::spawn(async move {
-        for (i, bytes) in raw_bytes.chunks(chunk_size).enumerate() {
-            tx.send(Ok(Chunk {
-                // Chunks always contain one object -> fix this
+        let mut offset = 0;
+        let mut first = true;
+        while offset < raw_bytes.len() || first {
+            let end = (offset + sizer.size()).min(raw_bytes.len());
+            let bytes = &raw_bytes[offset..end];
+            let chunk = Chunk {
                 data: bytes.to_vec(),
-                name: if i == 0 {
+                name: if first {
                     artifact.name.clone()
                 } else {
                     String::from("")
                 },
-                description: if i == 0 {
+                description: if first {
                     artifact.description.clone()
                 } else {
                     String::from("")
                 },
                 secret: vec![],
-                meta: if i == 0 {
+                meta: if first {
                     artifact.meta.clone()
                 } else {
                     Vec::new()
                 },
-            }))
-            .await
-            .unwrap(); // Fix this
+            };
+            first = false;
+            offset = end;
+
+            let start_time = Instant::now();
+            if let Err(_ignored) = tx.send(Ok(chunk)).await {
+                // the client isnt listening anymore
+                return;
+            }
+            sizer.record(bytes.len(), start_time.elapsed());
         }
-    });
 
-    info!(
-        "{}",
-        format!(
-            "{} fetched successfully in {}ms",
-            stream_type,
-            start_time.elapsed().as_millis()
-        )
-    );
+        info!("{} fetched successfully: {}", stream_type, sizer.stats());
+    });
 
     Response::new(ReceiverStream::new(rx))
 }
 
+/// Serializes a tensor in the raw tensor format (a header followed by the raw storage bytes,
+/// see [`bastionlab_learning::serialization::RawTensorHeader`]) into an artifact that can be streamed with [`stream_data`].
+pub fn tensor_to_artifact(tensor: &Tensor) -> Result<Artifact<SizedObjectsBytes>, Status> {
+    let bytes = tcherror_to_status(raw_tensor_to_bytes(tensor))?;
+    Ok(Artifact {
+        data: Arc::new(RwLock::new(bytes.into())),
+        ..Default::default()
+    })
+}
+
 /// Parses a device string and returns a [`tch::Device`] object if the string is a valid device name.
 pub fn parse_device(device: &str) -> Result<Device, Status> {
     Ok(match device {
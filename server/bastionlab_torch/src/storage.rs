@@ -48,8 +48,19 @@ where
     ///
     /// Note that the object should be convertible into a SizedObjectBytes (with `TryInto`).
     pub fn serialize(&self) -> Result<Artifact<SizedObjectsBytes>, TchError> {
+        self.serialize_with(|data| data.try_into())
+    }
+}
+
+impl<T> Artifact<T> {
+    /// Serializes the contained object with `f` and returns a new artifact that contains
+    /// a SizedObjectBytes (binary buffer) instead of the object.
+    pub fn serialize_with(
+        &self,
+        f: impl FnOnce(&T) -> Result<SizedObjectsBytes, TchError>,
+    ) -> Result<Artifact<SizedObjectsBytes>, TchError> {
         Ok(Artifact {
-            data: Arc::new(RwLock::new((&*self.data.read().unwrap()).try_into()?)),
+            data: Arc::new(RwLock::new(f(&*self.data.read().unwrap())?)),
             name: self.name.clone(),
             description: self.description.clone(),
             secret: self.secret.clone(),
@@ -66,11 +77,21 @@ impl Artifact<SizedObjectsBytes> {
     /// Note that the object should be convertible from a SizedObjectBytes (with `TryForm`).
     pub fn deserialize<T: TryFrom<SizedObjectsBytes, Error = TchError> + std::fmt::Debug>(
         self,
+    ) -> Result<Artifact<T>, TchError> {
+        self.deserialize_with(T::try_from)
+    }
+
+    /// Deserializes the contained [`SizedObjectBytes`] object (binary buffer) with `f` and returns a
+    /// new artifact that contains the deserialized object instead.
+    pub fn deserialize_with<T>(
+        self,
+        f: impl FnOnce(SizedObjectsBytes) -> Result<T, TchError>,
     ) -> Result<Artifact<T>, TchError> {
         Ok(Artifact {
-            data: Arc::new(RwLock::new(T::try_from(
-                Arc::try_unwrap(self.data).unwrap().into_inner().unwrap(),
-            )?)),
+            data: Arc::new(RwLock::new(f(Arc::try_unwrap(self.data)
+                .unwrap()
+                .into_inner()
+                .unwrap())?)),
             name: self.name,
             description: self.description,
             secret: self.secret,
@@ -5,15 +5,21 @@ use bastionlab_common::{
     session::SessionManager,
     telemetry::{self, TelemetryEventProps},
 };
-use bastionlab_polars::BastionLabPolars;
+use bastionlab_polars::{BastionLabPolars, QueryCache, SpillStore};
 use bastionlab_torch::BastionLabTorch;
 use std::collections::hash_map::DefaultHasher;
 use std::fs;
 use std::path::Path;
-use std::time::SystemTime;
+use std::time::{Duration, SystemTime};
 use tonic::transport::{Identity, Server, ServerTlsConfig};
 use tonic::Status;
 
+/// Interval between the sweeps reclaiming the session-scoped dataframes of ended sessions.
+const RECLAIM_INTERVAL: Duration = Duration::from_secs(60);
+
+/// Directory of the dataframes spilled to disk, under the directory of saved dataframes.
+const SPILL_DIRECTORY: &str = "data_frames/spill";
+
 #[derive(Clone)]
 struct TokenValidator {
     sess_manager: Arc<SessionManager>,
@@ -148,21 +154,57 @@ async fn main() -> Result<()> {
     };
 
     // Polars
-    let polars_svc = BastionLabPolars::new(sess_manager.clone());
-    let builder = {
-        use bastionlab_polars::{
-            polars_proto::polars_service_server::PolarsServiceServer, BastionLabPolars,
-        };
+    let polars_svc = {
         let svc = BastionLabPolars::new(sess_manager.clone());
-        match BastionLabPolars::load_dfs(&svc) {
+        let cache_size = config
+            .query_cache_size()
+            .context("Parsing the query_cache_size_in_bytes config")?;
+        let cache_ttl = config
+            .query_cache_ttl()
+            .context("Parsing the query_cache_ttl_in_secs config")?;
+        let svc = if cache_size > 0 {
+            info!("Query cache is enabled ({} bytes).", cache_size);
+            svc.with_query_cache(QueryCache::new(
+                cache_size as usize,
+                (cache_ttl > 0).then(|| Duration::from_secs(cache_ttl)),
+            ))
+        } else {
+            svc
+        };
+        let store_memory_size = config
+            .store_memory_size()
+            .context("Parsing the store_memory_size_in_bytes config")?;
+        if store_memory_size > 0 {
+            info!(
+                "Dataframes are spilled to disk above {} bytes.",
+                store_memory_size
+            );
+            svc.with_spill_store(
+                SpillStore::new(SPILL_DIRECTORY, store_memory_size as usize)
+                    .context("Creating the spill directory")?,
+            )
+        } else {
+            svc
+        }
+    };
+    let builder = {
+        use bastionlab_polars::polars_proto::polars_service_server::PolarsServiceServer;
+        match polars_svc.load_dfs() {
             Ok(_) => info!("Successfully loaded saved dataframes"),
-            Err(_) => info!("There was an error loading saved dataframes"),
+            Err(e) => info!("There was an error loading saved dataframes: {}", e),
         };
         builder.add_service(PolarsServiceServer::with_interceptor(
             polars_svc.clone(),
             token_validator.clone(),
         ))
     };
+    {
+        let polars_svc = polars_svc.clone();
+        std::thread::spawn(move || loop {
+            std::thread::sleep(RECLAIM_INTERVAL);
+            polars_svc.reclaim_session_artifacts();
+        });
+    }
 
     // Conversion
     let builder = {
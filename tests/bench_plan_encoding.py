@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Compares the encodings of composite plans on plans embedding large literals.
+
+For each encoding, prints the size of the payload sent to the server and the time
+taken to encode it. With `--server`, also times the `RunQuery` calls, which includes
+the parsing of the plan by the server.
+
+    python bench_plan_encoding.py --rows 200000 --server localhost:50056
+"""
+
+import argparse
+import json
+import time
+import msgpack
+import polars as pl
+import zstandard
+from bastionlab.pb.bastionlab_polars_pb2 import PlanEncoding
+from bastionlab.polars.encoding import encode_query
+from bastionlab.polars.remote_polars import (
+    EntryPointPlanSegment,
+    Metadata,
+    RemoteLazyFrame,
+)
+
+ENCODINGS = {
+    "json": {PlanEncoding.JSON},
+    "msgpack": {PlanEncoding.JSON, PlanEncoding.MSGPACK},
+    "msgpack+zstd": {
+        PlanEncoding.JSON,
+        PlanEncoding.MSGPACK,
+        PlanEncoding.MSGPACK_ZSTD,
+    },
+}
+
+
+def literal_plan(rdf: RemoteLazyFrame, rows: int) -> RemoteLazyFrame:
+    """Semi-joins `rdf` with a local DataFrame of `rows` rows, embedded in the plan."""
+    ids = pl.DataFrame({"PassengerId": list(range(rows))}).lazy()
+    return rdf.join(
+        RemoteLazyFrame(ids, Metadata(rdf._meta._polars_client)),
+        on="PassengerId",
+        how="semi",
+    )
+
+
+def timeit(f, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_offline(rows: int, repeat: int) -> None:
+    rdf = RemoteLazyFrame(
+        pl.DataFrame({"PassengerId": [0], "Age": [0.0]}).lazy(),
+        Metadata(None, [EntryPointPlanSegment("dummy")]),
+    )
+    rdf = literal_plan(rdf, rows)
+    plan, packed = rdf.composite_plan, rdf.packed_plan
+
+    print(f"plan with {rows} literal rows")
+    for name, encodings in ENCODINGS.items():
+        query = encode_query(plan, packed, encodings)
+        size = len(query.composite_plan) + len(query.encoded_plan)
+        encode = timeit(lambda: encode_query(plan, packed, encodings), repeat)
+        if query.encoding == PlanEncoding.JSON:
+            decode = timeit(lambda: json.loads(query.composite_plan), repeat)
+        elif query.encoding == PlanEncoding.MSGPACK:
+            decode = timeit(lambda: msgpack.unpackb(query.encoded_plan), repeat)
+        else:
+            decode = timeit(
+                lambda: msgpack.unpackb(
+                    zstandard.ZstdDecompressor().decompress(query.encoded_plan)
+                ),
+                repeat,
+            )
+        print(
+            f"  {name:>13}: {size / 1024:10.1f} KiB"
+            f"  encode {encode * 1000:8.2f} ms  decode (python) {decode * 1000:8.2f} ms"
+        )
+
+
+def bench_server(address: str, rows: int, repeat: int) -> None:
+    from bastionlab import Connection
+    from bastionlab.polars.policy import Policy, Aggregation, Log
+
+    host, port = address.split(":")
+    connection = Connection(host, int(port))
+    client = connection.client
+    policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+    rdf = client.polars.send_df(pl.read_csv("titanic.csv"), policy)
+    query = literal_plan(rdf, rows)
+
+    print(f"RunQuery with {rows} literal rows on {address}")
+    for name, encodings in ENCODINGS.items():
+        client.polars._plan_encodings = encodings
+        elapsed = timeit(lambda: client.polars._run_query(query).delete(), repeat)
+        print(f"  {name:>13}: {elapsed * 1000:8.2f} ms")
+    connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--server", help="address of a running server (host:port)")
+    args = parser.parse_args()
+
+    bench_offline(args.rows, args.repeat)
+    if args.server is not None:
+        bench_server(args.server, args.rows, args.repeat)
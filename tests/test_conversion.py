@@ -167,6 +167,15 @@ class TestingDataConv(unittest.TestCase):
         self.assertEqual(remote_tensor.shape, X.shape)
         self.assertEqual(remote_tensor.dtype, torch.float)
 
+    def test_fetch_tensor_method(self):
+        connection = Connection("localhost")
+        client = connection.client
+        X = torch.arange(12, dtype=torch.int64).reshape(3, 4).t()
+        remote_tensor = client.torch.RemoteTensor(X)
+
+        self.assertTrue(torch.equal(remote_tensor.fetch(), X))
+        connection.close()
+
     def test_list_dataframe_same_type(self):
         connection = Connection("localhost")
         client = connection.client
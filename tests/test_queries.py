@@ -2,8 +2,12 @@
 # coding: utf-8
 
 
+import gc
 import polars as pl
+import torch
 import logging
+import os
+import tempfile
 import unittest
 from bastionlab import Connection
 from bastionlab.polars.policy import (
@@ -11,9 +15,18 @@ from bastionlab.polars.policy import (
     Aggregation,
     Log,
 )
+from bastionlab.polars.utils import ApplyBins
+from bastionlab.pb.bastionlab_polars_pb2 import PlanEncoding
+from bastionlab.polars.encoding import ZSTD_THRESHOLD
 
 # from server import launch_server
 
+
+class AddOne(torch.nn.Module):
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return x + 1
+
+
 logging.basicConfig(level=logging.INFO)
 
 
@@ -69,6 +82,280 @@ class TestingConnection(unittest.TestCase):
         )
         self.assertNotEqual(per_sex_rates.is_empty(), True)
 
+    def testingfetchto(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        with tempfile.TemporaryDirectory() as tmp:
+            fetched = (
+                rdf.select([pl.col("Sex"), pl.col("Survived")])
+                .collect()
+                .fetch_to(os.path.join(tmp, "fetched.arrow"))
+            )
+            self.assertTrue(fetched.frame_equal(df.select(["Sex", "Survived"])))
+            del fetched
+        connection.close()
+
+    def testingquerycache(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        client.polars.enable_cache()
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        query = (
+            rdf.select([pl.col("Sex"), pl.col("Survived")])
+            .groupby(pl.col("Sex"))
+            .agg(pl.col("Survived").mean())
+        )
+        first = query.collect()
+        second = query.collect()
+        self.assertEqual(first.identifier, second.identifier)
+        self.assertTrue(first.fetch().frame_equal(second.fetch()))
+        self.assertEqual(client.polars.cache_stats.hits, 2)
+        rdf.delete()
+        self.assertEqual(client.polars.cache_stats.entries, 0)
+        connection.close()
+
+    def testingplandigest(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        queries = [
+            rdf.filter(pl.col("Age") > 30).vstack(rdf).select(pl.col("Sex"))
+            for _ in range(2)
+        ]
+        self.assertEqual(queries[0].composite_plan, queries[1].composite_plan)
+        self.assertEqual(queries[0].plan_digest, queries[1].plan_digest)
+        self.assertNotEqual(queries[0].plan_digest, rdf.plan_digest)
+        connection.close()
+
+    def testingplanencoding(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        query = rdf.filter(pl.col("Age") > 30).select([pl.col("Sex"), pl.col("Age")])
+        # the literal makes the plan larger than ZSTD_THRESHOLD, it keeps every row
+        large = "x" * (2 * ZSTD_THRESHOLD)
+        large_query = rdf.filter(pl.col("Name") != large).select(pl.col("Age"))
+        fetched = []
+        large_fetched = []
+        for encodings in [
+            {PlanEncoding.JSON},
+            {PlanEncoding.JSON, PlanEncoding.MSGPACK},
+            {PlanEncoding.JSON, PlanEncoding.MSGPACK, PlanEncoding.MSGPACK_ZSTD},
+        ]:
+            client.polars._plan_encodings = encodings
+            fetched.append(query.collect().fetch())
+            large_fetched.append(large_query.collect().fetch())
+        for res in fetched[1:]:
+            self.assertTrue(res.frame_equal(fetched[0]))
+        # only large plans are compressed
+        self.assertEqual(
+            client.polars._make_query(query).encoding, PlanEncoding.MSGPACK
+        )
+        self.assertEqual(
+            client.polars._make_query(large_query).encoding, PlanEncoding.MSGPACK_ZSTD
+        )
+        for res in large_fetched:
+            self.assertTrue(res.frame_equal(df.select(pl.col("Age"))))
+        connection.close()
+
+    def testingjoinlocal(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        listed = len(client.polars.list_dfs())
+        ids = [1, 3, 5, 7]
+        selected = rdf.is_in_local("PassengerId", ids).collect().fetch()
+        self.assertTrue(
+            selected.frame_equal(df.filter(pl.col("PassengerId").is_in(ids)))
+        )
+        names = pl.DataFrame(
+            {"Pclass": [1, 2, 3], "Class": ["first", "second", "third"]}
+        )
+        joined = rdf.join_local(names, on="Pclass").collect().fetch()
+        self.assertEqual(joined.height, df.height)
+        # side tables are not listed, only the two results are
+        self.assertEqual(len(client.polars.list_dfs()), listed + 2)
+        connection.close()
+
+    def testingsharedsubplans(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        fares = rdf.select([pl.col("PassengerId"), pl.col("Fare")]).apply_udf(
+            ["Fare"], AddOne()
+        )
+        joined = fares.join(fares, on="PassengerId")
+        self.assertTrue(joined.explain().endswith("3 shared"))
+        res = joined.collect().fetch()
+        self.assertTrue(res["Fare"].series_equal(res["Fare_right"], null_equal=True))
+        connection.close()
+
+    def testingrowcount(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        listed = len(client.polars.list_dfs())
+        query = rdf.with_row_count("row").filter(pl.col("row") < 10)
+        # nothing is run before collect
+        self.assertEqual(len(client.polars.list_dfs()), listed)
+        res = query.collect().fetch()
+        self.assertTrue(res.frame_equal(df.with_row_count("row").head(10)))
+        connection.close()
+
+    def testingservercache(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        query = rdf.groupby(pl.col("Sex")).agg(pl.col("Survived").mean())
+        before = client.polars.server_cache_stats()
+        if before.max_bytes == 0:
+            connection.close()
+            self.skipTest("the query cache is disabled on the server")
+        first = query.collect()
+        second = query.collect()
+        after = client.polars.server_cache_stats()
+        self.assertEqual(first.identifier, second.identifier)
+        self.assertEqual(after.hits, before.hits + 1)
+        connection.close()
+
+    def testingautorelease(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        kept = rdf.groupby(pl.col("Pclass")).agg(pl.col("Survived").mean()).collect()
+        kept.pin()
+        dropped = rdf.groupby(pl.col("Sex")).agg(pl.col("Survived").mean()).collect()
+        identifier = dropped.identifier
+        del dropped
+        gc.collect()
+        released = client.polars.release_unused()
+        # results cached by the server are held by its cache
+        if client.polars.server_cache_stats().max_bytes == 0:
+            self.assertEqual(released, 1)
+            with self.assertRaises(Exception):
+                client.polars.get_df(identifier)
+        kept_identifier = kept.identifier
+        del kept
+        gc.collect()
+        client.polars.release_unused()
+        self.assertEqual(
+            client.polars.get_df(kept_identifier).identifier, kept_identifier
+        )
+        connection.close()
+
+    def testingpincachedresult(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        before = client.polars.server_cache_stats()
+        res = rdf.groupby(pl.col("Pclass")).agg(pl.col("Survived").mean()).collect()
+        identifier = res.identifier
+        res.pin()
+        # pinned results leave the cache
+        after = client.polars.server_cache_stats()
+        self.assertEqual(after.entries, before.entries)
+        # forgets the cache entries reading from the input, if any
+        rdf.delete()
+        del res
+        gc.collect()
+        client.polars.release_unused()
+        self.assertEqual(client.polars.get_df(identifier).identifier, identifier)
+        connection.close()
+
+    def testingstorestats(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        self.assertIn(rdf.tier, ("memory", "disk"))
+        stats = client.polars.store_stats()
+        self.assertGreaterEqual(stats.memory_dataframes + stats.disk_dataframes, 1)
+        if stats.max_memory_bytes > 0:
+            self.assertLessEqual(stats.memory_bytes, stats.max_memory_bytes)
+        # spilled DataFrames are reloaded when accessed
+        res = rdf.select(pl.col("Age").mean()).collect().fetch()
+        self.assertEqual(res.shape, (1, 1))
+        connection.close()
+
+    def testingfetchall(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        queries = [
+            rdf.groupby(pl.col(col)).agg(pl.col("Survived").mean())
+            for col in ["Sex", "Pclass", "Embarked"]
+        ]
+        rdfs = client.polars.collect_all(queries)
+        self.assertEqual(len(set(rdf.identifier for rdf in rdfs)), 3)
+        fetched = client.polars.fetch_all(queries)
+        for query, res in zip(queries, fetched):
+            self.assertTrue(res.frame_equal(query.collect().fetch()))
+        connection.close()
+
+    def testingloweredudf(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        bins = (
+            rdf.filter(pl.col("Age") != None)
+            .select(pl.col("Age"))
+            .apply_udf(["Age"], ApplyBins(10))
+            .groupby(pl.col("Age"))
+            .agg(pl.count())
+            .sort(pl.col("Age"))
+            .collect()
+            .fetch()
+        )
+        expected = (
+            df.filter(pl.col("Age").is_not_null())
+            .groupby((pl.col("Age") // 10 * 10).alias("Age"))
+            .agg(pl.count())
+            .sort("Age")
+        )
+        self.assertTrue(bins.frame_equal(expected))
+        connection.close()
+
+    def testingudfregistry(self):
+        df = pl.read_csv("titanic.csv").limit(50)
+        connection = Connection("localhost", 50056)
+        client = connection.client
+        policy = Policy(safe_zone=Aggregation(1), unsafe_handling=Log(), savable=False)
+        rdf = client.polars.send_df(df, policy)
+        fetched = []
+        for udf in [AddOne(), AddOne()]:
+            fetched.append(
+                rdf.select(pl.col("Fare")).apply_udf(["Fare"], udf).collect().fetch()
+            )
+        self.assertTrue(fetched[0].frame_equal(fetched[1]))
+        self.assertEqual(len(client.polars._udfs._uploaded), 1)
+        connection.close()
+
 
 def setUpModule():
     print("Hello world")
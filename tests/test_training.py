@@ -4,6 +4,7 @@ from bastionlab.torch.utils import TensorDataset
 import polars as pl
 import os
 import torch
+from torch.utils.data import DataLoader
 import subprocess
 import logging
 import unittest
@@ -182,6 +183,36 @@ class TestingConnection(unittest.TestCase):
         client.torch.delete_dataset(test_dataset)
         connection.close()
 
+    def test_fit_metrics_history(self):
+        connection = Connection("localhost")
+        client = connection.client
+        X = torch.tensor([[0.0], [1.0], [0.5], [0.2]])
+        Y = torch.tensor([[0.0], [2.0], [1.0], [0.4]])
+        train_dataset = client.torch.RemoteDataset(
+            TensorDataset([X], Y),
+            name="1D Linear Regression",
+            description="Dummy 1D Linear Regression Dataset (param is 2)",
+        )
+
+        model = make_model(in_features=X.shape[-1], dtype=X.dtype)()
+        remote_learner = client.torch.RemoteLearner(
+            model,
+            train_dataset,
+            max_batch_size=2,
+            loss="l2",
+            optimizer=SGD(lr=0.1),
+            model_name="Linear 1x1",
+            progress=False,
+        )
+        history = remote_learner.fit(nb_epochs=2)
+
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history.to_polars()["epoch"].to_list(), [0, 0, 1, 1])
+        self.assertEqual(len(remote_learner.log), 4)
+
+        client.torch.delete_dataset(train_dataset)
+        connection.close()
+
     def test_dp_sgd_linear_regression(self):
         connection = Connection("localhost")
         client = connection.client
@@ -304,6 +335,53 @@ class TestingConnection(unittest.TestCase):
 
         connection.close()
 
+    def test_fetch_dataset_stream(self):
+        connection = Connection("localhost")
+        client = connection.client
+        X = torch.tensor([[0.0], [1.0], [0.5], [0.2]])
+        Y = torch.tensor([[0.0], [2.0], [1.0], [0.4]])
+        tensor_train = TensorDataset([X], Y)
+
+        train_dataset = client.torch.RemoteDataset(
+            tensor_train,
+            name="1D Linear Regression",
+            description="Dummy 1D Linear Regression Dataset (param is 2)",
+            privacy_limit=8001.1,
+        )
+
+        fetched_tensor_train = client.torch.fetch_dataset(train_dataset, stream=True)
+        labels = torch.cat(
+            [y for _, y in DataLoader(fetched_tensor_train, batch_size=2)]
+        )
+        self.assertListEqual(labels.tolist(), Y.tolist())
+
+        connection.close()
+
+    def test_fetch_listed_dataset(self):
+        connection = Connection("localhost")
+        client = connection.client
+        X = torch.tensor([[0.0], [1.0], [0.5], [0.2]])
+        Y = torch.tensor([[0.0], [2.0], [1.0], [0.4]])
+        tensor_train = TensorDataset([X], Y)
+
+        train_dataset = client.torch.RemoteDataset(
+            tensor_train,
+            name="1D Linear Regression",
+            description="Dummy 1D Linear Regression Dataset (param is 2)",
+            privacy_limit=8001.1,
+        )
+
+        # listed references carry the meta of the dataset, not the options of the fetch
+        ref = next(
+            ref
+            for ref in client.torch.get_available_datasets()
+            if ref.identifier == train_dataset.identifier
+        )
+        chunks = list(client.torch.stub.FetchDataset(ref))
+        self.assertGreater(len(chunks), 0)
+
+        connection.close()
+
 
 if __name__ == "__main__":
     unittest.main()